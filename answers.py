@@ -0,0 +1,126 @@
+import heapq
+import math
+import re
+import unicodedata
+from decimal import Decimal, InvalidOperation
+
+# Free-text ("type your answer") polls. Answers are normalized so that
+# 'Blue', ' blue!' and 'BLUE' count together, then counted with SpaceSaving
+# (Metwally et al.): at most `capacity` counters, whatever the number of
+# distinct answers. With N answers in total, every count is at most N /
+# capacity too high, and every answer given more than N / capacity times is
+# guaranteed to be held. capacity = ceil(1 / epsilon) bounds the error at
+# epsilon * N.
+
+MAX_ANSWER_LENGTH = 40
+DEFAULT_CAPACITY = 1000
+MIN_CAPACITY = 10
+MAX_CAPACITY = 100000
+
+EDGE_PUNCTUATION = '.,;:!?¡¿\'"`()[]{}«»“”‘’'
+NUMBER = re.compile(r'[+-]?[\d][\d,_ ]*(\.\d+)?')
+
+
+def normalize_answer(value):
+    # Canonical form of an answer, or None when nothing is left of it
+    if not isinstance(value, str):
+        return None
+    text = ' '.join(unicodedata.normalize('NFKC', value).casefold().split())
+    text = text.strip(EDGE_PUNCTUATION + ' ')
+    if NUMBER.fullmatch(text):
+        # '1,000', '1000.0' and '01000' are the same guess
+        try:
+            text = format(Decimal(re.sub(r'[,_ ]', '', text)).normalize(), 'f')
+        except InvalidOperation:
+            pass
+    text = text[:MAX_ANSWER_LENGTH].rstrip()
+    return text or None
+
+
+def capacity_for(epsilon):
+    return max(MIN_CAPACITY, min(MAX_CAPACITY, math.ceil(1 / epsilon)))
+
+
+class SpaceSaving:
+    # Counters live in buckets by count, so adding an answer, evicting the
+    # smallest counter and tracking the minimum are all O(1)
+    __slots__ = ('capacity', 'counts', 'errors', 'buckets', 'low', 'total')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}   # answer -> estimated count
+        self.errors = {}   # answer -> how much of its count may be inherited
+        self.buckets = {}  # count -> set of answers
+        self.low = 0       # smallest count held
+        self.total = 0
+
+    def add(self, answer):
+        self.total += 1
+        counts, buckets = self.counts, self.buckets
+        count = counts.get(answer)
+        if count is not None:
+            self._leave(answer, count)
+        elif len(counts) < self.capacity:
+            count = 0
+            self.errors[answer] = 0
+            self.low = 0
+        else:
+            # Take over the smallest counter, inheriting its count as error
+            count = self.low
+            victim = buckets[count].pop()
+            del counts[victim], self.errors[victim]
+            self.errors[answer] = count
+            self._leave(None, count)
+        count += 1
+        counts[answer] = count
+        bucket = buckets.get(count)
+        if bucket is None:
+            buckets[count] = {answer}
+        else:
+            bucket.add(answer)
+        if self.low == 0:
+            self.low = count
+        return count
+
+    def _leave(self, answer, count):
+        bucket = self.buckets[count]
+        if answer is not None:
+            bucket.discard(answer)
+        if not bucket:
+            del self.buckets[count]
+            if count == self.low:
+                # Whatever left this bucket went to count + 1
+                self.low = count + 1
+
+    def error_bound(self):
+        # Largest possible overcount of any held answer
+        return self.low if len(self.counts) >= self.capacity else 0
+
+    def top(self, n=None):
+        # [(answer, estimated count)] by count, then alphabetically
+        items = self.counts.items()
+        if n is None or n >= len(self.counts):
+            return sorted(items, key=lambda item: (-item[1], item[0]))
+        return heapq.nsmallest(n, items, key=lambda item: (-item[1], item[0]))
+
+    def guaranteed(self, answer):
+        # Votes the answer certainly received
+        return self.counts.get(answer, 0) - self.errors.get(answer, 0)
+
+    def to_dict(self):
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'items': [[answer, count, self.errors[answer]] for answer, count in self.counts.items()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls(data['capacity'])
+        summary.total = data['total']
+        for answer, count, error in data['items']:
+            summary.counts[answer] = count
+            summary.errors[answer] = error
+            summary.buckets.setdefault(count, set()).add(answer)
+        summary.low = min(summary.buckets) if summary.buckets else 0
+        return summary
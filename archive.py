@@ -0,0 +1,206 @@
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from profiler import log
+
+# Archive of finished polls in SQLite (REDLIX_ARCHIVE=path.db). A poll is
+# archived when it is stopped, reset, or replaced by a new start. Request
+# threads only put a snapshot on a queue; one writer thread owns the write
+# connection and commits whatever has queued up in a single transaction. The
+# database runs in WAL mode, so dashboard reads never wait for the writer.
+# For ranked-choice polls the option votes are first preferences; the
+# instant-runoff rounds and winner are kept in poll_runoffs.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS polls (
+    id INTEGER PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    poll TEXT NOT NULL,
+    question TEXT NOT NULL,
+    started REAL,
+    ended REAL NOT NULL,
+    total INTEGER NOT NULL,
+    reason TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS polls_tenant_ended ON polls (tenant, ended);
+CREATE INDEX IF NOT EXISTS polls_tenant_poll ON polls (tenant, poll, ended);
+CREATE TABLE IF NOT EXISTS poll_options (
+    poll_id INTEGER NOT NULL REFERENCES polls (id),
+    position INTEGER NOT NULL,
+    option TEXT NOT NULL,
+    votes INTEGER NOT NULL,
+    PRIMARY KEY (poll_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS poll_runoffs (
+    poll_id INTEGER PRIMARY KEY REFERENCES polls (id),
+    winner TEXT,
+    rounds TEXT NOT NULL
+);
+"""
+# Full-text index over questions when SQLite has FTS5; LIKE scans otherwise
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS polls_fts USING fts5 (question, content='polls', content_rowid='id');
+"""
+BATCH = 500
+
+
+class PollArchive:
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        self.archived = {}  # (tenant, poll) -> last archived version
+        self.lock = threading.Lock()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        conn.close()
+        self.thread = threading.Thread(target=self._run, name='redlix-archive', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def archive(self, tenant, poll_id, snap, reason):
+        # Queues a finished poll; never blocks on the database. The same
+        # version is archived once, so stop followed by start stores one row.
+        if not snap['options'] or (reason == 'reset' and not any(snap['votes'].values())):
+            return
+        with self.lock:
+            if self.archived.get((tenant, poll_id)) == snap['version']:
+                return
+            self.archived[(tenant, poll_id)] = snap['version']
+        self.queue.put((tenant, poll_id, snap, reason, time.time()))
+
+    def _run(self):
+        conn = self._connect()
+        running = True
+        while running:
+            jobs = [self.queue.get()]
+            while len(jobs) < BATCH:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            running = None not in jobs
+            work = [job for job in jobs if job is not None]
+            if work:
+                try:
+                    self._write(conn, work)
+                except sqlite3.Error as exc:
+                    log.warning('archive: dropped %d polls: %s', len(work), exc)
+            for _ in jobs:
+                self.queue.task_done()
+        conn.close()
+
+    def _write(self, conn, jobs):
+        with conn:
+            options = []
+            runoffs = []
+            for tenant, poll_id, snap, reason, ended in jobs:
+                votes = snap['votes']
+                cursor = conn.execute(
+                    'INSERT INTO polls (tenant, poll, question, started, ended, total, reason) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (tenant, poll_id, snap['question'], snap['start_time'], ended,
+                     snap.get('total_votes', sum(votes.values())), reason))
+                row_id = cursor.lastrowid
+                if self.fts:
+                    conn.execute('INSERT INTO polls_fts (rowid, question) VALUES (?, ?)',
+                                 (row_id, snap['question']))
+                options.extend((row_id, position, option, votes.get(option, 0))
+                               for position, option in enumerate(snap['options']))
+                if snap.get('kind') == 'ranked':
+                    runoffs.append((row_id, snap['winner'], json.dumps(snap['rounds'])))
+            conn.executemany('INSERT INTO poll_options (poll_id, position, option, votes) '
+                             'VALUES (?, ?, ?, ?)', options)
+            conn.executemany('INSERT INTO poll_runoffs (poll_id, winner, rounds) VALUES (?, ?, ?)', runoffs)
+
+    def flush(self):
+        # Waits until everything queued so far is committed
+        self.queue.join()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    # Reading, on a fresh connection per call
+
+    def search(self, tenant, text=None, poll_id=None, since=None, until=None, page=1, per_page=20):
+        where = ['p.tenant = ?']
+        params = [tenant]
+        joins = ''
+        if text:
+            if self.fts:
+                joins = 'JOIN polls_fts f ON f.rowid = p.id'
+                where.append('polls_fts MATCH ?')
+                params.append(' '.join('"{}"'.format(word.replace('"', '""')) for word in text.split()))
+            else:
+                where.append("p.question LIKE ? ESCAPE '\\'")
+                params.append('%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if poll_id:
+            where.append('p.poll = ?')
+            params.append(poll_id)
+        if since is not None:
+            where.append('p.ended >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('p.ended < ?')
+            params.append(until)
+        clause = ' AND '.join(where)
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            total = conn.execute(f'SELECT COUNT(*) FROM polls p {joins} WHERE {clause}', params).fetchone()[0]
+            rows = conn.execute(
+                f'SELECT p.id, p.tenant, p.poll, p.question, p.started, p.ended, p.total, p.reason, '
+                f'r.poll_id, r.winner '
+                f'FROM polls p {joins} LEFT JOIN poll_runoffs r ON r.poll_id = p.id '
+                f'WHERE {clause} ORDER BY p.ended DESC, p.id DESC LIMIT ? OFFSET ?',
+                params + [per_page, (page - 1) * per_page]).fetchall()
+        finally:
+            conn.close()
+        keys = ('id', 'tenant', 'poll', 'question', 'started', 'ended', 'total_votes', 'reason')
+        polls = []
+        for row in rows:
+            entry = dict(zip(keys, row))
+            if row[8] is not None:
+                entry['kind'] = 'ranked'
+                entry['winner'] = row[9]
+            polls.append(entry)
+        return {'polls': polls, 'page': page, 'per_page': per_page, 'total': total}
+
+    def get(self, tenant, archive_id):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            row = conn.execute('SELECT id, tenant, poll, question, started, ended, total, reason '
+                               'FROM polls WHERE id = ? AND tenant = ?', (archive_id, tenant)).fetchone()
+            if row is None:
+                return None
+            options = conn.execute('SELECT option, votes FROM poll_options WHERE poll_id = ? '
+                                   'ORDER BY position', (archive_id,)).fetchall()
+            runoff = conn.execute('SELECT winner, rounds FROM poll_runoffs WHERE poll_id = ?',
+                                  (archive_id,)).fetchone()
+        finally:
+            conn.close()
+        keys = ('id', 'tenant', 'poll', 'question', 'started', 'ended', 'total_votes', 'reason')
+        entry = dict(zip(keys, row))
+        entry['options'] = [option for option, _ in options]
+        entry['votes'] = {option: votes for option, votes in options}
+        if runoff is not None:
+            # votes are first preferences; the runoff decides the winner
+            entry['kind'] = 'ranked'
+            entry['winner'] = runoff[0]
+            entry['rounds'] = json.loads(runoff[1])
+        return entry
@@ -0,0 +1,225 @@
+import atexit
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import deque
+
+from answers import normalize_answer
+
+# Optional traffic capture (REDLIX_CAPTURE=path) for replay with
+# tools/replay.py. Records are appended to a compact binary file by a
+# background thread; request threads only pack a few bytes and push them on a
+# deque.
+#
+# File layout, all little-endian:
+#   segment  'S' start_time:f64                 written each time a process opens the file
+#   meta     'M' offset_ms:u32 slot:u16 len:u32 JSON {tenant, poll, event, kind, question, options,
+#                                                     active, capacity}
+#            (event is 'start' for a started poll, 'attach' the first time
+#            an already running poll is seen; capacity only for free text)
+#   value    'V' offset_ms:u32 slot:u16 len:u32 JSON answer or ballot
+#            (the next option index of a free-text poll, or the next
+#            ballot index of a ranked-choice poll)
+#   event    kind:u8 offset_ms:u32 slot:u16 voter:u64 option:u32 status:u8   (20 bytes)
+#
+# offset_ms counts from the segment start. A slot number stands for one
+# (tenant, poll) and its meta record maps option indexes to option text;
+# NO_OPTION stands for no option, or one the poll doesn't have. A free-text
+# poll starts with no options; each distinct normalized answer gets the next
+# index, announced by a value record before the first vote that uses it. In
+# a ranked-choice poll the option of a vote indexes the poll's distinct
+# ballots ([best, next, ...]) the same way. Up to MAX_VALUES of them are
+# kept per run; later new ones are recorded as NO_OPTION.
+# Voter keys are a keyed BLAKE2b hash of the client address with a random
+# per-process key, so captures can't be mapped back to IP addresses.
+
+MAGIC = b'RDLXCAP2'
+SEGMENT = struct.Struct('<Bd')
+META = struct.Struct('<BIHI')
+EVENT = struct.Struct('<BIHQIB')
+NO_OPTION = 0xFFFFFFFF
+MAX_VALUES = 100000
+
+VOTE, COOLDOWN, POLL, STOP, RESET = 1, 2, 3, 4, 5
+META_KIND, SEGMENT_KIND, VALUE_KIND = ord('M'), ord('S'), ord('V')
+KIND_NAMES = {VOTE: 'vote', COOLDOWN: 'cooldown', POLL: 'poll', STOP: 'stop', RESET: 'reset'}
+STATUS_CODES = {'ok': 0, 'inactive': 1, 'invalid': 2, 'cooldown': 3}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+MAX_SLOTS = 65535
+
+
+class TrafficCapture:
+    def __init__(self, path, flush_interval=0.2):
+        self.path = path
+        self.key = os.urandom(16)
+        self.began = time.time()
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.slots = {}    # (tenant, poll) -> slot
+        self.indexes = {}  # slot -> {option: index}
+        self.kinds = {}    # slot -> 'choice', 'text' or 'ranked'
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.file.write(SEGMENT.pack(SEGMENT_KIND, self.began))
+        self.file.flush()
+        self.flush_interval = flush_interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='redlix-capture', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def voter_key(self, voter):
+        digest = hashlib.blake2b(voter.encode(), digest_size=8, key=self.key).digest()
+        return int.from_bytes(digest, 'little')
+
+    def _offset(self):
+        return int((time.time() - self.began) * 1000)
+
+    def _meta(self, tenant, poll_id, event, snap):
+        # Assigns (or reuses) the slot for a poll and records its options
+        with self.lock:
+            slot = self.slots.get((tenant, poll_id))
+            if slot is None:
+                if len(self.slots) >= MAX_SLOTS:
+                    return None
+                slot = len(self.slots)
+            kind = snap.get('kind', 'choice')
+            options = [] if kind == 'text' else snap['options']
+            self.indexes[slot] = {} if kind == 'ranked' else {opt: i for i, opt in enumerate(options)}
+            self.kinds[slot] = kind
+            meta = {
+                'tenant': tenant,
+                'poll': poll_id,
+                'event': event,
+                'kind': kind,
+                'question': snap['question'],
+                'options': options,
+                'active': snap['active']
+            }
+            if kind == 'text':
+                meta['capacity'] = snap['capacity']
+            body = json.dumps(meta).encode()
+            self.queue.append(META.pack(META_KIND, self._offset(), slot, len(body)) + body)
+            # Published only now, so no event for this slot is queued before its meta
+            self.slots[(tenant, poll_id)] = slot
+        return slot
+
+    def _slot(self, tenant, poll_id, target):
+        slot = self.slots.get((tenant, poll_id))
+        if slot is None:
+            slot = self._meta(tenant, poll_id, 'attach', target.snapshot())
+        return slot
+
+    def record(self, kind, tenant, poll_id, target, voter='', option=None, status='ok'):
+        slot = self._slot(tenant, poll_id, target)
+        if slot is None:
+            return
+        index = NO_OPTION
+        if option is not None:
+            index = self._index(slot, option)
+        self.queue.append(EVENT.pack(kind, self._offset(), slot,
+                                     self.voter_key(voter) if voter else 0,
+                                     index, STATUS_CODES.get(status, 0)))
+
+    def _index(self, slot, option):
+        indexes = self.indexes[slot]
+        if self.kinds[slot] == 'text':
+            answer = normalize_answer(option)
+            if answer is None:
+                return NO_OPTION
+            index = indexes.get(answer)
+            return index if index is not None else self._add_value(slot, indexes, answer, answer)
+        if self.kinds[slot] == 'ranked':
+            # Kept as sent, so an invalid ballot replays as invalid too
+            ballot = [option] if isinstance(option, str) else option
+            if not isinstance(ballot, list) or not all(isinstance(opt, str) for opt in ballot):
+                return NO_OPTION
+            index = indexes.get(tuple(ballot))
+            return index if index is not None else self._add_value(slot, indexes, tuple(ballot), ballot)
+        if not isinstance(option, str):
+            return NO_OPTION
+        return indexes.get(option, NO_OPTION)
+
+    def _add_value(self, slot, indexes, key, value):
+        # Gives a new answer or ballot the slot's next index and queues its
+        # value record
+        with self.lock:
+            if self.indexes[slot] is not indexes:
+                return NO_OPTION  # the poll was restarted meanwhile
+            index = indexes.get(key)
+            if index is None:
+                if len(indexes) >= MAX_VALUES:
+                    return NO_OPTION
+                index = indexes[key] = len(indexes)
+                body = json.dumps(value).encode()
+                self.queue.append(META.pack(VALUE_KIND, self._offset(), slot, len(body)) + body)
+            return index
+
+    def started(self, tenant, poll_id, target):
+        self._meta(tenant, poll_id, 'start', target.snapshot())
+
+    def _drain(self):
+        chunks = []
+        try:
+            while True:
+                chunks.append(self.queue.popleft())
+        except IndexError:
+            pass
+        if chunks:
+            self.file.write(b''.join(chunks))
+            self.file.flush()
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self._drain()
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.thread.join()
+        self._drain()
+        self.file.close()
+
+
+def read_capture(path):
+    # Yields ('segment', time, None, None), ('meta', time, slot, dict),
+    # ('value', time, slot, value) and
+    # (kind name, time, slot, voter, option index, status name) in file
+    # order with absolute timestamps, reading the file a record at a time
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a capture file')
+        base = 0.0
+        while True:
+            head = f.read(1)
+            if not head:
+                return
+            kind = head[0]
+            if kind == SEGMENT_KIND:
+                body = f.read(SEGMENT.size - 1)
+                if len(body) < SEGMENT.size - 1:
+                    return
+                _, base = SEGMENT.unpack(head + body)
+                yield ('segment', base, None, None)
+            elif kind in (META_KIND, VALUE_KIND):
+                body = f.read(META.size - 1)
+                if len(body) < META.size - 1:
+                    return
+                _, offset, slot, length = META.unpack(head + body)
+                text = f.read(length)
+                if len(text) < length:
+                    return
+                yield ('meta' if kind == META_KIND else 'value', base + offset / 1000, slot, json.loads(text))
+            elif kind in KIND_NAMES:
+                body = f.read(EVENT.size - 1)
+                if len(body) < EVENT.size - 1:
+                    return  # truncated tail from a crash
+                _, offset, slot, voter, option, status = EVENT.unpack(head + body)
+                yield (KIND_NAMES[kind], base + offset / 1000, slot, voter, option, STATUS_NAMES.get(status))
+            else:
+                raise ValueError(f'corrupt capture at byte {f.tell() - 1}')
@@ -0,0 +1,192 @@
+import socket
+import threading
+import time
+from urllib.parse import urlparse, unquote
+
+from profiler import log
+
+# Chat command ingestion. Reads an IRC-style line stream (Twitch chat or any
+# IRC server), picks out '!vote N' / '!vote <option>' messages and applies
+# them to a poll in batches through PollStore.vote_batch, so a whole batch
+# costs one lock round-trip. Chat users are keyed as 'chat:<nick>' for the
+# cooldown, separate from web voters keyed by IP.
+#
+#   :nick!user@host PRIVMSG #channel :!vote 2
+#   @badge-info=;color=... :nick!nick@nick.tmi.twitch.tv PRIVMSG #channel :!vote 2
+
+PRIVMSG = b' PRIVMSG '
+COMMAND = b' :!vote '
+
+
+def parse_line(line):
+    # (nick, argument) for a '!vote' PRIVMSG line, otherwise None. Works on
+    # raw bytes; only vote lines are decoded at all. The message text is the
+    # trailing parameter after ' PRIVMSG <channel> :', and it must start with
+    # '!vote ': a '!vote' later in the text ('lol :!vote 2') is just chat.
+    if line[:1] == b'@':
+        line = line[line.find(b' ') + 1:]
+    if line[:1] != b':':
+        return None
+    prefix_end = line.find(b' ')
+    if prefix_end < 0 or line[prefix_end:prefix_end + len(PRIVMSG)] != PRIVMSG:
+        return None
+    channel_end = line.find(b' ', prefix_end + len(PRIVMSG))
+    if channel_end < 0 or line[channel_end:channel_end + len(COMMAND)] != COMMAND:
+        return None
+    prefix = line[1:prefix_end]
+    end = prefix.find(b'!')
+    return prefix[:end if end >= 0 else len(prefix)].lower(), line[channel_end + len(COMMAND):].strip()
+
+
+class ChatIngestor:
+    def __init__(self, host, port, channel, resolve_store, cooldown, nick='justinfan12345',
+                 password=None, batch_size=1000, interval=0.05, on_batch=None, on_accepted=None):
+        self.host = host
+        self.port = port
+        self.channel = channel if channel.startswith('#') else '#' + channel
+        self.resolve_store = resolve_store  # () -> PollStore, looked up per batch
+        self.cooldown = cooldown
+        self.nick = nick
+        self.password = password
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_batch = on_batch  # (counts, lines) after each batch
+        self.on_accepted = on_accepted  # (store, [(voter, option), ...]) per batch
+        self.options = None
+        self.lookup = {}
+        self.lines = 0
+        self.commands = 0
+        self.applied = {}
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_url(cls, url, resolve_store, cooldown, **kwargs):
+        # irc://[nick:password@]host:port/#channel
+        parsed = urlparse(url)
+        channel = unquote(parsed.fragment and '#' + parsed.fragment or parsed.path.lstrip('/'))
+        if parsed.username:
+            kwargs['nick'] = unquote(parsed.username)
+        if parsed.password:
+            kwargs['password'] = unquote(parsed.password)
+        return cls(parsed.hostname, parsed.port or 6667, channel, resolve_store, cooldown, **kwargs)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='redlix-chat', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _resolve(self, argument, options):
+        if options != self.options:
+            self.options = options
+            self.lookup = {opt.casefold(): opt for opt in options}
+        if argument.isdigit():
+            index = int(argument) - 1
+            return options[index] if 0 <= index < len(options) else None
+        return self.lookup.get(argument.decode('utf-8', 'replace').casefold())
+
+    def flush(self, batch, lines):
+        if not batch and not lines:
+            return
+        counts = {}
+        if batch:
+            store = self.resolve_store()
+            # The poll without its tally: no runoff or answer ranking per batch
+            snap = store.voter_view()
+            options = snap['options']
+            text = snap.get('kind') == 'text'
+            votes = []
+            for nick, argument in batch if snap['active'] else ():
+                # Free-text polls take the whole argument as the answer
+                option = argument.decode('utf-8', 'replace') if text else self._resolve(argument, options)
+                if option is None:
+                    counts['invalid'] = counts.get('invalid', 0) + 1
+                else:
+                    votes.append((f"chat:{nick.decode('utf-8', 'replace')}", option))
+            if not snap['active']:
+                counts['inactive'] = len(batch)
+            elif votes:
+                accepted = [] if self.on_accepted else None
+                for status, count in store.vote_batch(votes, self.cooldown, accepted).items():
+                    counts[status] = counts.get(status, 0) + count
+                if accepted:
+                    self.on_accepted(store, accepted)
+            for status, count in counts.items():
+                self.applied[status] = self.applied.get(status, 0) + count
+        if self.on_batch:
+            self.on_batch(counts, lines)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        hello = []
+        if self.password:
+            hello.append(f'PASS {self.password}')
+        hello.append(f'NICK {self.nick}')
+        hello.append(f'JOIN {self.channel}')
+        sock.sendall(''.join(line + '\r\n' for line in hello).encode())
+        sock.settimeout(self.interval)
+        return sock
+
+    def _run(self):
+        delay = 1.0
+        while not self.stopped.is_set():
+            try:
+                sock = self._connect()
+            except OSError as exc:
+                log.warning('chat: cannot connect to %s:%s: %s', self.host, self.port, exc)
+                self.stopped.wait(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            delay = 1.0
+            self.connected.set()
+            try:
+                self._read(sock)
+            except OSError as exc:
+                log.warning('chat: connection lost: %s', exc)
+            finally:
+                self.connected.clear()
+                sock.close()
+            self.stopped.wait(delay)
+
+    def _read(self, sock):
+        buffer = b''
+        batch = []
+        lines = 0
+        flushed = time.monotonic()
+        while not self.stopped.is_set():
+            try:
+                data = sock.recv(65536)
+                if not data:
+                    break
+            except socket.timeout:
+                data = b''
+            if data:
+                buffer += data
+                parts = buffer.split(b'\n')
+                buffer = parts.pop()
+                lines += len(parts)
+                for line in parts:
+                    if line[:4] == b'PING':
+                        sock.sendall(b'PONG' + line[4:].rstrip(b'\r') + b'\r\n')
+                        continue
+                    command = parse_line(line)
+                    if command is not None:
+                        batch.append(command)
+            now = time.monotonic()
+            if len(batch) >= self.batch_size or now - flushed >= self.interval:
+                self.flush(batch, lines)
+                self.lines += lines
+                self.commands += len(batch)
+                batch = []
+                lines = 0
+                flushed = now
+        self.flush(batch, lines)
+        self.lines += lines
+        self.commands += len(batch)
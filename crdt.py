@@ -0,0 +1,232 @@
+import json
+import threading
+import urllib.request
+import uuid
+
+from memory import deep_size, sampled_size
+from store import MemoryStore
+from timeseries import VoteSeries
+
+# Multi-node vote aggregation. Every voting node keeps a grow-only counter per
+# option for its own replica and ships it to one aggregator, which merges the
+# replicas by taking the maximum of each slot. Merging is idempotent, so lost
+# or repeated deltas never double count. A restarted node comes back under a
+# new replica id, leaving the slots it shipped before the restart intact.
+#
+# Resetting or restarting a poll opens a new epoch; counters from an older
+# epoch are discarded instead of being decremented.
+
+
+def new_epoch():
+    return uuid.uuid4().hex[:12]
+
+
+def aggregator_has_poll(aggregator_url):
+    # True when the aggregator runs this poll, so a node may attach to it
+    try:
+        with urllib.request.urlopen(aggregator_url.rstrip('/') + '/crdt/status', timeout=5) as resp:
+            return 'replicas' in json.loads(resp.read())
+    except (OSError, ValueError):
+        return False
+
+
+class AggregatorStore(MemoryStore):
+    # Owns the poll metadata. Votes accepted here count as its own replica
+    # (the inherited tallies); other replicas are merged into self.remote.
+    local_tally = False
+
+    def __init__(self):
+        super().__init__()
+        self.epoch = new_epoch()
+        self.remote = {}  # option -> {replica: count}
+
+    def start(self, question, options):
+        with self.lock:
+            self.epoch = new_epoch()
+            self.remote = {opt: {} for opt in options}
+        super().start(question, options)
+
+    def reset(self):
+        with self.lock:
+            self.epoch = new_epoch()
+            self.remote = {opt: {} for opt in self.state['options']}
+        super().reset()
+
+    def merge(self, replica, epoch, counts):
+        with self.lock:
+            if epoch == self.epoch:
+                for opt, count in counts.items():
+                    slots = self.remote.get(opt)
+                    if slots is not None and count > slots.get(replica, 0):
+                        self.series.record(opt, count - slots.get(replica, 0))
+                        slots[replica] = count
+                        self.state['version'] += 1
+        return self.view(replica)
+
+    def _merged_votes(self):
+        return {opt: count + sum(self.remote.get(opt, {}).values())
+                for opt, count in self.state['votes'].items()}
+
+    def view(self, replica):
+        # Poll state as seen by one replica, including what we hold for it
+        with self.lock:
+            return {
+                'epoch': self.epoch,
+                'active': self.state['active'],
+                'question': self.state['question'],
+                'options': list(self.state['options']),
+                'start_time': self.state['start_time'],
+                'version': self.state['version'],
+                'votes': self._merged_votes(),
+                'acked': {opt: slots.get(replica, 0) for opt, slots in self.remote.items()}
+            }
+
+    def snapshot(self):
+        with self.lock:
+            snap = dict(self.state)
+            snap['options'] = list(snap['options'])
+            snap['votes'] = self._merged_votes()
+        return snap
+
+    def export_state(self):
+        data = super().export_state()
+        with self.lock:
+            data['epoch'] = self.epoch
+            data['remote'] = {opt: dict(slots) for opt, slots in self.remote.items()}
+        return data
+
+    def import_state(self, data):
+        super().import_state(data)
+        with self.lock:
+            self.epoch = data['epoch']
+            self.remote = data['remote']
+
+    def replicas(self):
+        with self.lock:
+            seen = set()
+            for slots in self.remote.values():
+                seen.update(slots)
+        return sorted(seen)
+
+    def memory_usage(self):
+        usage = super().memory_usage()
+        with self.lock:
+            remote = self.remote
+        usage['replicas'] = sampled_size(remote)
+        return usage
+
+
+class NodeStore(MemoryStore):
+    # Accepts votes locally and syncs with the aggregator in the background.
+    # The inherited tallies are this replica's counter for the current epoch.
+    local_tally = False
+
+    # aggregator_url is the poll's API base on the aggregator, e.g.
+    # http://host:5001/t/default/api/polls/default
+    def __init__(self, aggregator_url, node_id, interval=0.25):
+        super().__init__()
+        self.aggregator_url = aggregator_url.rstrip('/')
+        self.replica = f'{node_id}/{uuid.uuid4().hex[:8]}'
+        self.interval = interval
+        self.epoch = None
+        self.view = None
+        self.synced = threading.Event()
+        self.closed = threading.Event()
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+
+    def _post(self, path, payload):
+        req = urllib.request.Request(
+            self.aggregator_url + path,
+            data=json.dumps(payload).encode(),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return json.loads(resp.read())
+
+    def _apply_view(self, view):
+        with self.lock:
+            if view['epoch'] != self.epoch:
+                self.epoch = view['epoch']
+                self.state['votes'] = {opt: 0 for opt in view['options']}
+                self.series = VoteSeries(view['options'])
+            self.state['active'] = view['active']
+            self.state['question'] = view['question']
+            self.state['options'] = view['options']
+            self.state['start_time'] = view['start_time']
+            # Any change seen at the aggregator is a new version here too
+            if self.view is None or view['version'] != self.view['version']:
+                self.state['version'] += 1
+            self.view = view
+
+    def sync(self):
+        with self.lock:
+            acked = self.view['acked'] if self.view and self.view['epoch'] == self.epoch else {}
+            delta = {opt: count for opt, count in self.state['votes'].items()
+                     if count != acked.get(opt, 0)}
+            epoch = self.epoch
+        view = self._post('/crdt/merge', {
+            'replica': self.replica, 'epoch': epoch, 'counts': delta
+        })
+        self._apply_view(view)
+        self.synced.set()
+
+    def _sync_loop(self):
+        while not self.closed.is_set():
+            try:
+                self.sync()
+            except OSError:
+                self.synced.clear()
+            self.closed.wait(self.interval)
+
+    def close(self):
+        self.closed.set()
+
+    def pending(self):
+        # Local votes the aggregator has not acknowledged yet
+        with self.lock:
+            acked = self.view['acked'] if self.view and self.view['epoch'] == self.epoch else {}
+            return sum(count - acked.get(opt, 0) for opt, count in self.state['votes'].items())
+
+    def memory_usage(self):
+        usage = super().memory_usage()
+        with self.lock:
+            view = self.view
+        usage['view'] = deep_size(view)
+        return usage
+
+    # The aggregator holds the state; unshipped votes are flushed first
+    def export_state(self):
+        self.sync()
+        return None
+
+    def import_state(self, data):
+        pass
+
+    # Poll control is owned by the aggregator
+    def start(self, question, options):
+        self._post('/start', {'question': question, 'options': options})
+        self.sync()
+
+    def stop(self):
+        self._post('/stop', {})
+        self.sync()
+
+    def reset(self):
+        self._post('/reset', {})
+        self.sync()
+
+    def snapshot(self):
+        with self.lock:
+            snap = dict(self.state)
+            snap['options'] = list(snap['options'])
+            view = self.view
+            if view is None or view['epoch'] != self.epoch:
+                snap['votes'] = dict(snap['votes'])
+                return snap
+            # Global totals, with our own slot replaced by the local counter
+            snap['votes'] = {
+                opt: view['votes'].get(opt, 0) - view['acked'].get(opt, 0) + count
+                for opt, count in self.state['votes'].items()
+            }
+        return snap
@@ -0,0 +1,182 @@
+import json
+import os
+import pickle
+import socket
+import struct
+import threading
+
+from werkzeug.serving import ThreadedWSGIServer
+
+from profiler import log
+
+# Zero-downtime restarts. A process started with REDLIX_CONTROL=path listens
+# on that unix socket; `python polls.py --takeover` with the same path
+# connects to it and takes over:
+#
+#   1. the old process passes its listening sockets over (SCM_RIGHTS), so
+#      the ports stay open throughout and new connections queue in the
+#      kernel instead of being refused;
+#   2. the new process starts accepting, holding requests until it has the
+#      state, and says so;
+#   3. the old process stops accepting, waits for the connections it took
+#      to finish, and sends every poll, tally and cooldown as one pickled
+#      frame;
+#   4. the new process loads it, starts answering and confirms; the old
+#      process exits. Until that confirmation any failure puts the old
+#      process back in service.
+#
+# The state is pickled, so only a process of the same user may connect.
+
+FRAME = struct.Struct('!Q')
+MAX_FDS = 16
+TAKEOVER = b'takeover\n'
+ACCEPTING = b'accepting\n'
+DONE = b'ok\n'
+
+
+class DrainingServer(ThreadedWSGIServer):
+    # Counts connections from accept to close, so drain() also waits for the
+    # ones accepted just before the accept loop stopped
+    def __init__(self, *args, **kwargs):
+        self.active = 0
+        self.idle = threading.Condition()
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request, client_address):
+        with self.idle:
+            self.active += 1
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._finished()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._finished()
+
+    def _finished(self):
+        with self.idle:
+            self.active -= 1
+            if not self.active:
+                self.idle.notify_all()
+
+    def drain(self, timeout):
+        # True once every accepted connection is closed
+        with self.idle:
+            return self.idle.wait_for(lambda: not self.active, timeout)
+
+
+def check_peer(conn):
+    if hasattr(socket, 'SO_PEERCRED'):
+        creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', creds)
+        if uid != os.getuid():
+            raise PermissionError(f'control socket peer runs as uid {uid}')
+
+
+def recv_exact(conn, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = conn.recv_into(view[got:])
+        if not n:
+            raise ConnectionError('control connection closed')
+        got += n
+    return bytes(buf)
+
+
+def expect(conn, message):
+    got = recv_exact(conn, len(message))
+    if got != message:
+        raise ValueError(f'expected {message!r}, got {got!r}')
+
+
+def send_frame(conn, payload):
+    conn.sendall(FRAME.pack(len(payload)) + payload)
+
+
+def recv_frame(conn):
+    size, = FRAME.unpack(recv_exact(conn, FRAME.size))
+    return recv_exact(conn, size)
+
+
+def send_listeners(conn, sockets):
+    # sockets: {name: listening socket}; the names travel with the fds
+    names = list(sockets)
+    header = json.dumps(names).encode()
+    socket.send_fds(conn, [FRAME.pack(len(header)) + header], [sockets[name].fileno() for name in names])
+
+
+def send_state(conn, state):
+    send_frame(conn, pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def recv_state(conn):
+    return pickle.loads(recv_frame(conn))
+
+
+def take_over(path):
+    # Asks the process behind path for its listening sockets; returns the
+    # control connection and {name: fd}
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+        check_peer(conn)
+        conn.sendall(TAKEOVER)
+        data, fds, _, _ = socket.recv_fds(conn, 4096, MAX_FDS)
+        if len(data) < FRAME.size:
+            data += recv_exact(conn, FRAME.size - len(data))
+        size, = FRAME.unpack(data[:FRAME.size])
+        header = data[FRAME.size:]
+        if len(header) < size:
+            header += recv_exact(conn, size - len(header))
+        names = json.loads(header)
+    except BaseException:
+        conn.close()
+        raise
+    if len(names) != len(fds):
+        conn.close()
+        raise ValueError(f'expected {len(names)} sockets, got {len(fds)}')
+    return conn, dict(zip(names, fds))
+
+
+class ControlSocket:
+    # Waits for one process to take over; on_takeover(conn) returns True
+    # once it has, which ends the listener
+    def __init__(self, path, on_takeover):
+        self.path = path
+        self.on_takeover = on_takeover
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        umask = os.umask(0o177)
+        try:
+            self.sock.bind(path)
+        finally:
+            os.umask(umask)
+        self.sock.listen(1)
+        self.thread = threading.Thread(target=self._run, name='redlix-control', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    check_peer(conn)
+                    expect(conn, TAKEOVER)
+                except (OSError, ValueError) as exc:
+                    log.warning('control: rejected connection: %s', exc)
+                    continue
+                if self.on_takeover(conn):
+                    self.sock.close()
+                    return
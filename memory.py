@@ -0,0 +1,178 @@
+import sys
+import threading
+import tracemalloc
+from itertools import islice
+
+from profiler import thread_label
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Approximate memory accounting and tracemalloc snapshots for the dashboard's
+# /api/memory endpoints. Sizes are sys.getsizeof summed over reachable
+# containers; large tables are estimated from a sample of their entries so a
+# report costs the same with ten or ten million cooldowns.
+
+SAMPLE = 1000
+MAX_OBJECTS = 100000
+OPAQUE = (type, type(sys), type(len), type(lambda: 0), threading.Thread,
+          type(threading.Lock()), type(threading.RLock()))
+
+
+def deep_size(obj, seen=None):
+    # getsizeof of obj plus everything reachable through containers, slots
+    # and instance dicts, counting shared objects once
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack and len(seen) < MAX_OBJECTS:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, OPAQUE):
+            continue
+        if isinstance(item, dict):
+            for key, value in list(item.items()):
+                stack.append(key)
+                stack.append(value)
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(list(item))
+        else:
+            for cls in type(item).__mro__:
+                slots = cls.__dict__.get('__slots__', ())
+                for name in (slots,) if isinstance(slots, str) else slots:
+                    if hasattr(item, name):
+                        stack.append(getattr(item, name))
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+    return total
+
+
+def sampled_size(container, sample=SAMPLE):
+    # Container overhead plus the average entry size of a sample of entries
+    # times the number of entries
+    count = len(container)
+    if count <= sample:
+        return deep_size(container)
+    try:
+        if isinstance(container, dict):
+            entries = list(islice(container.items(), sample))
+            per_entry = sum(deep_size(key) + deep_size(value) for key, value in entries) / len(entries)
+        else:
+            entries = list(islice(container, sample))
+            per_entry = sum(deep_size(entry) for entry in entries) / len(entries)
+    except RuntimeError:
+        # Resized while we looked; the container itself is still a fair guess
+        return sys.getsizeof(container)
+    return sys.getsizeof(container) + int(per_entry * count)
+
+
+def process_memory():
+    usage = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'VmHWM', 'VmSize'):
+                    usage[{'VmRSS': 'rss', 'VmHWM': 'peak_rss', 'VmSize': 'virtual'}[name]] = \
+                        int(value.split()[0]) * 1024
+    except OSError:
+        if resource is not None:
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            usage['peak_rss'] = peak if sys.platform == 'darwin' else peak * 1024
+    usage['allocated_blocks'] = sys.getallocatedblocks()
+    return usage
+
+
+def thread_usage():
+    threads = threading.enumerate()
+    by_name = {}
+    for thread in threads:
+        label = thread_label(thread.name)
+        by_name[label] = by_name.get(label, 0) + 1
+    stack = threading.stack_size()
+    if not stack:
+        soft = resource.getrlimit(resource.RLIMIT_STACK)[0] if resource is not None else 0
+        stack = soft if 0 < soft < 1 << 30 else 8 << 20
+    return {
+        'count': len(threads),
+        'by_name': by_name,
+        # Address space reserved for stacks; resident use is usually a few
+        # tens of KB per thread
+        'stack_reserved_bytes': stack * len(threads)
+    }
+
+
+class AllocationTracker:
+    # tracemalloc start/snapshot/diff/stop. Tracing slows every allocation
+    # down, so it only runs between start and stop.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.baseline = None
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=1):
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, min(int(frames), 25)))
+
+    def stop(self):
+        with self.lock:
+            self.baseline = None
+            tracemalloc.stop()
+
+    def _take(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def snapshot(self):
+        # Stores the baseline that diff() compares against
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                return None
+            self.baseline = self._take()
+            stats = self.baseline.statistics('filename')
+        return {'blocks': sum(stat.count for stat in stats), 'bytes': sum(stat.size for stat in stats)}
+
+    def diff(self, top=20, group='lineno'):
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                return None
+            current = self._take()
+            if self.baseline is not None:
+                stats = current.compare_to(self.baseline, group)
+            else:
+                stats = current.statistics(group)
+        sites = []
+        for stat in stats[:top]:
+            sites.append({
+                'site': [f'{frame.filename}:{frame.lineno}' for frame in stat.traceback],
+                'bytes': stat.size,
+                'bytes_diff': getattr(stat, 'size_diff', stat.size),
+                'blocks': stat.count,
+                'blocks_diff': getattr(stat, 'count_diff', stat.count)
+            })
+        return {'compared_to_baseline': self.baseline is not None, 'sites': sites}
+
+    def status(self):
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            'active': tracemalloc.is_tracing(),
+            'frames': tracemalloc.get_traceback_limit(),
+            'traced_bytes': traced,
+            'traced_peak_bytes': peak,
+            'overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+            'baseline': self.baseline is not None
+        }
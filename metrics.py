@@ -0,0 +1,136 @@
+import bisect
+import threading
+
+# In-process metrics in Prometheus text format. Every thread records into its
+# own shard (plain dicts, no locking on the hot path); a scrape sums the
+# shards. Shards of finished threads are folded into one retired shard so the
+# werkzeug thread-per-connection model doesn't grow the shard list forever.
+# Folding happens on a scrape and whenever the list doubles, so a server that
+# is never scraped keeps at most about two shards per live thread.
+
+MIN_FOLD = 64
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Shard:
+    __slots__ = ('thread', 'counters', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.counters = {}    # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf, sum]
+
+    def merge_into(self, counters, histograms):
+        for key, value in list(self.counters.items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, entry in list(self.histograms.items()):
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = list(entry)
+            else:
+                for i, value in enumerate(entry):
+                    total[i] += value
+
+
+class Metrics:
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []
+        self.retired = Shard(None)
+        self.fold_at = MIN_FOLD
+        self.meta = {}  # name -> (type, help)
+
+    def describe(self, name, kind, text):
+        self.meta[name] = (kind, text)
+
+    def _shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = Shard(threading.current_thread())
+            with self.lock:
+                self.shards.append(shard)
+                if len(self.shards) >= self.fold_at:
+                    self._fold()
+            return shard
+
+    def _fold(self):
+        # Merges the shards of finished threads into retired; needs self.lock
+        alive = []
+        for shard in self.shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                shard.merge_into(self.retired.counters, self.retired.histograms)
+        self.shards = alive
+        self.fold_at = max(MIN_FOLD, 2 * len(alive))
+
+    def inc(self, name, labels=(), amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        entry[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        entry[-1] += value
+
+    def collect(self):
+        with self.lock:
+            self._fold()
+            alive = list(self.shards)
+            counters, histograms = {}, {}
+            self.retired.merge_into(counters, histograms)
+        for shard in alive:
+            shard.merge_into(counters, histograms)
+        return counters, histograms
+
+    def render(self, gauges=()):
+        # gauges: iterable of (name, labels, value) computed at scrape time
+        counters, histograms = self.collect()
+        lines = []
+        seen = set()
+
+        def header(name, default_kind):
+            if name not in seen:
+                seen.add(name)
+                kind, text = self.meta.get(name, (default_kind, ''))
+                if text:
+                    lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in sorted(counters.items(), key=sort_key):
+            header(name, 'counter')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for name, labels, value in sorted(gauges, key=lambda gauge: gauge[0]):
+            header(name, 'gauge')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), entry in sorted(histograms.items(), key=sort_key):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), entry):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {entry[-1]}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def sort_key(item):
+    name, labels = item[0]
+    return name, str(labels)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for key, value in labels)
+    return '{' + pairs + '}'
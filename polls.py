@@ -1,27 +1,363 @@
-from flask import Flask, render_template_string, request, jsonify, send_from_directory
+from flask import Flask, render_template_string, request, jsonify, send_from_directory, abort, g, Response, stream_with_context
 from flask_cors import CORS
-from threading import Thread
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.serving import WSGIRequestHandler
+from threading import Thread, Lock
+import threading
 import time
 import os
-from datetime import datetime, timedelta
+import re
+import socket
+import sys
+from collections import OrderedDict
+from store import make_store, MemoryStore
+from timeseries import RESOLUTIONS
+from metrics import Metrics
+from profiler import SamplingProfiler, PhaseTimer, log
+from capture import TrafficCapture, VOTE, COOLDOWN, POLL, STOP, RESET
+from memory import AllocationTracker, deep_size, sampled_size, process_memory, thread_usage
+from chat import ChatIngestor
+from archive import PollArchive
+from answers import DEFAULT_CAPACITY, MIN_CAPACITY, MAX_CAPACITY, MAX_ANSWER_LENGTH, capacity_for
+from publish import SnapshotPublisher
+from handoff import DrainingServer, ControlSocket, take_over, send_listeners, send_state, recv_state, expect, ACCEPTING, DONE
+from votelog import VoteLog, encode_rows, export_votes, export_results, parse_time, iso, VOTE_FIELDS, RESULT_FIELDS
 
 # Get the directory where polls.py is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Shared poll state
-poll_state = {
-    'active': False,
-    'question': '',
-    'options': [],
-    'votes': {},
-    'start_time': None
-}
-
-vote_cooldowns = {}  # Store IP addresses and their cooldown end times
+DISPLAY_PORT = int(os.environ.get('REDLIX_DISPLAY_PORT', 5000))
+DASHBOARD_PORT = int(os.environ.get('REDLIX_DASHBOARD_PORT', 5001))
+VOTING_PORT = int(os.environ.get('REDLIX_VOTING_PORT', 5002))
+PUBLIC_HOST = os.environ.get('REDLIX_PUBLIC_HOST', 'localhost')
+# Ports the pages should use, when they differ from the listening ports
+# (e.g. workers behind router.py)
+PUBLIC_DISPLAY_PORT = int(os.environ.get('REDLIX_PUBLIC_DISPLAY_PORT', DISPLAY_PORT))
+PUBLIC_DASHBOARD_PORT = int(os.environ.get('REDLIX_PUBLIC_DASHBOARD_PORT', DASHBOARD_PORT))
+PUBLIC_VOTING_PORT = int(os.environ.get('REDLIX_PUBLIC_VOTING_PORT', VOTING_PORT))
+
+# Set when running behind router.py so cooldowns see the real client IP
+TRUST_PROXY = os.environ.get('REDLIX_TRUST_PROXY') == '1'
+
+# Shared poll state and voter cooldowns. Defaults to the in-process store;
+# set REDLIX_STORE=redis://host:port/db to share state between hosts, or
+# REDLIX_STORE=aggregator / node+http://aggregator:5001 for multi-node setups.
+STORE_URL = os.environ.get('REDLIX_STORE')
+NODE_ID = os.environ.get('REDLIX_NODE_ID') or socket.gethostname()
+
+COOLDOWN_SECONDS = int(os.environ.get('REDLIX_COOLDOWN_SECONDS', 30))
+
+# Counters per free-text poll unless the start request gives epsilon or
+# capacity; counts are then at most total_votes / capacity too high
+TEXT_CAPACITY = int(os.environ.get('REDLIX_TEXT_CAPACITY', DEFAULT_CAPACITY))
+
+# Options the display page shows; larger polls show their leaders only
+DISPLAY_TOP = int(os.environ.get('REDLIX_DISPLAY_TOP', 20))
+MAX_OPTIONS_PAGE = 1000
+
+# How long the pages wait before their next read (next_poll_ms in /api/poll):
+# a base per client, longer while no poll runs or the server has more than
+# REDLIX_BUSY_CONNECTIONS connections open, shorter in the first seconds of
+# a poll. The pages add up to ±REFRESH_JITTER to it themselves, so that
+# pages opened together drift apart even when they read one static snapshot
+REFRESH_MS = {'display': 1000, 'dashboard': 2000, 'voting': 3000}
+IDLE_REFRESH_FACTOR = 3
+FRESH_POLL_SECONDS = 10
+BUSY_CONNECTIONS = int(os.environ.get('REDLIX_BUSY_CONNECTIONS', 32))
+MAX_LOAD_FACTOR = 4
+MAX_REFRESH_MS = 15000
+REFRESH_JITTER = 0.2
+
+# Set REDLIX_CAPTURE=path to record vote, cooldown, poll and dashboard
+# requests for tools/replay.py
+CAPTURE_PATH = os.environ.get('REDLIX_CAPTURE')
+capture = TrafficCapture(CAPTURE_PATH) if CAPTURE_PATH else None
+
+# Set REDLIX_CHAT=irc://[nick:password@]host:port/#channel to take '!vote N'
+# chat commands for REDLIX_CHAT_POLL (tenant/poll_id, default the default poll)
+CHAT_URL = os.environ.get('REDLIX_CHAT')
+CHAT_POLL = os.environ.get('REDLIX_CHAT_POLL', 'default/default')
+chat = None
+
+# Set REDLIX_VOTE_LOG=directory to keep every accepted vote on disk for the
+# /api/export endpoints
+VOTE_LOG_DIR = os.environ.get('REDLIX_VOTE_LOG')
+vote_log = VoteLog(VOTE_LOG_DIR) if VOTE_LOG_DIR else None
+
+# Set REDLIX_ARCHIVE=path.db to keep stopped, reset and replaced polls in a
+# searchable SQLite archive (/api/archive)
+ARCHIVE_PATH = os.environ.get('REDLIX_ARCHIVE')
+poll_archive = PollArchive(ARCHIVE_PATH) if ARCHIVE_PATH else None
+
+# Set REDLIX_PUBLISH_DIR=directory to keep every poll's /api/poll response on
+# disk, rewritten at most every REDLIX_PUBLISH_INTERVAL seconds, for a static
+# file server or reverse proxy to answer viewers with (see publish.py)
+PUBLISH_DIR = os.environ.get('REDLIX_PUBLISH_DIR')
+PUBLISH_INTERVAL = float(os.environ.get('REDLIX_PUBLISH_INTERVAL', 0.2))
+
+# /api/poll is the same for every viewer, so proxies and other clients may
+# reuse it for a second and serve it stale while they fetch the next one.
+# Our own pages fetch with cache: 'no-store' and always see the latest poll.
+POLL_CACHE_CONTROL = 'public, max-age=1, stale-while-revalidate=2'
+
+# Set REDLIX_CONTROL=path to allow zero-downtime restarts: `polls.py
+# --takeover` with the same path inherits the listening sockets and the
+# state of the running process (see handoff.py). The old process gives its
+# in-flight requests up to REDLIX_DRAIN_SECONDS to finish first.
+CONTROL_PATH = os.environ.get('REDLIX_CONTROL')
+DRAIN_SECONDS = float(os.environ.get('REDLIX_DRAIN_SECONDS', 30))
+
+# Every route also exists under /t/<tenant>/ so one process can host many
+# channels, and each tenant can run several polls side by side under
+# /api/polls/<poll_id>/. The unprefixed routes belong to the default tenant
+# and its default poll.
+DEFAULT_TENANT = 'default'
+DEFAULT_POLL = 'default'
+ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def store_path(tenant, poll_id):
+    return f'/t/{tenant}/api/polls/{poll_id}'
+
+def new_store(tenant, poll_id):
+    if (tenant, poll_id) == (DEFAULT_TENANT, DEFAULT_POLL):
+        namespace = 'redlix'
+    else:
+        namespace = f'redlix:t:{tenant}:{poll_id}'
+    return make_store(STORE_URL, namespace=namespace, node_id=NODE_ID,
+                      path=store_path(tenant, poll_id))
+
+# Poll registry: (tenant, poll id) -> store. Each store has its own lock and
+# cooldown table, so a busy poll never blocks a quiet one.
+stores = {(DEFAULT_TENANT, DEFAULT_POLL): new_store(DEFAULT_TENANT, DEFAULT_POLL)}
+stores_lock = Lock()
+store = stores[(DEFAULT_TENANT, DEFAULT_POLL)]
+
+# Stands in for polls that were never started so that reads and votes for
+# unknown ids don't allocate anything. It is never started.
+IDLE_STORE = MemoryStore()
+
+# Redis polls this process reads or votes on without having started them,
+# least recently used first. Reusing the store keeps its vote-rate history
+# and fragment cache; the bound keeps client-chosen ids from piling up.
+attached = OrderedDict()
+MAX_ATTACHED = int(os.environ.get('REDLIX_MAX_ATTACHED', 1024))
+
+def attached_store(tenant, poll_id):
+    key = (tenant, poll_id)
+    with stores_lock:
+        found = attached.get(key)
+        if found is not None:
+            attached.move_to_end(key)
+            return found
+        found = attached[key] = new_store(tenant, poll_id)
+        if len(attached) > MAX_ATTACHED:
+            evicted, _ = attached.popitem(last=False)
+            fragments.pop(evicted, None)
+    return found
+
+def poll_store(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL, create=False):
+    found = stores.get((tenant, poll_id))
+    if found is not None:
+        return found
+    if not ID_RE.match(tenant) or not ID_RE.match(poll_id):
+        abort(404)
+    # Only starting, importing or merging a poll registers it. Anything else
+    # on an unknown id must not leave a store behind for good: Redis polls go
+    # through the bounded attached table, a node attaches only to polls its
+    # aggregator runs, and in-memory polls don't exist until they are started.
+    if not create:
+        if STORE_URL and STORE_URL.startswith('redis://'):
+            return attached_store(tenant, poll_id)
+        if not (STORE_URL and STORE_URL.startswith('node+')):
+            return IDLE_STORE
+        from crdt import aggregator_has_poll
+        if not aggregator_has_poll(STORE_URL[len('node+'):].rstrip('/') + store_path(tenant, poll_id)):
+            return IDLE_STORE
+    with stores_lock:
+        found = stores.get((tenant, poll_id))
+        if found is None:
+            found = attached.pop((tenant, poll_id), None) or new_store(tenant, poll_id)
+            stores[(tenant, poll_id)] = found
+    if not create:
+        # A node just attached; let the request see the poll it asked for
+        found.synced.wait(5)
+    return found
+
+def tenant_polls(tenant):
+    with stores_lock:
+        return {poll_id: found for (owner, poll_id), found in stores.items() if owner == tenant}
+
+def drop_tenant(tenant):
+    dropped = []
+    with stores_lock:
+        for key in [key for key in stores if key[0] == tenant]:
+            if key != (DEFAULT_TENANT, DEFAULT_POLL):
+                dropped.append(stores.pop(key))
+                fragments.pop(key, None)
+    for found in dropped:
+        found.close()
+
+def tenant_route(app, rule, **options):
+    # Registers rule for the default tenant and under /t/<tenant>
+    def decorator(view):
+        app.add_url_rule(rule, view_func=view, **options)
+        app.add_url_rule('/t/<tenant>' + rule, view_func=view, **options)
+        return view
+    return decorator
+
+def poll_route(app, action, **options):
+    # /api/<action> for the default poll and /api/polls/<poll_id>/<action>,
+    # both with and without a tenant prefix
+    def decorator(view):
+        tenant_route(app, f'/api/{action}', **options)(view)
+        tenant_route(app, f'/api/polls/<poll_id>/{action}', **options)(view)
+        return view
+    return decorator
+
+def page_urls(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    # Base URLs the embedded pages use to reach each server, and the API
+    # prefix of the poll they show
+    prefix = '' if tenant == DEFAULT_TENANT else f'/t/{tenant}'
+    return {
+        'poll_api': '/api' if poll_id == DEFAULT_POLL else f'/api/polls/{poll_id}',
+        'display_url': f'http://{PUBLIC_HOST}:{PUBLIC_DISPLAY_PORT}{prefix}',
+        'dashboard_url': f'http://{PUBLIC_HOST}:{PUBLIC_DASHBOARD_PORT}{prefix}',
+        'voting_url': f'http://{PUBLIC_HOST}:{PUBLIC_VOTING_PORT}{prefix}'
+    }
+
+# Request, vote and store metrics, served as /metrics on every app
+metrics = Metrics()
+metrics.describe('redlix_requests_total', 'counter', 'HTTP requests by app, route, method and status')
+metrics.describe('redlix_request_errors_total', 'counter', 'HTTP requests that ended with a 5xx status')
+metrics.describe('redlix_request_duration_seconds', 'histogram', 'Time spent handling a request')
+metrics.describe('redlix_votes_total', 'counter', 'Accepted votes')
+metrics.describe('redlix_votes_rejected_total', 'counter', 'Rejected votes by reason')
+metrics.describe('redlix_requests_started_total', 'counter', 'Requests that entered an app')
+metrics.describe('redlix_requests_finished_total', 'counter', 'Requests that produced a response')
+metrics.describe('redlix_connections_opened_total', 'counter', 'Client connections accepted')
+metrics.describe('redlix_connections_closed_total', 'counter', 'Client connections closed')
+metrics.describe('redlix_inflight_requests', 'gauge', 'Requests currently being handled')
+metrics.describe('redlix_open_connections', 'gauge', 'Open client connections')
+metrics.describe('redlix_threads', 'gauge', 'Live threads in the process')
+metrics.describe('redlix_polls', 'gauge', 'Polls in the registry')
+metrics.describe('redlix_fragment_renders_total', 'counter', 'Overlay result fragments rendered')
+metrics.describe('redlix_snapshots_published_total', 'counter', 'Poll snapshots written to REDLIX_PUBLISH_DIR')
+metrics.describe('redlix_poll_version', 'gauge', 'Current version of each poll')
+metrics.describe('redlix_request_phase_seconds', 'histogram', 'Time spent in each phase of a request')
+metrics.describe('redlix_cooldown_entries', 'gauge', 'Entries in the in-memory cooldown tables')
+metrics.describe('redlix_chat_lines_total', 'counter', 'Chat lines read by the chat ingestor')
+
+# Sampling profiler, toggled from the dashboard API, and the threshold above
+# which requests are logged with their phase timings
+profiler = SamplingProfiler()
+SLOW_REQUEST_MS = float(os.environ.get('REDLIX_SLOW_MS', 250))
+
+# tracemalloc snapshots for /api/memory/tracemalloc/*
+allocations = AllocationTracker()
+
+# Listening servers by app name. serving is set once the process has its
+# state: at startup, or when a --takeover has received it
+servers = {}
+serving = threading.Event()
+handed_over = threading.Event()
+
+def counting_handler(name):
+    # Request handler that counts connections for the open-connection gauge
+    class Handler(WSGIRequestHandler):
+        def handle(self):
+            # A process taking over accepts before it has the state; its
+            # requests wait here until then
+            serving.wait()
+            metrics.inc('redlix_connections_opened_total', (('app', name),))
+            try:
+                super().handle()
+            finally:
+                metrics.inc('redlix_connections_closed_total', (('app', name),))
+    return Handler
+
+def render_metrics():
+    counters, _ = metrics.collect()
+    gauges = []
+    for app_name in ('display', 'dashboard', 'voting'):
+        labels = (('app', app_name),)
+        started = counters.get(('redlix_requests_started_total', labels), 0)
+        finished = counters.get(('redlix_requests_finished_total', labels), 0)
+        opened = counters.get(('redlix_connections_opened_total', labels), 0)
+        closed = counters.get(('redlix_connections_closed_total', labels), 0)
+        gauges.append(('redlix_inflight_requests', labels, started - finished))
+        gauges.append(('redlix_open_connections', labels, opened - closed))
+    gauges.append(('redlix_threads', (), threading.active_count()))
+    with stores_lock:
+        registered = list(stores.items())
+    gauges.append(('redlix_polls', (), len(registered)))
+    cooldowns = 0
+    for (tenant, poll_id), found in registered:
+        gauges.append(('redlix_poll_version', (('tenant', tenant), ('poll', poll_id)), found.version()))
+        cooldowns += found.cooldown_count() or 0
+    gauges.append(('redlix_cooldown_entries', (), cooldowns))
+    return metrics.render(gauges)
+
+def record_chat_batch(counts, lines):
+    metrics.inc('redlix_chat_lines_total', amount=lines)
+    for status, count in counts.items():
+        if status == 'ok':
+            metrics.inc('redlix_votes_total', amount=count)
+        else:
+            metrics.inc('redlix_votes_rejected_total', (('reason', status),), count)
+
+def start_chat():
+    tenant, _, poll_id = CHAT_POLL.partition('/')
+    poll_id = poll_id or DEFAULT_POLL
+    if not ID_RE.match(tenant) or not ID_RE.match(poll_id):
+        raise SystemExit(f'REDLIX_CHAT_POLL must be tenant/poll_id, got {CHAT_POLL!r}')
+
+    def log_votes(target, accepted):
+        for voter, option in accepted:
+            vote_log.vote(tenant, poll_id, target, voter, option)
+
+    return ChatIngestor.from_url(CHAT_URL, lambda: poll_store(tenant, poll_id, create=True),
+                                 COOLDOWN_SECONDS, on_batch=record_chat_batch,
+                                 on_accepted=log_votes if vote_log else None).start()
+
+def make_app(name):
+    app = Flask(__name__)
+    CORS(app)
+    if TRUST_PROXY:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+    app_labels = (('app', name),)
+
+    @app.before_request
+    def start_timer():
+        g.timer = PhaseTimer()
+        metrics.inc('redlix_requests_started_total', app_labels)
+
+    @app.after_request
+    def record_request(response):
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (('app', name), ('route', rule))
+        timer = g.get('timer') or PhaseTimer()
+        elapsed = timer.elapsed()
+        metrics.observe('redlix_request_duration_seconds', labels, elapsed)
+        for phase, seconds in timer.phases:
+            metrics.observe('redlix_request_phase_seconds', labels + (('phase', phase),), seconds)
+        if elapsed * 1000 >= SLOW_REQUEST_MS:
+            log.warning('slow request: %s %s %d %.1fms %s', request.method, request.path,
+                        response.status_code, elapsed * 1000, timer.describe())
+        metrics.inc('redlix_requests_total', labels + (('method', request.method),
+                                                       ('status', response.status_code)))
+        if response.status_code >= 500:
+            metrics.inc('redlix_request_errors_total', labels)
+        metrics.inc('redlix_requests_finished_total', app_labels)
+        return response
+
+    @app.route('/metrics')
+    def serve_metrics():
+        return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+    return app
 
 # Display Server (Port 5000)
-display_app = Flask(__name__)
-CORS(display_app)
+display_app = make_app('display')
 
 DISPLAY_HTML = """
 <!DOCTYPE html>
@@ -153,10 +489,43 @@ DISPLAY_HTML = """
         </div>
     </div>
     <script>
+        // Poll text comes from the dashboard and, in free-text polls, from
+        // anonymous viewers; it is always shown as text, never as markup
+        function escapeHtml(text) {
+            return String(text).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})[c]);
+        }
+        
+        {% if overlay %}
+        // Overlay mode: the server renders the results once per poll version;
+        // an unchanged poll costs a 304 and no DOM work at all
+        let etag = null;
+        
+        function updateDisplay() {
+            fetch('{{ display_url }}{{ poll_api }}/poll/fragment', {
+                cache: 'no-store',
+                headers: etag ? {'If-None-Match': etag} : {}
+            })
+                .then(r => {
+                    refreshMs = Number(r.headers.get('X-Next-Poll-Ms')) || refreshMs;
+                    if (r.status !== 200) {
+                        return null;
+                    }
+                    etag = r.headers.get('ETag');
+                    return r.text();
+                })
+                .then(html => {
+                    if (html !== null) {
+                        document.getElementById('pollContainer').innerHTML = html;
+                    }
+                })
+                .finally(scheduleUpdate);
+        }
+        {% else %}
         function updateDisplay() {
-            fetch('http://localhost:5000/api/poll')
+            fetch('{{ display_url }}{{ poll_api }}/poll?top={{ display_top }}&client=display', {cache: 'no-store'})
                 .then(r => r.json())
                 .then(data => {
+                    refreshMs = data.next_poll_ms || refreshMs;
                     const container = document.getElementById('pollContainer');
                     if (!data.active) {
                         container.innerHTML = `
@@ -168,45 +537,234 @@ DISPLAY_HTML = """
                         return;
                     }
                     
-                    const totalVotes = Object.values(data.votes).reduce((a, b) => a + b, 0);
+                    const totalVotes = data.total_votes;
                     let html = `
                         <h1>Live Poll Results</h1>
-                        <div class="question">${data.question}</div>
+                        <div class="question">${escapeHtml(data.question)}</div>
                     `;
                     
+                    // Ranked-choice polls show the latest runoff round
+                    const ranked = data.kind === 'ranked';
+                    const counts = ranked ? data.rounds[data.rounds.length - 1].counts : data.votes;
+                    const share = ranked ? Object.values(counts).reduce((a, b) => a + b, 0) : totalVotes;
+                    
                     data.options.forEach(option => {
-                        const votes = data.votes[option] || 0;
-                        const percentage = totalVotes > 0 ? (votes / totalVotes * 100).toFixed(1) : 0;
+                        const votes = counts[option] || 0;
+                        const percentage = share > 0 ? (votes / share * 100).toFixed(1) : 0;
+                        const label = ranked && !(option in counts) ? 'eliminated' : `${votes} (${percentage}%)`;
+                        const mark = ranked && option === data.winner ? '🏆 ' : '';
                         html += `
                             <div class="option">
                                 <div class="option-bar" style="width: ${percentage}%"></div>
                                 <div class="option-content">
-                                    <span class="option-text">${option}</span>
-                                    <span class="option-votes">${votes} (${percentage}%)</span>
+                                    <span class="option-text">${mark}${escapeHtml(option)}</span>
+                                    <span class="option-votes">${label}</span>
                                 </div>
                             </div>
                         `;
                     });
                     
-                    html += `<div class="total-votes">Total Votes: ${totalVotes}</div>`;
+                    const noun = data.kind === 'text' ? 'answers' : 'options';
+                    let shown = data.option_count > data.options.length
+                        ? ` · top ${data.options.length} of ${data.option_count} ${noun}` : '';
+                    if (data.error_bound) {
+                        shown += ` · counts may be up to ${data.error_bound} high`;
+                    }
+                    if (ranked && data.rounds.length > 1) {
+                        shown += ` · round ${data.rounds.length}`;
+                    }
+                    html += `<div class="total-votes">Total Votes: ${totalVotes}${shown}</div>`;
                     container.innerHTML = html;
-                });
+                })
+                .finally(scheduleUpdate);
+        }
+        {% endif %}
+        
+        // The server says when to ask again (longer while idle or busy);
+        // the jitter keeps pages opened together from polling in step
+        let refreshMs = 1000;
+        let refreshTimer = null;
+        
+        function jittered(ms) {
+            return ms * (1 - {{ refresh_jitter }} + 2 * {{ refresh_jitter }} * Math.random());
+        }
+        
+        function scheduleUpdate() {
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(updateDisplay, jittered(refreshMs));
         }
         
-        setInterval(updateDisplay, 1000);
         updateDisplay();
     </script>
 </body>
 </html>
 """
 
-@display_app.route('/')
-def display():
-    return render_template_string(DISPLAY_HTML)
-
-@display_app.route('/api/poll')
-def get_poll():
-    return jsonify(poll_state)
+@tenant_route(display_app, '/')
+@tenant_route(display_app, '/polls/<poll_id>/')
+def display(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    return render_template_string(DISPLAY_HTML, display_top=DISPLAY_TOP, overlay=False,
+                                  refresh_jitter=REFRESH_JITTER, **page_urls(tenant, poll_id))
+
+@tenant_route(display_app, '/overlay')
+@tenant_route(display_app, '/polls/<poll_id>/overlay')
+def display_overlay(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    return render_template_string(DISPLAY_HTML, display_top=DISPLAY_TOP, overlay=True,
+                                  refresh_jitter=REFRESH_JITTER, **page_urls(tenant, poll_id))
+
+# Results block of the display page rendered on the server, for overlay
+# mode. It is built once per poll version and every overlay gets the same
+# bytes, revalidated with If-None-Match.
+FRAGMENT_HTML = """{% if not active %}<div class="waiting">
+    <h1>📊 Waiting for Poll...</h1>
+    <p>No active poll at the moment</p>
+</div>{% else %}<h1>Live Poll Results</h1>
+<div class="question">{{ question }}</div>
+{% for row in rows %}<div class="option">
+    <div class="option-bar" style="width: {{ row.width }}%"></div>
+    <div class="option-content">
+        <span class="option-text">{{ row.text }}</span>
+        <span class="option-votes">{{ row.label }}</span>
+    </div>
+</div>
+{% endfor %}<div class="total-votes">Total Votes: {{ total }}{{ shown }}</div>{% endif %}"""
+fragment_template = None
+fragments = {}  # (tenant, poll_id) -> (store, version, etag, body)
+FRAGMENT_TAG = os.urandom(4).hex()  # keeps ETags from a previous process from matching
+
+def render_fragment(snap):
+    # Same layout and numbers as updateDisplay() in DISPLAY_HTML
+    global fragment_template
+    if fragment_template is None:
+        fragment_template = display_app.jinja_env.from_string(FRAGMENT_HTML)
+    if not snap['active']:
+        return fragment_template.render(active=False)
+    ranked = snap.get('kind') == 'ranked'
+    counts = snap['rounds'][-1]['counts'] if ranked else snap['votes']
+    total = snap.get('total_votes', sum(snap['votes'].values()))
+    share = sum(counts.values()) if ranked else total
+    rows = []
+    for option in snap['options']:
+        votes = counts.get(option, 0)
+        percentage = f'{votes / share * 100:.1f}' if share else '0'
+        rows.append({
+            'text': ('🏆 ' if ranked and option == snap['winner'] else '') + option,
+            'label': 'eliminated' if ranked and option not in counts else f'{votes} ({percentage}%)',
+            'width': percentage
+        })
+    noun = 'answers' if snap.get('kind') == 'text' else 'options'
+    shown = ''
+    if snap.get('option_count', 0) > len(snap['options']):
+        shown += f" · top {len(snap['options'])} of {snap['option_count']} {noun}"
+    if snap.get('error_bound'):
+        shown += f" · counts may be up to {snap['error_bound']} high"
+    if ranked and len(snap['rounds']) > 1:
+        shown += f" · round {len(snap['rounds'])}"
+    return fragment_template.render(active=True, question=snap['question'], rows=rows, total=total, shown=shown)
+
+def poll_fragment(tenant, poll_id, target):
+    # (etag, body) for the poll's current version, rendering only on a change.
+    # Unknown polls all share the idle store's entry.
+    key = (tenant, poll_id) if target is not IDLE_STORE else None
+    cacheable = key is None or stores.get(key) is target or attached.get(key) is target
+    cached = fragments.get(key)
+    if cached is not None and cached[0] is target and cached[1] == target.version():
+        return cached[2], cached[3], cached[4]
+    snap = target.leaders(DISPLAY_TOP)
+    body = render_fragment(snap).encode()
+    etag = f"{FRAGMENT_TAG}-{id(target):x}-{snap['version']}"
+    state = {'active': snap['active'], 'start_time': snap['start_time']}
+    if cacheable:
+        fragments[key] = (target, snap['version'], etag, body, state)
+    metrics.inc('redlix_fragment_renders_total')
+    return etag, body, state
+
+def next_poll_ms(snap, client='voting', app_name='display'):
+    interval = REFRESH_MS.get(client, REFRESH_MS['voting'])
+    if not snap['active']:
+        interval *= IDLE_REFRESH_FACTOR
+    elif snap.get('start_time') and time.time() - snap['start_time'] < FRESH_POLL_SECONDS:
+        # Viewers are arriving; let them see the first votes sooner
+        interval /= 2
+    server = servers.get(app_name)
+    if server is not None and server.active > BUSY_CONNECTIONS:
+        interval *= min(MAX_LOAD_FACTOR, server.active / BUSY_CONNECTIONS)
+    return int(min(interval, MAX_REFRESH_MS))
+
+@poll_route(display_app, 'poll')
+@tenant_route(display_app, '/api/polls/<poll_id>')
+def get_poll(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    target = poll_store(tenant, poll_id)
+    # ?top=N ships only the N leading options, for polls with thousands
+    top = request.args.get('top', type=int)
+    if top is not None and top < 1:
+        return jsonify({'success': False, 'message': 'top must be at least 1'}), 400
+    snap = target.snapshot() if top is None else target.leaders(top)
+    snap['next_poll_ms'] = next_poll_ms(snap, request.args.get('client', 'voting'))
+    snap['next_poll_jitter'] = REFRESH_JITTER
+    if capture:
+        capture.record(POLL, tenant, poll_id, target, request.remote_addr)
+    g.timer.mark('snapshot')
+    response = jsonify(snap)
+    response.headers['Cache-Control'] = POLL_CACHE_CONTROL
+    g.timer.mark('serialize')
+    return response
+
+def published_path(tenant, poll_id):
+    # Where a poll's snapshot goes under REDLIX_PUBLISH_DIR: its URL path
+    prefix = '' if tenant == DEFAULT_TENANT else f't/{tenant}/'
+    return prefix + ('api/poll' if poll_id == DEFAULT_POLL else f'api/polls/{poll_id}/poll')
+
+def published_polls():
+    with stores_lock:
+        return {published_path(tenant, poll_id): found for (tenant, poll_id), found in stores.items()}
+
+def render_published(found):
+    version = found.version()
+    snap = found.snapshot()
+    snap['next_poll_ms'] = next_poll_ms(snap)
+    snap['next_poll_jitter'] = REFRESH_JITTER
+    return snap.get('version', version), display_app.json.response(snap).get_data()
+
+def record_published(count):
+    metrics.inc('redlix_snapshots_published_total', amount=count)
+
+publisher = SnapshotPublisher(PUBLISH_DIR, published_polls, render_published, PUBLISH_INTERVAL,
+                              on_publish=record_published) if PUBLISH_DIR else None
+
+# Options in their original order, a page at a time
+@poll_route(display_app, 'poll/options')
+def get_poll_options(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    if offset < 0 or not 1 <= limit <= MAX_OPTIONS_PAGE:
+        return jsonify({'success': False,
+                        'message': f'offset must be >= 0 and limit 1..{MAX_OPTIONS_PAGE}'}), 400
+    return jsonify(poll_store(tenant, poll_id).options_page(offset, limit))
+
+@poll_route(display_app, 'poll/fragment')
+def get_poll_fragment(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    target = poll_store(tenant, poll_id)
+    if capture:
+        capture.record(POLL, tenant, poll_id, target, request.remote_addr)
+    etag, body, state = poll_fragment(tenant, poll_id, target)
+    g.timer.mark('render')
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Next-Poll-Ms'] = str(next_poll_ms(state, 'display'))
+    response.headers['Access-Control-Expose-Headers'] = 'ETag, X-Next-Poll-Ms'
+    return response.make_conditional(request)
+
+# Votes per second (resolution=s) or per minute (resolution=m) for the last
+# `window` periods, one array per option, oldest first
+@poll_route(display_app, 'poll/timeseries')
+def get_poll_timeseries(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    resolution = request.args.get('resolution', 's')
+    if resolution not in RESOLUTIONS:
+        return jsonify({'success': False, 'message': 'resolution must be s or m'}), 400
+    window = request.args.get('window', 60, type=int)
+    return jsonify(poll_store(tenant, poll_id).timeseries(resolution, window))
 
 # Add route to serve media files
 @display_app.route('/media/<path:filename>')
@@ -215,8 +773,7 @@ def serve_media(filename):
     return send_from_directory(media_dir, filename)
 
 # Dashboard Server (Port 5001)
-dashboard_app = Flask(__name__)
-CORS(dashboard_app)
+dashboard_app = make_app('dashboard')
 
 DASHBOARD_HTML = """
 <!DOCTYPE html>
@@ -372,7 +929,7 @@ DASHBOARD_HTML = """
             letter-spacing: 0.5px;
         }
 
-        input[type="text"] {
+        input[type="text"], select {
             width: 100%;
             padding: 0.75rem;
             background: var(--white);
@@ -384,7 +941,7 @@ DASHBOARD_HTML = """
             transition: border-color 0.2s;
         }
 
-        input[type="text"]:focus {
+        input[type="text"]:focus, select:focus {
             outline: none;
             border-color: var(--primary-red);
         }
@@ -581,6 +1138,15 @@ DASHBOARD_HTML = """
                 </div>
                 
                 <div class="form-group">
+                    <label>Poll Type:</label>
+                    <select id="kind" onchange="changeKind()">
+                        <option value="choice">Multiple choice</option>
+                        <option value="ranked">Ranked choice</option>
+                        <option value="text">Free-text answers</option>
+                    </select>
+                </div>
+                
+                <div class="form-group" id="optionsGroup">
                     <label>Options:</label>
                     <div class="options-list" id="optionsList">
                         <div class="option-item">
@@ -629,8 +1195,25 @@ DASHBOARD_HTML = """
             list.appendChild(div);
         }
         
+        function changeKind() {
+            const text = document.getElementById('kind').value === 'text';
+            document.getElementById('optionsGroup').style.display = text ? 'none' : '';
+        }
+        
         function startPoll() {
             const question = document.getElementById('question').value;
+            if (document.getElementById('kind').value === 'text') {
+                if (!question) {
+                    alert('Please enter a question');
+                    return;
+                }
+                fetch('{{ dashboard_url }}{{ poll_api }}/start', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({question, kind: 'text'})
+                }).then(() => updateStatus());
+                return;
+            }
             const optionInputs = document.querySelectorAll('#optionsList input');
             const options = Array.from(optionInputs)
                 .map(i => i.value.trim())
@@ -641,27 +1224,36 @@ DASHBOARD_HTML = """
                 return;
             }
             
-            fetch('http://localhost:5001/api/start', {
+            const kind = document.getElementById('kind').value;
+            fetch('{{ dashboard_url }}{{ poll_api }}/start', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({question, options})
+                body: JSON.stringify({question, options, kind})
             }).then(() => updateStatus());
         }
         
         function stopPoll() {
-            fetch('http://localhost:5001/api/stop', {method: 'POST'})
+            fetch('{{ dashboard_url }}{{ poll_api }}/stop', {method: 'POST'})
                 .then(() => updateStatus());
         }
         
         function resetPoll() {
-            fetch('http://localhost:5001/api/reset', {method: 'POST'})
+            fetch('{{ dashboard_url }}{{ poll_api }}/reset', {method: 'POST'})
                 .then(() => updateStatus());
         }
         
+        // Poll text comes from the dashboard and, in free-text polls, from
+        // anonymous viewers; it is always shown as text, never as markup
+        function escapeHtml(text) {
+            return String(text).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})[c]);
+        }
+        
         function updateStatus() {
-            fetch('http://localhost:5000/api/poll')
+            clearTimeout(refreshTimer);
+            fetch('{{ display_url }}{{ poll_api }}/poll?client=dashboard', {cache: 'no-store'})
                 .then(r => r.json())
                 .then(data => {
+                    refreshMs = data.next_poll_ms || refreshMs;
                     const statusDiv = document.getElementById('status');
                     if (data.active) {
                         statusDiv.className = 'status active';
@@ -673,7 +1265,7 @@ DASHBOARD_HTML = """
                             const votes = data.votes[opt] || 0;
                             html += `
                                 <div class="result-item">
-                                    <span>${opt}</span>
+                                    <span>${escapeHtml(opt)}</span>
                                     <strong>${votes} votes</strong>
                                 </div>
                             `;
@@ -685,39 +1277,372 @@ DASHBOARD_HTML = """
                         statusDiv.textContent = '⛔ Poll Inactive';
                         document.getElementById('results').innerHTML = '';
                     }
+                })
+                .finally(() => {
+                    clearTimeout(refreshTimer);
+                    refreshTimer = setTimeout(updateStatus, jittered(refreshMs));
                 });
         }
         
-        setInterval(updateStatus, 2000);
+        // Dashboard actions refresh at once; otherwise the server's interval,
+        // with jitter so that open dashboards do not poll in step
+        let refreshMs = 2000;
+        let refreshTimer = null;
+        
+        function jittered(ms) {
+            return ms * (1 - {{ refresh_jitter }} + 2 * {{ refresh_jitter }} * Math.random());
+        }
         updateStatus();
     </script>
 </body>
 </html>
 """
 
-@dashboard_app.route('/')
-def dashboard():
-    return render_template_string(DASHBOARD_HTML)
+@tenant_route(dashboard_app, '/')
+@tenant_route(dashboard_app, '/polls/<poll_id>/')
+def dashboard(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    return render_template_string(DASHBOARD_HTML, refresh_jitter=REFRESH_JITTER, **page_urls(tenant, poll_id))
 
-@dashboard_app.route('/api/start', methods=['POST'])
-def start_poll():
+@poll_route(dashboard_app, 'start', methods=['POST'])
+def start_poll(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
     data = request.json
-    poll_state['active'] = True
-    poll_state['question'] = data['question']
-    poll_state['options'] = data['options']
-    poll_state['votes'] = {opt: 0 for opt in data['options']}
-    poll_state['start_time'] = time.time()
+    kind = data.get('kind', 'choice')
+    if kind == 'text':
+        try:
+            if data.get('epsilon') is not None:
+                epsilon = float(data['epsilon'])
+                if not 0 < epsilon < 1:
+                    raise ValueError(epsilon)
+                capacity = capacity_for(epsilon)
+            else:
+                capacity = int(data.get('capacity') or TEXT_CAPACITY)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'epsilon must be between 0 and 1, capacity a number'}), 400
+        if not MIN_CAPACITY <= capacity <= MAX_CAPACITY:
+            return jsonify({'success': False,
+                            'message': f'capacity must be {MIN_CAPACITY}..{MAX_CAPACITY}'}), 400
+    elif kind not in ('choice', 'ranked'):
+        return jsonify({'success': False, 'message': 'kind must be choice, ranked or text'}), 400
+    target = poll_store(tenant, poll_id, create=True)
+    previous = target.snapshot() if poll_archive else None
+    if kind == 'text':
+        try:
+            target.start_text(data['question'], capacity)
+        except NotImplementedError:
+            return jsonify({'success': False, 'message': 'free-text polls need the memory store'}), 400
+    elif kind == 'ranked':
+        try:
+            target.start_ranked(data['question'], data['options'])
+        except NotImplementedError:
+            return jsonify({'success': False, 'message': 'ranked-choice polls need the memory store'}), 400
+    else:
+        target.start(data['question'], data['options'])
+    if poll_archive:
+        poll_archive.archive(tenant, poll_id, previous, 'replaced')
+    if capture:
+        capture.started(tenant, poll_id, target)
+    if vote_log:
+        vote_log.started(tenant, poll_id, target.snapshot())
+    if publisher:
+        publisher.wake()
+    return jsonify({'success': True})
+
+@poll_route(dashboard_app, 'stop', methods=['POST'])
+def stop_poll(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    target = poll_store(tenant, poll_id)
+    if target is IDLE_STORE:
+        return jsonify({'success': False, 'message': 'No such poll'}), 404
+    # Only the stop that ends a run changes or archives anything, so a
+    # repeated stop doesn't bump the version and archive the run again
+    if target.snapshot()['active']:
+        target.stop()
+        if poll_archive:
+            poll_archive.archive(tenant, poll_id, target.snapshot(), 'stopped')
+    if capture:
+        capture.record(STOP, tenant, poll_id, target)
+    if publisher:
+        publisher.wake()
     return jsonify({'success': True})
 
-@dashboard_app.route('/api/stop', methods=['POST'])
-def stop_poll():
-    poll_state['active'] = False
+@poll_route(dashboard_app, 'reset', methods=['POST'])
+def reset_poll(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    target = poll_store(tenant, poll_id)
+    if target is IDLE_STORE:
+        return jsonify({'success': False, 'message': 'No such poll'}), 404
+    previous = target.snapshot() if poll_archive else None
+    target.reset()
+    if poll_archive:
+        poll_archive.archive(tenant, poll_id, previous, 'reset')
+    if capture:
+        capture.record(RESET, tenant, poll_id, target)
+    if vote_log:
+        vote_log.reset(tenant, poll_id, target)
+    if publisher:
+        publisher.wake()
     return jsonify({'success': True})
 
-@dashboard_app.route('/api/reset', methods=['POST'])
-def reset_poll():
-    if poll_state['options']:
-        poll_state['votes'] = {opt: 0 for opt in poll_state['options']}
+@tenant_route(dashboard_app, '/api/polls')
+def list_polls(tenant=DEFAULT_TENANT):
+    polls = []
+    for poll_id, found in sorted(tenant_polls(tenant).items()):
+        snap = found.snapshot()
+        polls.append({
+            'id': poll_id,
+            'active': snap['active'],
+            'question': snap['question'],
+            'total_votes': snap.get('total_votes', sum(snap['votes'].values()))
+        })
+    return jsonify({'polls': polls})
+
+# Tenants hosted by this process, used by router.py when rebalancing
+@dashboard_app.route('/api/tenants')
+def list_tenants():
+    with stores_lock:
+        hosted = sorted({tenant for tenant, _ in stores})
+    return jsonify({'tenants': hosted})
+
+# Moves a tenant's in-memory state between worker processes
+@tenant_route(dashboard_app, '/api/tenant/state', methods=['GET', 'POST', 'DELETE'])
+def tenant_state(tenant=DEFAULT_TENANT):
+    if request.method == 'POST':
+        for poll_id, state in request.json['polls'].items():
+            poll_store(tenant, poll_id, create=True).import_state(state)
+        return jsonify({'success': True})
+    if request.method == 'DELETE':
+        drop_tenant(tenant)
+        return jsonify({'success': True})
+    exported = {poll_id: found.export_state() for poll_id, found in tenant_polls(tenant).items()}
+    if all(state is None for state in exported.values()):
+        return jsonify({'state': None})
+    return jsonify({'state': {'polls': exported}})
+
+# Receives counter deltas from voting nodes (REDLIX_STORE=aggregator only)
+@poll_route(dashboard_app, 'crdt/merge', methods=['POST'])
+def crdt_merge(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    # Checked before the lookup, which registers the poll
+    if STORE_URL != 'aggregator':
+        return jsonify({'success': False, 'message': 'Not an aggregator'}), 404
+    target = poll_store(tenant, poll_id, create=True)
+    data = request.json
+    return jsonify(target.merge(data['replica'], data['epoch'], data['counts']))
+
+@poll_route(dashboard_app, 'crdt/status')
+def crdt_status(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    target = poll_store(tenant, poll_id)
+    status = {'role': type(target).__name__}
+    if hasattr(target, 'replicas'):
+        status['replicas'] = target.replicas()
+    if hasattr(target, 'pending'):
+        status['replica'] = target.replica
+        status['pending'] = target.pending()
+        status['synced'] = target.synced.is_set()
+    return jsonify(status)
+
+# Sampling profiler: POST start/stop/reset, GET returns collapsed stacks
+# ("frame;frame;frame count" lines) for flamegraph.pl or speedscope
+@dashboard_app.route('/api/profiler', methods=['GET'])
+def profiler_output():
+    return profiler.collapsed(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@dashboard_app.route('/api/profiler/status')
+def profiler_status():
+    return jsonify({
+        'active': profiler.active,
+        'samples': profiler.samples,
+        'interval_ms': profiler.interval * 1000,
+        'slow_request_ms': SLOW_REQUEST_MS
+    })
+
+@dashboard_app.route('/api/profiler/start', methods=['POST'])
+def profiler_start():
+    data = request.get_json(silent=True) or {}
+    try:
+        interval_ms = float(data.get('interval_ms', 5))
+        if not 0 < interval_ms < float('inf'):
+            raise ValueError(interval_ms)
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'interval_ms must be a positive number'}), 400
+    interval = max(1.0, interval_ms) / 1000
+    profiler.start(interval, include_idle=bool(data.get('include_idle')))
+    return jsonify({'success': True})
+
+@dashboard_app.route('/api/profiler/stop', methods=['POST'])
+def profiler_stop():
+    profiler.stop()
+    return jsonify({'success': True})
+
+@dashboard_app.route('/api/profiler/reset', methods=['POST'])
+def profiler_reset():
+    profiler.reset()
+    return jsonify({'success': True})
+
+@dashboard_app.route('/api/profiler/slow', methods=['POST'])
+def profiler_slow_threshold():
+    global SLOW_REQUEST_MS
+    data = request.get_json(silent=True) or {}
+    try:
+        threshold_ms = float(data['threshold_ms'])
+        if not 0 < threshold_ms < float('inf'):
+            raise ValueError(threshold_ms)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'threshold_ms must be a positive number'}), 400
+    SLOW_REQUEST_MS = threshold_ms
+    return jsonify({'success': True, 'slow_request_ms': SLOW_REQUEST_MS})
+
+def export_response(rows, fields, name):
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    compress = request.args.get('gzip') == '1'
+    headers = {'Content-Disposition': f'attachment; filename={name}.{fmt}'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(encode_rows(rows, fields, fmt, compress)),
+                    mimetype=mimetype, headers=headers)
+
+def export_range():
+    try:
+        return parse_time(request.args.get('from')), parse_time(request.args.get('to'))
+    except ValueError:
+        abort(400)
+
+# Streams every logged vote (REDLIX_VOTE_LOG) as CSV or NDJSON.
+# ?format=csv|ndjson&gzip=1&from=&to= (epoch seconds or ISO 8601)&poll=<id>
+@tenant_route(dashboard_app, '/api/export/votes')
+def export_vote_log(tenant=DEFAULT_TENANT):
+    if vote_log is None:
+        return jsonify({'success': False, 'message': 'Vote log is off (set REDLIX_VOTE_LOG)'}), 404
+    since, until = export_range()
+    rows = export_votes(vote_log, tenant, request.args.get('poll'), since, until)
+    return export_response(rows, VOTE_FIELDS, 'votes')
+
+# Results per poll run from the vote log, or the current tallies when the
+# log is off
+@tenant_route(dashboard_app, '/api/export/results')
+def export_poll_results(tenant=DEFAULT_TENANT):
+    since, until = export_range()
+    poll_id = request.args.get('poll')
+    if vote_log is not None:
+        rows = export_results(vote_log, tenant, poll_id, since, until)
+    else:
+        rows = []
+        for found_id, found in sorted(tenant_polls(tenant).items()):
+            snap = found.snapshot()
+            if (poll_id and found_id != poll_id) or not snap['options']:
+                continue
+            for option in snap['options']:
+                rows.append({
+                    'tenant': tenant,
+                    'poll': found_id,
+                    'run': '',
+                    'kind': snap.get('kind', 'choice'),
+                    'question': snap['question'],
+                    'started': iso(snap['start_time']) if snap['start_time'] else '',
+                    'option': option,
+                    'votes': snap['votes'].get(option, 0),
+                    'winner': snap.get('winner') or ''
+                })
+    return export_response(rows, RESULT_FIELDS, 'results')
+
+# Past polls, newest first: ?q=words in the question&poll=<id>&from=&to=
+# (time the poll ended)&page=1&per_page=20
+@tenant_route(dashboard_app, '/api/archive')
+def archive_search(tenant=DEFAULT_TENANT):
+    if poll_archive is None:
+        return jsonify({'success': False, 'message': 'Archive is off (set REDLIX_ARCHIVE)'}), 404
+    since, until = export_range()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(100, request.args.get('per_page', 20, type=int)))
+    return jsonify(poll_archive.search(tenant, request.args.get('q'), request.args.get('poll'),
+                                       since, until, page, per_page))
+
+@tenant_route(dashboard_app, '/api/archive/<int:archive_id>')
+def archive_entry(archive_id, tenant=DEFAULT_TENANT):
+    entry = poll_archive.get(tenant, archive_id) if poll_archive else None
+    if entry is None:
+        abort(404)
+    return jsonify(entry)
+
+@dashboard_app.route('/api/chat/status')
+def chat_status():
+    if chat is None:
+        return jsonify({'enabled': False})
+    return jsonify({
+        'enabled': True,
+        'channel': chat.channel,
+        'poll': CHAT_POLL,
+        'connected': chat.connected.is_set(),
+        'lines': chat.lines,
+        'commands': chat.commands,
+        'applied': chat.applied
+    })
+
+# Approximate memory use by poll state, cooldowns, caches and threads.
+# Large tables are sampled, so this is cheap enough to call mid-stream.
+@dashboard_app.route('/api/memory')
+def memory_report():
+    with stores_lock:
+        registered = list(stores.items())
+    parts = {}
+    largest = []
+    for (tenant, poll_id), found in registered:
+        usage = found.memory_usage()
+        for part, size in usage.items():
+            parts[part] = parts.get(part, 0) + size
+        largest.append((sum(usage.values()), tenant, poll_id))
+    largest.sort(reverse=True)
+    with metrics.lock:
+        shards = metrics.shards + [metrics.retired]
+    caches = {
+        'metrics': sum(deep_size(shard.counters) + deep_size(shard.histograms) for shard in shards),
+        'profiler_stacks': sampled_size(profiler.stacks)
+    }
+    caches['fragments'] = sum(len(entry[3]) for entry in list(fragments.values()))
+    if capture:
+        caches['capture_queue'] = sampled_size(capture.queue)
+    return jsonify({
+        'process': process_memory(),
+        'polls': {
+            'count': len(registered),
+            'registry': deep_size([key for key, _ in registered]),
+            'bytes': parts,
+            'largest': [{'tenant': tenant, 'poll': poll_id, 'bytes': size}
+                        for size, tenant, poll_id in largest[:10]]
+        },
+        'caches': caches,
+        'threads': thread_usage(),
+        'tracemalloc': allocations.status()
+    })
+
+# tracemalloc: start (optionally {"frames": n}), snapshot to set a baseline,
+# diff to list the allocation sites that grew since, stop to switch it off
+@dashboard_app.route('/api/memory/tracemalloc/start', methods=['POST'])
+def tracemalloc_start():
+    data = request.get_json(silent=True) or {}
+    allocations.start(data.get('frames', 1))
+    return jsonify({'success': True, **allocations.status()})
+
+@dashboard_app.route('/api/memory/tracemalloc/snapshot', methods=['POST'])
+def tracemalloc_snapshot():
+    taken = allocations.snapshot()
+    if taken is None:
+        return jsonify({'success': False, 'message': 'tracemalloc is not running'}), 409
+    return jsonify({'success': True, **taken})
+
+@dashboard_app.route('/api/memory/tracemalloc/diff')
+def tracemalloc_diff():
+    group = request.args.get('group', 'lineno')
+    if group not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'success': False, 'message': 'group must be lineno, filename or traceback'}), 400
+    diff = allocations.diff(request.args.get('top', 20, type=int), group)
+    if diff is None:
+        return jsonify({'success': False, 'message': 'tracemalloc is not running'}), 409
+    return jsonify(diff)
+
+@dashboard_app.route('/api/memory/tracemalloc/stop', methods=['POST'])
+def tracemalloc_stop():
+    allocations.stop()
     return jsonify({'success': True})
 
 # Add route to serve media files
@@ -727,8 +1652,7 @@ def serve_media_dashboard(filename):
     return send_from_directory(media_dir, filename)
 
 # Voting Server (Port 5002)
-voting_app = Flask(__name__)
-CORS(voting_app)
+voting_app = make_app('voting')
 
 VOTING_HTML = """
 <!DOCTYPE html>
@@ -816,6 +1740,14 @@ VOTING_HTML = """
             transform: translateY(-1px);
         }
 
+        .answer-input {
+            width: 100%;
+            padding: 20px;
+            border: 3px solid var(--dark-gray);
+            font-family: 'Inter', sans-serif;
+            font-size: 1.1em;
+        }
+
         .message {
             text-align: center;
             padding: 20px;
@@ -971,6 +1903,13 @@ VOTING_HTML = """
     <script>
         let cooldownInterval = null;
         let remainingTime = 0;
+        let pollOptions = [];
+
+        // Poll text comes from the dashboard and, in free-text polls, from
+        // anonymous viewers; it is always shown as text, never as markup
+        function escapeHtml(text) {
+            return String(text).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'})[c]);
+        }
 
         function createIceCrystals() {
             const container = document.getElementById('crystals');
@@ -989,6 +1928,9 @@ VOTING_HTML = """
 
         function showCooldown(seconds) {
             remainingTime = seconds;
+            if (document.getElementById('cooldownOverlay')) {
+                return;
+            }
             const container = document.getElementById('voteContainer');
             container.classList.add('frozen');
             
@@ -1024,21 +1966,11 @@ VOTING_HTML = """
             }, 1000);
         }
 
-        function checkCooldown() {
-            fetch('http://localhost:5002/api/cooldown')
-                .then(r => r.json())
-                .then(data => {
-                    if (data.on_cooldown && data.remaining > 0) {
-                        showCooldown(data.remaining);
-                    }
-                });
-        }
-
         function vote(option) {
-            fetch('http://localhost:5002/api/vote', {
+            fetch('{{ voting_url }}{{ poll_api }}/vote', {
                 method: 'POST',
                 headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({option})
+                body: JSON.stringify(Array.isArray(option) ? {ranking: option} : {option})
             })
             .then(r => r.json())
             .then(data => {
@@ -1048,7 +1980,7 @@ VOTING_HTML = """
                         <h1>✅ Vote Submitted!</h1>
                         <div class="message success">
                             Thank you for voting!<br>
-                            Your vote for "${option}" has been recorded.
+                            Your vote for "${escapeHtml(option)}" has been recorded.
                         </div>
                     `;
                     setTimeout(() => {
@@ -1064,10 +1996,72 @@ VOTING_HTML = """
             });
         }
         
+        // Ranked-choice ballot being built, kept across refreshes
+        let ranking = [];
+        let rankingFor = null;
+        let rankedPoll = null;
+        
+        function pick(option) {
+            if (!ranking.includes(option)) {
+                ranking.push(option);
+            }
+            renderRanked();
+        }
+        
+        function clearRanking() {
+            ranking = [];
+            renderRanked();
+        }
+        
+        function submitRanking() {
+            const ballot = ranking;
+            ranking = [];
+            vote(ballot);
+        }
+        
+        function renderRanked() {
+            const data = rankedPoll;
+            if (rankingFor !== data.start_time) {
+                ranking = [];
+                rankingFor = data.start_time;
+            }
+            let html = `
+                <h1>🗳️ Rank the Options</h1>
+                <div class="question">${escapeHtml(data.question)}</div>
+            `;
+            data.options.forEach((option, i) => {
+                const place = ranking.indexOf(option);
+                html += `
+                    <div class="vote-option" onclick="pick(rankedPoll.options[${i}])">
+                        ${place >= 0 ? `${place + 1}. ` : ''}${escapeHtml(option)}
+                    </div>
+                `;
+            });
+            if (ranking.length) {
+                html += `
+                    <div class="vote-option" onclick="submitRanking()">Submit ranking</div>
+                    <div class="vote-option" onclick="clearRanking()">Clear</div>
+                `;
+            }
+            document.getElementById('voteContainer').innerHTML = html;
+        }
+        
+        function submitAnswer() {
+            const answer = document.getElementById('answerInput').value.trim();
+            if (answer) {
+                vote(answer);
+            }
+        }
+        
         function updateVoting() {
-            fetch('http://localhost:5000/api/poll')
+            clearTimeout(refreshTimer);
+            fetch('{{ voting_url }}{{ poll_api }}/bootstrap', {cache: 'no-store'})
                 .then(r => r.json())
                 .then(data => {
+                    refreshMs = data.next_poll_ms || refreshMs;
+                    if (data.cooldown > 0) {
+                        showCooldown(data.cooldown);
+                    }
                     const container = document.getElementById('voteContainer');
                     if (!data.active) {
                         container.innerHTML = `
@@ -1079,99 +2073,226 @@ VOTING_HTML = """
                         return;
                     }
                     
+                    if (data.kind === 'ranked') {
+                        rankedPoll = data;
+                        renderRanked();
+                        return;
+                    }
+                    
+                    if (data.kind === 'text') {
+                        // Keep what the viewer is typing across refreshes
+                        const input = document.getElementById('answerInput');
+                        if (input && input.dataset.started === String(data.start_time)) {
+                            return;
+                        }
+                        container.innerHTML = `
+                            <h1>🗳️ Your Answer</h1>
+                            <div class="question">${escapeHtml(data.question)}</div>
+                            <input type="text" id="answerInput" class="answer-input" maxlength="{{ max_answer }}"
+                                   data-started="${data.start_time}" placeholder="Type your answer"
+                                   onkeydown="if (event.key === 'Enter') submitAnswer()">
+                            <div class="vote-option" onclick="submitAnswer()">Send</div>
+                        `;
+                        return;
+                    }
+                    
                     let html = `
                         <h1>🗳️ Cast Your Vote</h1>
-                        <div class="question">${data.question}</div>
+                        <div class="question">${escapeHtml(data.question)}</div>
                     `;
                     
-                    data.options.forEach(option => {
+                    pollOptions = data.options;
+                    data.options.forEach((option, i) => {
                         html += `
-                            <div class="vote-option" onclick="vote('${option}')">
-                                ${option}
+                            <div class="vote-option" onclick="vote(pollOptions[${i}])">
+                                ${escapeHtml(option)}
                             </div>
                         `;
                     });
                     
                     container.innerHTML = html;
+                })
+                .finally(() => {
+                    clearTimeout(refreshTimer);
+                    refreshTimer = setTimeout(updateVoting, jittered(refreshMs));
                 });
         }
         
-        // Check cooldown on page load
-        checkCooldown();
+        // The server says when to ask again (longer while idle or busy);
+        // the jitter keeps viewers who arrived together from polling in step
+        let refreshMs = 3000;
+        let refreshTimer = null;
         
-        setInterval(updateVoting, 3000);
+        function jittered(ms) {
+            return ms * (1 - {{ refresh_jitter }} + 2 * {{ refresh_jitter }} * Math.random());
+        }
         updateVoting();
     </script>
 </body>
 </html>
 """
 
-@voting_app.route('/')
-def voting():
-    return render_template_string(VOTING_HTML)
+@tenant_route(voting_app, '/')
+@tenant_route(voting_app, '/polls/<poll_id>/')
+def voting(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    return render_template_string(VOTING_HTML, max_answer=MAX_ANSWER_LENGTH, refresh_jitter=REFRESH_JITTER,
+                                  **page_urls(tenant, poll_id))
 
-@voting_app.route('/api/vote', methods=['POST'])
-def submit_vote():
+@poll_route(voting_app, 'vote', methods=['POST'])
+def submit_vote(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    timer = g.timer
     data = request.json
-    option = data.get('option')
+    # Ranked-choice ballots send {"ranking": [best, next, ...]}
+    option = data['ranking'] if 'ranking' in data else data.get('option')
     
     # Get voter's IP address
     voter_ip = request.remote_addr
+    timer.mark('parse')
     
-    if not poll_state['active']:
-        return jsonify({'success': False, 'message': 'No active poll'})
+    target = poll_store(tenant, poll_id)
+    status, remaining = target.vote(voter_ip, option, COOLDOWN_SECONDS, timer)
+    if capture:
+        capture.record(VOTE, tenant, poll_id, target, voter_ip, option, status)
     
-    if option not in poll_state['options']:
-        return jsonify({'success': False, 'message': 'Invalid option'})
+    if status == 'ok':
+        if vote_log:
+            vote_log.vote(tenant, poll_id, target, voter_ip, option)
+        metrics.inc('redlix_votes_total')
+        result = {'success': True, 'cooldown': COOLDOWN_SECONDS}
+    else:
+        metrics.inc('redlix_votes_rejected_total', (('reason', status),))
     
-    # Check cooldown
-    current_time = datetime.now()
-    if voter_ip in vote_cooldowns:
-        cooldown_end = vote_cooldowns[voter_ip]
-        if current_time < cooldown_end:
-            remaining = int((cooldown_end - current_time).total_seconds())
-            return jsonify({
-                'success': False, 
-                'message': f'Please wait {remaining} seconds before voting again',
-                'cooldown': remaining
-            })
+    if status == 'inactive':
+        result = {'success': False, 'message': 'No active poll'}
     
-    # Register the vote
-    poll_state['votes'][option] += 1
+    if status == 'invalid':
+        result = {'success': False, 'message': 'Invalid option'}
     
-    # Set or reset the voter's cooldown
-    vote_cooldowns[voter_ip] = current_time + timedelta(seconds=30)
+    if status == 'cooldown':
+        result = {
+            'success': False, 
+            'message': f'Please wait {remaining} seconds before voting again',
+            'cooldown': remaining
+        }
     
-    return jsonify({'success': True, 'cooldown': 30})
+    response = jsonify(result)
+    timer.mark('serialize')
+    return response
 
-@voting_app.route('/api/cooldown', methods=['GET'])
-def check_cooldown():
+@poll_route(voting_app, 'cooldown', methods=['GET'])
+def check_cooldown(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
     voter_ip = request.remote_addr
-    current_time = datetime.now()
+    target = poll_store(tenant, poll_id)
+    remaining = target.cooldown_remaining(voter_ip)
+    if capture:
+        capture.record(COOLDOWN, tenant, poll_id, target, voter_ip)
     
-    if voter_ip in vote_cooldowns:
-        cooldown_end = vote_cooldowns[voter_ip]
-        if current_time < cooldown_end:
-            remaining = int((cooldown_end - current_time).total_seconds())
-            return jsonify({'on_cooldown': True, 'remaining': remaining})
+    if remaining > 0:
+        return jsonify({'on_cooldown': True, 'remaining': remaining})
     
     return jsonify({'on_cooldown': False, 'remaining': 0})
 
+# Everything the voting page reads, in one same-origin request: the poll
+# without its tally and the caller's cooldown. Keeps the audience off the
+# display server that OBS depends on.
+@poll_route(voting_app, 'bootstrap', methods=['GET'])
+def bootstrap(tenant=DEFAULT_TENANT, poll_id=DEFAULT_POLL):
+    voter_ip = request.remote_addr
+    target = poll_store(tenant, poll_id)
+    view = target.voter_view()
+    view['cooldown'] = target.cooldown_remaining(voter_ip)
+    view['next_poll_ms'] = next_poll_ms(view, 'voting', 'voting')
+    view['next_poll_jitter'] = REFRESH_JITTER
+    if capture:
+        capture.record(COOLDOWN, tenant, poll_id, target, voter_ip)
+    response = jsonify(view)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+SERVED = {
+    'display': (display_app, DISPLAY_PORT),
+    'dashboard': (dashboard_app, DASHBOARD_PORT),
+    'voting': (voting_app, VOTING_PORT)
+}
+
+def serve(name, fd=None):
+    app, port = SERVED[name]
+    server = DrainingServer('127.0.0.1', port, app, counting_handler(name), fd=fd)
+    servers[name] = server
+    Thread(target=server.serve_forever, name=f'redlix-{name}', daemon=True).start()
+
+def process_state():
+    # Everything a process taking over needs: each poll with its tally and
+    # cooldowns, and the vote log's open runs
+    with stores_lock:
+        registered = list(stores.items())
+    return {
+        'polls': {key: found.export_state() for key, found in registered},
+        'vote_log': vote_log.handover() if vote_log else None
+    }
+
+def load_process_state(state):
+    for (tenant, poll_id), data in state['polls'].items():
+        found = poll_store(tenant, poll_id, create=True)
+        if data is not None:
+            found.import_state(data)
+    if vote_log and state['vote_log']:
+        vote_log.resume(state['vote_log'])
+
+def hand_over(conn):
+    # Control socket: another process is taking over. It gets the listening
+    # sockets and starts accepting; this process then stops accepting,
+    # finishes its in-flight requests and sends the state. Until the other
+    # side confirms, a failure puts this process back in service.
+    global chat
+    spare = {name: server.socket.dup() for name, server in servers.items()}
+    stopped = False
+    try:
+        send_listeners(conn, spare)
+        expect(conn, ACCEPTING)
+        stopped = True
+        began = time.monotonic()
+        for server in servers.values():
+            server.shutdown()
+        deadline = began + DRAIN_SECONDS
+        for name, server in servers.items():
+            if not server.drain(max(0.0, deadline - time.monotonic())):
+                log.warning('handoff: %s still has %d connections after %ss', name, server.active, DRAIN_SECONDS)
+        if chat:
+            chat.stop()
+        log.info('handoff: drained in %.0f ms', (time.monotonic() - began) * 1000)
+        send_state(conn, process_state())
+        expect(conn, DONE)
+    except (OSError, ValueError) as exc:
+        log.error('handoff failed, serving again: %s', exc)
+        if stopped:
+            for name, sock in spare.items():
+                serve(name, sock.fileno())
+            if CHAT_URL:
+                chat = start_chat()
+        return False
+    finally:
+        for sock in spare.values():
+            sock.close()
+    log.info('handoff: done, exiting')
+    handed_over.set()
+    return True
+
 if __name__ == '__main__':
     # Print server overview
     print("\n" + "="*60)
     print("🚀 REDLIX POLL SYSTEM - SERVER OVERVIEW")
     print("="*60)
     print("\n📊 DISPLAY SERVER (OBS Browser Source)")
-    print(f"   └─ http://localhost:5000")
+    print(f"   └─ http://{PUBLIC_HOST}:{DISPLAY_PORT}")
     print(f"   └─ Use this URL in OBS Browser Source\n")
     
     print("⚙️  DASHBOARD SERVER (Control Panel)")
-    print(f"   └─ http://localhost:5001")
+    print(f"   └─ http://{PUBLIC_HOST}:{DASHBOARD_PORT}")
     print(f"   └─ Open in browser to manage polls\n")
     
     print("🗳️  VOTING SERVER (Public Voting)")
-    print(f"   └─ http://localhost:5002")
+    print(f"   └─ http://{PUBLIC_HOST}:{VOTING_PORT}")
     print(f"   └─ Share this URL with your audience\n")
     
     print("="*60)
@@ -1179,16 +2300,35 @@ if __name__ == '__main__':
     print("⏹️  Press CTRL+C to stop all servers")
     print("="*60 + "\n")
     
-    # Run the apps on separate threads
-    def run_display():
-        display_app.run(port=5000, debug=False, use_reloader=False)
+    if '--takeover' in sys.argv[1:]:
+        if not CONTROL_PATH:
+            raise SystemExit('--takeover needs REDLIX_CONTROL, the control socket of the running process')
+        conn, fds = take_over(CONTROL_PATH)
+        with conn:
+            for name in SERVED:
+                serve(name, fds[name])
+                os.close(fds[name])
+            conn.sendall(ACCEPTING)
+            began = time.monotonic()
+            state = recv_state(conn)
+            load_process_state(state)
+            serving.set()
+            conn.sendall(DONE)
+        log.info('handoff: took over %d polls, %.0f ms after accepting', len(state['polls']),
+                 (time.monotonic() - began) * 1000)
+    else:
+        for name in SERVED:
+            serve(name)
+        serving.set()
     
-    def run_dashboard():
-        dashboard_app.run(port=5001, debug=False, use_reloader=False)
+    if CHAT_URL:
+        chat = start_chat()
+        print(f"💬 Chat votes from {chat.channel} on {chat.host}:{chat.port} -> {CHAT_POLL}\n")
     
-    def run_voting():
-        voting_app.run(port=5002, debug=False, use_reloader=False)
+    if CONTROL_PATH:
+        ControlSocket(CONTROL_PATH, hand_over)
     
-    Thread(target=run_display).start()
-    Thread(target=run_dashboard).start()
-    Thread(target=run_voting).start()
\ No newline at end of file
+    try:
+        handed_over.wait()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,120 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+# Opt-in sampling profiler and per-request phase timing.
+#
+# The profiler wakes up every few milliseconds, walks the stack of every other
+# thread via sys._current_frames() and counts each stack in collapsed form
+# ("thread;file:function;file:function count"), which flamegraph.pl and
+# speedscope read directly. It costs nothing while stopped.
+
+log = logging.getLogger('redlix')
+
+# Leaf frames where a thread is just waiting for work
+IDLE_LEAVES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('socket.py', 'readinto'),
+    ('socket.py', 'accept'),
+    ('socketserver.py', 'serve_forever'),
+}
+MAX_STACKS = 20000
+
+
+def thread_label(name):
+    # 'Thread-12 (process_request_thread)' -> 'process_request_thread', so
+    # stacks from short-lived request threads merge in the flame graph
+    match = re.search(r'\((\w+)\)$', name)
+    if match:
+        return match.group(1)
+    return re.sub(r'-\d+$', '', name)
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stacks = {}
+        self.samples = 0
+        self.thread = None
+        self.running = threading.Event()
+        self.interval = 0.005
+        self.include_idle = False
+
+    def start(self, interval=0.005, include_idle=False):
+        with self.lock:
+            self.interval = interval
+            self.include_idle = include_idle
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.running.set()
+            self.thread = threading.Thread(target=self._run, name='redlix-profiler', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+
+    def reset(self):
+        with self.lock:
+            self.stacks = {}
+            self.samples = 0
+
+    @property
+    def active(self):
+        return self.running.is_set()
+
+    def _run(self):
+        own = threading.get_ident()
+        while self.running.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    code = frame.f_code
+                    leaf = (os.path.basename(code.co_filename), code.co_name)
+                    if not self.include_idle and leaf in IDLE_LEAVES:
+                        continue
+                    parts = []
+                    while frame is not None:
+                        code = frame.f_code
+                        parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                        frame = frame.f_back
+                    parts.append(thread_label(names.get(ident, 'thread')))
+                    stack = ';'.join(reversed(parts))
+                    if stack not in self.stacks and len(self.stacks) >= MAX_STACKS:
+                        stack = '[other]'
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+            del frames
+            time.sleep(self.interval)
+
+    def collapsed(self):
+        with self.lock:
+            items = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return ''.join(f'{stack} {count}\n' for stack, count in items)
+
+
+class PhaseTimer:
+    # Splits one request into named phases (parse, validate, cooldown, ...)
+    __slots__ = ('started', 'last', 'phases')
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def describe(self):
+        return ' '.join(f'{phase}={seconds * 1000:.2f}ms' for phase, seconds in self.phases)
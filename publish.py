@@ -0,0 +1,93 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+from profiler import log
+
+# Static snapshots for a reverse proxy (REDLIX_PUBLISH_DIR=directory). Every
+# tick, the publisher thread checks the version of each poll in the registry
+# and, when it moved, writes the GET /api/poll response to the same path
+# under the directory (api/poll, api/polls/<id>/poll, t/<tenant>/...).
+# A burst of votes therefore costs one write per tick, and a dashboard action
+# can wake the thread so a new poll shows up at once. Files are written to a
+# temporary name and renamed over the old one, so a reader never sees a
+# partial snapshot. Next to each, <path>.version holds the version it
+# contains, its size and when it was written. Files of polls that leave the
+# registry are removed, so the proxy falls back to the app for them.
+
+
+class SnapshotPublisher:
+    def __init__(self, directory, polls, render, interval=0.2, on_publish=None):
+        # polls() -> {relative path: store}; render(store) -> (version, bytes)
+        self.directory = directory
+        self.polls = polls
+        self.render = render
+        self.interval = interval
+        self.on_publish = on_publish
+        self.published = {}  # relative path -> version on disk
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, name='redlix-publish', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def wake(self):
+        self.wakeup.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.publish()
+            except Exception:
+                log.exception('publish: tick failed')
+
+    def publish(self):
+        # One pass over the registry; returns the number of files written
+        current = self.polls()
+        written = 0
+        for path, found in current.items():
+            version = found.version()
+            if self.published.get(path) == version:
+                continue
+            version, body = self.render(found)
+            self._write(path, body)
+            self._write(path + '.version', json.dumps({
+                'version': version,
+                'bytes': len(body),
+                'published': time.time()
+            }).encode())
+            self.published[path] = version
+            written += 1
+        for path in [path for path in self.published if path not in current]:
+            for name in (path, path + '.version'):
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            del self.published[path]
+        if written and self.on_publish:
+            self.on_publish(written)
+        return written
+
+    def _write(self, path, body):
+        target = os.path.join(self.directory, path)
+        tmp = f'{target}.tmp{os.getpid()}'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(body)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(body)
+        os.replace(tmp, target)
+
+    def close(self):
+        if not self.stopped.is_set():
+            self.stopped.set()
+            self.wakeup.set()
+            self.thread.join()
@@ -0,0 +1,143 @@
+# Ranked-choice (instant-runoff) polls. A ballot ranks some or all options,
+# best first. Ballots are kept grouped: one counter per distinct ranking, so
+# 100k ballots over 10 options take a few thousand entries.
+#
+# Each round, a ballot counts for its highest-ranked option still running.
+# The poll is won by an option with more than half of the ballots still
+# counting, or by the last one left; otherwise the option with the fewest
+# votes is eliminated (on a tie, the one listed last). The rounds are kept
+# between reads. A new ballot is added to each round it reaches, and the
+# result is only recounted from the ballot groups when it changes an
+# earlier decision (a new loser, or an option gaining or losing its
+# majority). That recount happens on the next read, at most once per read.
+
+
+class RankedTally:
+    __slots__ = ('options', 'index', 'ballots', 'total', 'rounds', 'exhausted', 'order',
+                 'eliminated_in', 'winner', 'stale')
+
+    def __init__(self, options):
+        self.options = list(options)
+        self.index = {opt: i for i, opt in enumerate(self.options)}
+        self.ballots = {}  # ranking (tuple of option indexes) -> ballots
+        self.total = 0
+        self.rounds = []  # per round, votes per option index
+        self.exhausted = []  # per round, ballots with no option left
+        self.order = []  # option index eliminated at the end of each round
+        self.eliminated_in = []  # option index -> round it was eliminated in
+        self.winner = None
+        self.stale = True
+
+    def ranking(self, value):
+        # Option indexes of a ballot, best first; None when malformed. A
+        # single option name is a ballot with one preference.
+        if isinstance(value, str):
+            value = [value]
+        if not isinstance(value, list) or not value or len(value) > len(self.options):
+            return None
+        ranking = []
+        for opt in value:
+            i = self.index.get(opt) if isinstance(opt, str) else None
+            if i is None or i in ranking:
+                return None
+            ranking.append(i)
+        return tuple(ranking)
+
+    def add(self, ranking):
+        self.ballots[ranking] = self.ballots.get(ranking, 0) + 1
+        self.total += 1
+        if self.stale:
+            return
+        eliminated_in = self.eliminated_in
+        last = len(self.rounds) - 1
+        pos, end = 0, len(ranking)
+        for r, counts in enumerate(self.rounds):
+            while pos < end and eliminated_in[ranking[pos]] < r:
+                pos += 1
+            if pos == end:
+                self.exhausted[r] += 1
+                continue
+            option = ranking[pos]
+            counts[option] += 1
+            continuing = self.total - self.exhausted[r]
+            if r == last:
+                # The winner must still hold a majority, unless it is the
+                # only option left
+                if len(counts) - r > 1 and counts[self.winner] * 2 <= continuing:
+                    self.stale = True
+                    return
+            elif counts[option] * 2 > continuing or (
+                    option == self.order[r] and self._loser(r) != option):
+                self.stale = True
+                return
+
+    def _loser(self, r):
+        counts = self.rounds[r]
+        running = [i for i, gone in enumerate(self.eliminated_in) if gone >= r]
+        return min(running, key=lambda i: (counts[i], -i))
+
+    def _recount(self):
+        # Full runoff from the ballot groups: each group moves to its next
+        # preference only when its current option is eliminated
+        n = len(self.options)
+        piles = [[] for _ in range(n)]
+        counts = [0] * n
+        for ranking, count in self.ballots.items():
+            piles[ranking[0]].append((ranking, 0, count))
+            counts[ranking[0]] += count
+        running = set(range(n))
+        exhausted = 0
+        self.rounds, self.exhausted, self.order = [], [], []
+        self.eliminated_in = [n] * n
+        while True:
+            r = len(self.rounds)
+            self.rounds.append(list(counts))
+            self.exhausted.append(exhausted)
+            leader = max(running, key=lambda i: (counts[i], -i))
+            continuing = self.total - exhausted
+            if counts[leader] * 2 > continuing or len(running) == 1 or not continuing:
+                self.winner = leader
+                break
+            loser = min(running, key=lambda i: (counts[i], -i))
+            running.discard(loser)
+            self.eliminated_in[loser] = r
+            self.order.append(loser)
+            counts[loser] = 0
+            for ranking, pos, count in piles[loser]:
+                pos += 1
+                while pos < len(ranking) and ranking[pos] not in running:
+                    pos += 1
+                if pos < len(ranking):
+                    piles[ranking[pos]].append((ranking, pos, count))
+                    counts[ranking[pos]] += count
+                else:
+                    exhausted += count
+            piles[loser] = None
+        self.stale = False
+
+    def result(self):
+        # {'rounds': [...], 'winner': option or None}; every round lists the
+        # options still running, the one it eliminated and exhausted ballots
+        if self.stale:
+            self._recount()
+        options = self.options
+        rounds = []
+        for r, counts in enumerate(self.rounds):
+            rounds.append({
+                'counts': {options[i]: counts[i] for i, gone in enumerate(self.eliminated_in) if gone >= r},
+                'eliminated': options[self.order[r]] if r < len(self.order) else None,
+                'exhausted': self.exhausted[r]
+            })
+        return {'rounds': rounds, 'winner': options[self.winner] if self.total else None}
+
+    def to_dict(self):
+        return {'options': self.options,
+                'ballots': [[list(ranking), count] for ranking, count in self.ballots.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        tally = cls(data['options'])
+        for ranking, count in data['ballots']:
+            tally.ballots[tuple(ranking)] = count
+            tally.total += count
+        return tally
@@ -0,0 +1,240 @@
+import argparse
+import bisect
+import hashlib
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+from urllib.parse import quote
+
+from werkzeug.serving import make_server
+
+# Lightweight front router for a cluster of polls.py worker processes.
+# Tenants (/t/<tenant>/...) are placed on workers with a consistent hash ring,
+# so adding a worker only moves the tenants that now hash to it. Each worker
+# is addressed by its display port; dashboard and voting are the next two.
+
+DEFAULT_TENANT = 'default'
+HOP_HEADERS = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+               'te', 'trailers', 'transfer-encoding', 'upgrade'}
+OFFSETS = {'display': 0, 'dashboard': 1, 'voting': 2}
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    def __init__(self, workers, vnodes=128):
+        self.workers = list(workers)
+        points = sorted((ring_hash(f'{worker}#{i}'), worker)
+                        for worker in self.workers for i in range(vnodes))
+        self.keys = [point for point, _ in points]
+        self.owners = [worker for _, worker in points]
+
+    def owner(self, tenant):
+        index = bisect.bisect(self.keys, ring_hash(tenant)) % len(self.keys)
+        return self.owners[index]
+
+
+def tenant_of(path):
+    if path.startswith('/t/'):
+        return path.split('/', 3)[2] or DEFAULT_TENANT
+    return DEFAULT_TENANT
+
+
+def split_worker(worker):
+    host, port = worker.rsplit(':', 1)
+    return host, int(port)
+
+
+class Router:
+    def __init__(self, workers):
+        self.ring = HashRing(workers)
+        self.cond = threading.Condition()
+        self.moving = set()     # tenants being migrated; their requests wait
+        self.inflight = {}      # tenant -> requests currently forwarded
+        self.local = threading.local()
+
+    def _conn(self, host, port):
+        # One keep-alive connection per worker port and router thread
+        conns = getattr(self.local, 'conns', None)
+        if conns is None:
+            conns = self.local.conns = {}
+        conn = conns.get((host, port))
+        if conn is None:
+            conn = conns[(host, port)] = http.client.HTTPConnection(host, port, timeout=30)
+        return conn
+
+    def _send(self, host, port, method, target, body, headers):
+        for attempt in range(2):
+            conn = self._conn(host, port)
+            try:
+                conn.request(method, target, body, headers)
+                resp = conn.getresponse()
+                return resp, resp.read()
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                self.local.conns.pop((host, port), None)
+                if attempt:
+                    raise
+
+    def call(self, worker, offset, method, target, payload=None):
+        host, port = split_worker(worker)
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        resp, data = self._send(host, port + offset, method, target, body, headers)
+        return json.loads(data)
+
+    def forward(self, environ, offset):
+        path = environ.get('PATH_INFO', '')
+        tenant = tenant_of(path)
+        with self.cond:
+            while tenant in self.moving:
+                self.cond.wait()
+            worker = self.ring.owner(tenant)
+            self.inflight[tenant] = self.inflight.get(tenant, 0) + 1
+        try:
+            host, port = split_worker(worker)
+            target = environ.get('REQUEST_URI') or quote(path.encode('latin-1'))
+            if not environ.get('REQUEST_URI') and environ.get('QUERY_STRING'):
+                target += '?' + environ['QUERY_STRING']
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            body = environ['wsgi.input'].read(length) if length else None
+            headers = {key[5:].replace('_', '-').title(): value
+                       for key, value in environ.items()
+                       if key.startswith('HTTP_') and key[5:].replace('_', '-').lower() not in HOP_HEADERS}
+            if environ.get('CONTENT_TYPE'):
+                headers['Content-Type'] = environ['CONTENT_TYPE']
+            forwarded = headers.get('X-Forwarded-For')
+            remote = environ.get('REMOTE_ADDR', '')
+            headers['X-Forwarded-For'] = f'{forwarded}, {remote}' if forwarded else remote
+            return self._send(host, port + offset, environ['REQUEST_METHOD'], target, body, headers)
+        finally:
+            with self.cond:
+                self.inflight[tenant] -= 1
+                if not self.inflight[tenant]:
+                    del self.inflight[tenant]
+                    self.cond.notify_all()
+
+    def set_workers(self, workers):
+        # Swap in a new ring and move every tenant whose owner changed
+        old_ring, new_ring = self.ring, HashRing(workers)
+        moves = []
+        for worker in old_ring.workers:
+            for tenant in self.call(worker, OFFSETS['dashboard'], 'GET', '/api/tenants')['tenants']:
+                if old_ring.owner(tenant) == worker != new_ring.owner(tenant):
+                    moves.append((tenant, worker, new_ring.owner(tenant)))
+        with self.cond:
+            self.moving.update(tenant for tenant, _, _ in moves)
+            self.ring = new_ring
+            while any(self.inflight.get(tenant) for tenant, _, _ in moves):
+                self.cond.wait()
+        try:
+            for tenant, src, dst in moves:
+                path = f'/t/{tenant}/api/tenant/state'
+                state = self.call(src, OFFSETS['dashboard'], 'GET', path)['state']
+                if state is not None:
+                    self.call(dst, OFFSETS['dashboard'], 'POST', path, state)
+                self.call(src, OFFSETS['dashboard'], 'DELETE', path)
+                with self.cond:
+                    self.moving.discard(tenant)
+                    self.cond.notify_all()
+        finally:
+            with self.cond:
+                self.moving.difference_update(tenant for tenant, _, _ in moves)
+                self.cond.notify_all()
+        return [{'tenant': tenant, 'from': src, 'to': dst} for tenant, src, dst in moves]
+
+    def admin(self, environ):
+        path = environ.get('PATH_INFO', '')
+        if path == '/_router/workers' and environ['REQUEST_METHOD'] == 'POST':
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            workers = json.loads(environ['wsgi.input'].read(length))['workers']
+            return {'workers': workers, 'moved': self.set_workers(workers)}
+        if path == '/_router/workers':
+            return {'workers': self.ring.workers}
+        if path.startswith('/_router/owner/'):
+            tenant = path[len('/_router/owner/'):]
+            return {'tenant': tenant, 'worker': self.ring.owner(tenant)}
+        return None
+
+    def app(self, offset):
+        def wsgi(environ, start_response):
+            if offset == OFFSETS['dashboard'] and environ.get('PATH_INFO', '').startswith('/_router/'):
+                result = self.admin(environ)
+                if result is None:
+                    start_response('404 Not Found', [('Content-Type', 'application/json')])
+                    return [b'{"success": false}']
+                start_response('200 OK', [('Content-Type', 'application/json')])
+                return [json.dumps(result).encode()]
+            try:
+                resp, data = self.forward(environ, offset)
+            except OSError:
+                start_response('502 Bad Gateway', [('Content-Type', 'application/json')])
+                return [b'{"success": false, "message": "Worker unavailable"}']
+            headers = [(key, value) for key, value in resp.getheaders()
+                       if key.lower() not in HOP_HEADERS and key.lower() != 'content-length']
+            headers.append(('Content-Length', str(len(data))))
+            start_response(f'{resp.status} {resp.reason}', headers)
+            return [data]
+        return wsgi
+
+
+def spawn_workers(count, base_port, public_ports):
+    # Local worker processes on base_port, base_port + 10, ...
+    root = os.path.dirname(os.path.abspath(__file__))
+    procs, workers = [], []
+    for i in range(count):
+        port = base_port + 10 * i
+        env = dict(os.environ,
+                   REDLIX_DISPLAY_PORT=str(port),
+                   REDLIX_DASHBOARD_PORT=str(port + 1),
+                   REDLIX_VOTING_PORT=str(port + 2),
+                   REDLIX_PUBLIC_DISPLAY_PORT=str(public_ports[0]),
+                   REDLIX_PUBLIC_DASHBOARD_PORT=str(public_ports[1]),
+                   REDLIX_PUBLIC_VOTING_PORT=str(public_ports[2]),
+                   REDLIX_TRUST_PROXY='1')
+        procs.append(subprocess.Popen([sys.executable, os.path.join(root, 'polls.py')], env=env,
+                                      stdout=subprocess.DEVNULL))
+        workers.append(f'127.0.0.1:{port}')
+    return procs, workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Route tenants to polls.py workers')
+    parser.add_argument('--workers', default='', help='comma separated host:display_port list')
+    parser.add_argument('--spawn', type=int, default=0, help='start this many local workers')
+    parser.add_argument('--worker-base-port', type=int, default=6000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--display-port', type=int, default=5000)
+    parser.add_argument('--dashboard-port', type=int, default=5001)
+    parser.add_argument('--voting-port', type=int, default=5002)
+    args = parser.parse_args()
+
+    ports = (args.display_port, args.dashboard_port, args.voting_port)
+    workers = [w for w in args.workers.split(',') if w]
+    procs = []
+    if args.spawn:
+        procs, spawned = spawn_workers(args.spawn, args.worker_base_port, ports)
+        workers += spawned
+    if not workers:
+        parser.error('no workers given (use --workers or --spawn)')
+
+    router = Router(workers)
+    servers = [make_server(args.host, port, router.app(offset), threaded=True)
+               for offset, port in enumerate(ports)]
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f'Routing {len(workers)} workers on ports {ports}')
+    try:
+        servers[0].serve_forever()
+    finally:
+        for proc in procs:
+            proc.terminate()
+
+
+if __name__ == '__main__':
+    main()
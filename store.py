@@ -0,0 +1,723 @@
+import hashlib
+import json
+import socket
+import threading
+import time
+from queue import LifoQueue, Empty
+from urllib.parse import urlparse
+
+from timeseries import VoteSeries, EMPTY_SERIES
+from memory import deep_size, sampled_size
+from topk import TopK, TOP_K, top_of
+from answers import SpaceSaving, normalize_answer
+from ranked import RankedTally
+
+# Poll state backends. Every backend exposes the same operations the
+# Flask routes need, so the apps never touch the storage layout directly.
+
+
+class PollStore:
+    def start(self, question, options):
+        raise NotImplementedError
+
+    # Free-text poll: any answer is accepted and counted in a SpaceSaving
+    # summary of `capacity` counters (see answers.py)
+    def start_text(self, question, capacity):
+        raise NotImplementedError
+
+    # Ranked-choice poll: a vote is a list of options, best first, and the
+    # snapshot carries the instant-runoff rounds and winner (see ranked.py)
+    def start_ranked(self, question, options):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+    def snapshot(self):
+        raise NotImplementedError
+
+    # Returns (status, remaining) where status is one of
+    # 'ok', 'inactive', 'invalid' or 'cooldown'. timer, when given, is a
+    # profiler.PhaseTimer that gets a mark after each step.
+    def vote(self, voter, option, cooldown, timer=None):
+        raise NotImplementedError
+
+    # Applies [(voter, option), ...] in order; returns {status: count}.
+    # Accepted votes are appended to `accepted` when a list is given.
+    def vote_batch(self, votes, cooldown, accepted=None):
+        counts = {}
+        for voter, option in votes:
+            status, _ = self.vote(voter, option, cooldown)
+            counts[status] = counts.get(status, 0) + 1
+            if status == 'ok' and accepted is not None:
+                accepted.append((voter, option))
+        return counts
+
+    def cooldown_remaining(self, voter):
+        raise NotImplementedError
+
+    # Per-second / per-minute vote counts, see timeseries.VoteSeries.window
+    def timeseries(self, resolution, window):
+        raise NotImplementedError
+
+    # Entries in the cooldown table, or None when the backend can't tell
+    def cooldown_count(self):
+        return None
+
+    def version(self):
+        return self.snapshot()['version']
+
+    # Snapshot with only the n leading options, ranked by votes (ties in
+    # option order), plus total_votes and option_count for the whole poll.
+    # When every option fits, options keep their original order.
+    def leaders(self, n):
+        snap = self.snapshot()
+        votes = snap['votes']
+        snap['total_votes'] = sum(votes.values())
+        snap['option_count'] = len(snap['options'])
+        if len(snap['options']) > n:
+            ranked = top_of(snap['options'], votes, n)
+            snap['options'] = [opt for opt, _ in ranked]
+            snap['votes'] = dict(ranked)
+        return snap
+
+    # Options offset..offset+limit in their original order with their votes
+    def options_page(self, offset, limit):
+        snap = self.snapshot()
+        options = snap['options'][offset:offset + limit]
+        return {
+            'active': snap['active'],
+            'version': snap['version'],
+            'option_count': len(snap['options']),
+            'offset': offset,
+            'limit': limit,
+            'options': options,
+            'votes': {opt: snap['votes'].get(opt, 0) for opt in options}
+        }
+
+    # What the voting page needs: the poll without its tally, and without
+    # the answers of a free-text poll
+    def voter_view(self):
+        snap = self.snapshot()
+        view = {key: snap[key] for key in ('active', 'question', 'options', 'start_time', 'version')}
+        if 'kind' in snap:
+            view['kind'] = snap['kind']
+            if snap['kind'] == 'text':
+                view['options'] = []
+        return view
+
+    # Approximate bytes held in this process, by part ({'cooldowns': n, ...})
+    def memory_usage(self):
+        return {}
+
+    # Full state for moving a poll to another process; None when the
+    # state already lives outside the process
+    def export_state(self):
+        return None
+
+    def import_state(self, data):
+        pass
+
+    # Releases background work when the poll leaves the registry
+    def close(self):
+        pass
+
+
+class MemoryStore(PollStore):
+    __slots__ = ('lock', 'state', 'cooldowns', 'series', 'top', 'answers', 'ranked')
+    # state['votes'] is the whole tally; subclasses that merge in votes
+    # from elsewhere turn this off, answer leaders() from snapshot() and
+    # can't run free-text or ranked-choice polls
+    local_tally = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = {
+            'active': False,
+            'question': '',
+            'options': [],
+            'votes': {},
+            'start_time': None,
+            'version': 0  # bumped on every change, including each vote
+        }
+        self.cooldowns = {}  # voter key -> cooldown end (epoch seconds)
+        self.series = EMPTY_SERIES
+        self.top = None  # TopK for polls with more than TOP_K options
+        self.answers = None  # SpaceSaving while a free-text poll runs
+        self.ranked = None  # RankedTally of a ranked-choice poll; votes holds first preferences
+
+    def _index(self):
+        # Rebuilds the leader index; called with the lock held
+        options = self.state['options']
+        if self.local_tally and len(options) > TOP_K:
+            self.top = TopK(options, self.state['votes'])
+        else:
+            self.top = None
+
+    def start(self, question, options):
+        with self.lock:
+            self._begin(question, options)
+
+    def _begin(self, question, options, ranked=False):
+        # Called with the lock held
+        self.state['active'] = True
+        self.state['question'] = question
+        self.state['options'] = list(options)
+        self.state['votes'] = {opt: 0 for opt in options}
+        self.state['start_time'] = time.time()
+        self.state['version'] += 1
+        self.series = VoteSeries(options)
+        self.answers = None
+        self.ranked = RankedTally(options) if ranked else None
+        self._index()
+
+    def start_ranked(self, question, options):
+        if not self.local_tally:
+            raise NotImplementedError
+        with self.lock:
+            self._begin(question, options, ranked=True)
+
+    def start_text(self, question, capacity):
+        if not self.local_tally:
+            raise NotImplementedError
+        with self.lock:
+            self.state['active'] = True
+            self.state['question'] = question
+            self.state['options'] = []
+            self.state['votes'] = {}
+            self.state['start_time'] = time.time()
+            self.state['version'] += 1
+            self.series = EMPTY_SERIES
+            self.answers = SpaceSaving(capacity)
+            self.ranked = None
+            self.top = None
+
+    def _text_view(self, n=None):
+        # Snapshot fields of a free-text poll; called with the lock held
+        answers = self.answers
+        ranked = answers.top(n)
+        snap = dict(self.state)
+        snap['options'] = [answer for answer, _ in ranked]
+        snap['votes'] = dict(ranked)
+        snap['kind'] = 'text'
+        snap['total_votes'] = answers.total
+        snap['option_count'] = len(answers.counts)
+        snap['capacity'] = answers.capacity
+        snap['error_bound'] = answers.error_bound()
+        return snap
+
+    def stop(self):
+        with self.lock:
+            self.state['active'] = False
+            self.state['version'] += 1
+
+    def reset(self):
+        with self.lock:
+            if self.answers is not None:
+                self.answers = SpaceSaving(self.answers.capacity)
+                self.state['version'] += 1
+            elif self.state['options']:
+                if self.ranked is not None:
+                    self.ranked = RankedTally(self.state['options'])
+                self.state['votes'] = {opt: 0 for opt in self.state['options']}
+                self.state['version'] += 1
+                self.series = VoteSeries(self.state['options'])
+                self._index()
+
+    def snapshot(self):
+        with self.lock:
+            if self.answers is not None:
+                return self._text_view()
+            snap = dict(self.state)
+            snap['options'] = list(snap['options'])
+            snap['votes'] = dict(snap['votes'])
+            if self.ranked is not None:
+                snap['kind'] = 'ranked'
+                snap.update(self.ranked.result())
+        return snap
+
+    def leaders(self, n):
+        if not self.local_tally:
+            return super().leaders(n)
+        # The kind of poll is read under the lock: a restart may swap it
+        with self.lock:
+            if self.answers is not None:
+                return self._text_view(n)
+            ranked = None
+            if self.top is not None and self.ranked is None:
+                state = self.state
+                snap = {key: state[key] for key in ('active', 'question', 'start_time', 'version')}
+                snap['total_votes'] = self.top.total
+                snap['option_count'] = len(state['options'])
+                if n <= self.top.size:
+                    ranked = self.top.leaders(n)
+                else:
+                    ranked = top_of(state['options'], state['votes'], n)
+        if ranked is None:
+            # Small and ranked-choice polls go through snapshot()
+            return super().leaders(n)
+        snap['options'] = [opt for opt, _ in ranked]
+        snap['votes'] = dict(ranked)
+        return snap
+
+    def options_page(self, offset, limit):
+        if not self.local_tally or self.answers is not None:
+            return super().options_page(offset, limit)
+        with self.lock:
+            state = self.state
+            options = state['options'][offset:offset + limit]
+            return {
+                'active': state['active'],
+                'version': state['version'],
+                'option_count': len(state['options']),
+                'offset': offset,
+                'limit': limit,
+                'options': options,
+                'votes': {opt: state['votes'][opt] for opt in options}
+            }
+
+    def voter_view(self):
+        # Skips the runoff and the answer ranking that snapshot() builds
+        with self.lock:
+            state = self.state
+            view = {key: state[key] for key in ('active', 'question', 'start_time', 'version')}
+            view['options'] = list(state['options'])
+            if self.answers is not None:
+                view['kind'] = 'text'
+            elif self.ranked is not None:
+                view['kind'] = 'ranked'
+        return view
+
+    def vote(self, voter, option, cooldown, timer=None):
+        now = time.time()
+        with self.lock:
+            if timer:
+                timer.mark('lock')
+            votes = self.state['votes']
+            answers = self.answers
+            if not self.state['active']:
+                return 'inactive', 0
+            if answers is not None:
+                option = normalize_answer(option)
+                if option is None:
+                    return 'invalid', 0
+            elif self.ranked is not None:
+                ranking = self.ranked.ranking(option)
+                if ranking is None:
+                    return 'invalid', 0
+                option = self.ranked.options[ranking[0]]
+            elif not isinstance(option, str) or option not in votes:
+                return 'invalid', 0
+            if timer:
+                timer.mark('validate')
+            cooldown_end = self.cooldowns.get(voter)
+            if cooldown_end is not None and now < cooldown_end:
+                return 'cooldown', int(cooldown_end - now)
+            if timer:
+                timer.mark('cooldown')
+            if answers is not None:
+                answers.add(option)
+            else:
+                if self.ranked is not None:
+                    self.ranked.add(ranking)
+                votes[option] += 1
+                if self.top is not None:
+                    self.top.update(option, votes[option])
+                self.series.record(option, 1, now)
+            self.state['version'] += 1
+            self.cooldowns[voter] = now + cooldown
+        if timer:
+            timer.mark('tally')
+        return 'ok', cooldown
+
+    def vote_batch(self, votes, cooldown, accepted=None):
+        # Same rules as vote(), one lock round-trip for the whole batch
+        counts = {}
+        now = time.time()
+        with self.lock:
+            if not self.state['active']:
+                return {'inactive': len(votes)} if votes else {}
+            tally = self.state['votes']
+            cooldowns = self.cooldowns
+            record = self.series.record
+            top = self.top
+            answers = self.answers
+            ranked = self.ranked
+            ok = 0
+            for voter, option in votes:
+                if answers is not None:
+                    option = normalize_answer(option)
+                    valid = option is not None
+                elif ranked is not None:
+                    ranking = ranked.ranking(option)
+                    valid = ranking is not None
+                    if valid:
+                        option = ranked.options[ranking[0]]
+                else:
+                    valid = isinstance(option, str) and option in tally
+                if not valid:
+                    status = 'invalid'
+                else:
+                    cooldown_end = cooldowns.get(voter)
+                    if cooldown_end is not None and now < cooldown_end:
+                        status = 'cooldown'
+                    else:
+                        if answers is not None:
+                            answers.add(option)
+                        else:
+                            if ranked is not None:
+                                ranked.add(ranking)
+                            tally[option] += 1
+                            if top is not None:
+                                top.update(option, tally[option])
+                            record(option, 1, now)
+                        cooldowns[voter] = now + cooldown
+                        ok += 1
+                        if accepted is not None:
+                            accepted.append((voter, option))
+                        continue
+                counts[status] = counts.get(status, 0) + 1
+            if ok:
+                counts['ok'] = ok
+                self.state['version'] += ok
+        return counts
+
+    def cooldown_remaining(self, voter):
+        cooldown_end = self.cooldowns.get(voter)
+        if cooldown_end is None:
+            return 0
+        return max(0, int(cooldown_end - time.time()))
+
+    def timeseries(self, resolution, window):
+        with self.lock:
+            return self.series.window(resolution, window)
+
+    def cooldown_count(self):
+        return len(self.cooldowns)
+
+    def memory_usage(self):
+        # Walking a big poll takes tens of milliseconds, so only the
+        # references are taken under the lock; votes keep landing while the
+        # parts are measured, which is fine for an estimate
+        with self.lock:
+            state, cooldowns, series = self.state, self.cooldowns, self.series
+            extra = {'top': self.top, 'answers': self.answers, 'ranked': self.ranked}
+        usage = {
+            'state': deep_size(state),
+            'cooldowns': sampled_size(cooldowns),
+            'series': deep_size(series)
+        }
+        for name, part in extra.items():
+            if part is not None:
+                usage[name] = deep_size(part)
+        return usage
+
+    def version(self):
+        return self.state['version']
+
+    def export_state(self):
+        now = time.time()
+        with self.lock:
+            snap = dict(self.state)
+            snap['options'] = list(snap['options'])
+            snap['votes'] = dict(snap['votes'])
+            cooldowns = {voter: end for voter, end in self.cooldowns.items() if end > now}
+            answers = self.answers.to_dict() if self.answers is not None else None
+            ranked = self.ranked.to_dict() if self.ranked is not None else None
+        data = {'state': snap, 'cooldowns': cooldowns}
+        if answers is not None:
+            data['answers'] = answers
+        if ranked is not None:
+            data['ranked'] = ranked
+        return data
+
+    def import_state(self, data):
+        with self.lock:
+            self.state = dict(data['state'])
+            self.state['version'] = self.state.get('version', 0) + 1
+            self.cooldowns = dict(data['cooldowns'])
+            self.series = VoteSeries(self.state['options'])
+            answers = data.get('answers')
+            self.answers = SpaceSaving.from_dict(answers) if answers is not None else None
+            ranked = data.get('ranked')
+            self.ranked = RankedTally.from_dict(ranked) if ranked is not None else None
+            self._index()
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisClient:
+    # Minimal RESP2 client with a connection pool and pipelining
+
+    def __init__(self, host='localhost', port=6379, db=0, pool_size=16, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        return cls(parsed.hostname or 'localhost', parsed.port or 6379, db, **kwargs)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        if self.db:
+            self._send(conn, [('SELECT', self.db)])
+            self._read_reply(conn[1])
+        return conn
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, broken=False):
+        if broken:
+            conn[1].close()
+            conn[0].close()
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @staticmethod
+    def _encode(args):
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            elif isinstance(arg, str):
+                data = arg.encode()
+            else:
+                data = str(arg).encode()
+            out.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(out)
+
+    def _send(self, conn, commands):
+        conn[0].sendall(b''.join(self._encode(cmd) for cmd in commands))
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('connection closed by server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            return RedisError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply(reader) for _ in range(length)]
+        raise RedisError(f'unexpected reply: {line!r}')
+
+    def pipeline(self, commands):
+        # One write, then one reply per command; errors are returned in place
+        conn = self._acquire()
+        try:
+            self._send(conn, commands)
+            replies = [self._read_reply(conn[1]) for _ in commands]
+        except Exception:
+            self._release(conn, broken=True)
+            raise
+        self._release(conn)
+        return replies
+
+    def execute(self, *args):
+        reply = self.pipeline([args])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+
+# A whole vote in one atomic step, so a stop or reset can't land between the
+# checks, the cooldown claim and the tally. The cooldown is set last, so a
+# failed tally can't leave it set.
+# KEYS: poll, votes, cooldown; ARGV: option, cooldown seconds
+VOTE_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'active') ~= '1' then
+    return {'inactive', 0}
+end
+if redis.call('HEXISTS', KEYS[2], ARGV[1]) == 0 then
+    return {'invalid', 0}
+end
+local pttl = redis.call('PTTL', KEYS[3])
+if pttl ~= -2 then
+    return {'cooldown', pttl}
+end
+redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('SET', KEYS[3], 1, 'EX', ARGV[2])
+return {'ok', 0}
+"""
+VOTE_SHA = hashlib.sha1(VOTE_SCRIPT.encode()).hexdigest()
+
+
+class RedisStore(PollStore):
+    # Keys: <ns>:poll (hash of metadata), <ns>:votes (hash option -> count),
+    # <ns>:cd:<voter> (cooldown marker with a TTL)
+
+    def __init__(self, client, namespace='redlix', pipelining=True):
+        self.client = client
+        self.namespace = namespace
+        self.pipelining = pipelining
+        self.poll_key = f'{namespace}:poll'
+        self.votes_key = f'{namespace}:votes'
+        # Rate history of the votes accepted by this process only
+        self.series_lock = threading.Lock()
+        self.series = EMPTY_SERIES
+
+    def _run(self, commands):
+        if self.pipelining:
+            replies = self.client.pipeline(commands)
+        else:
+            replies = []
+            for cmd in commands:
+                replies.extend(self.client.pipeline([cmd]))
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _eval(self, script, sha, keys, args):
+        # EVALSHA, falling back to EVAL (which caches the script) the first
+        # time a server sees it
+        command = (len(keys), *keys, *args)
+        reply = self.client.pipeline([('EVALSHA', sha, *command)])[0]
+        if isinstance(reply, RedisError) and str(reply).startswith('NOSCRIPT'):
+            reply = self.client.pipeline([('EVAL', script, *command)])[0]
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def _cooldown_key(self, voter):
+        return f'{self.namespace}:cd:{voter}'
+
+    def start(self, question, options):
+        counts = []
+        for opt in options:
+            counts.extend((opt, 0))
+        commands = [
+            ('DEL', self.votes_key),
+            ('HSET', self.poll_key, 'active', 1, 'question', question,
+             'options', json.dumps(list(options)), 'start_time', repr(time.time())),
+            ('HINCRBY', self.poll_key, 'version', 1),
+        ]
+        if counts:
+            commands.append(('HSET', self.votes_key, *counts))
+        self._run(commands)
+        self.series = VoteSeries(options)
+
+    def stop(self):
+        self._run([('HSET', self.poll_key, 'active', 0), ('HINCRBY', self.poll_key, 'version', 1)])
+
+    def reset(self):
+        options = json.loads(self.client.execute('HGET', self.poll_key, 'options') or '[]')
+        if options:
+            counts = []
+            for opt in options:
+                counts.extend((opt, 0))
+            self._run([('DEL', self.votes_key), ('HSET', self.votes_key, *counts),
+                       ('HINCRBY', self.poll_key, 'version', 1)])
+            self.series = VoteSeries(options)
+
+    def snapshot(self):
+        meta, votes = self._run([('HGETALL', self.poll_key), ('HGETALL', self.votes_key)])
+        meta = dict(zip(meta[::2], meta[1::2]))
+        votes = dict(zip(votes[::2], votes[1::2]))
+        options = json.loads(meta.get('options', '[]'))
+        start_time = meta.get('start_time')
+        return {
+            'active': meta.get('active') == '1',
+            'question': meta.get('question', ''),
+            'options': options,
+            'votes': {opt: int(votes.get(opt, 0)) for opt in options},
+            'start_time': float(start_time) if start_time else None,
+            'version': int(meta.get('version', 0))
+        }
+
+    def vote(self, voter, option, cooldown, timer=None):
+        if not isinstance(option, str):
+            active = self.client.execute('HGET', self.poll_key, 'active')
+            return ('inactive' if active != '1' else 'invalid'), 0
+        status, pttl = self._eval(VOTE_SCRIPT, VOTE_SHA, (self.poll_key, self.votes_key, self._cooldown_key(voter)),
+                                  (option, cooldown))
+        if status != 'ok':
+            return status, max(0, pttl) // 1000
+        with self.series_lock:
+            if option not in self.series.index:
+                self.series = VoteSeries(self.snapshot()['options'])
+            self.series.record(option)
+        if timer:
+            timer.mark('tally')
+        return 'ok', cooldown
+
+    def cooldown_remaining(self, voter):
+        pttl = self.client.execute('PTTL', self._cooldown_key(voter))
+        return max(0, pttl) // 1000
+
+    def timeseries(self, resolution, window):
+        with self.series_lock:
+            return self.series.window(resolution, window)
+
+    def memory_usage(self):
+        # Tallies and cooldowns live in Redis; only the rate history is local
+        with self.series_lock:
+            return {'series': deep_size(self.series)}
+
+
+# One client, and so one connection pool, per Redis URL for every poll
+redis_clients = {}
+redis_clients_lock = threading.Lock()
+
+
+def redis_client(url):
+    with redis_clients_lock:
+        client = redis_clients.get(url)
+        if client is None:
+            client = redis_clients[url] = RedisClient.from_url(url)
+        return client
+
+
+def make_store(url=None, namespace='redlix', node_id='node', path=''):
+    # url: None/'memory' for the in-process store, redis://host:port/db,
+    # 'aggregator' to merge votes from several nodes, or
+    # node+http://host:port to count votes locally and sync to an aggregator
+    # (path is appended to the aggregator URL, e.g. a tenant prefix)
+    if not url or url == 'memory':
+        return MemoryStore()
+    if url.startswith('redis://'):
+        return RedisStore(redis_client(url), namespace)
+    if url == 'aggregator':
+        from crdt import AggregatorStore
+        return AggregatorStore()
+    if url.startswith('node+'):
+        from crdt import NodeStore
+        return NodeStore(url[len('node+'):].rstrip('/') + path, node_id)
+    raise ValueError(f'unsupported store url: {url}')
@@ -0,0 +1,81 @@
+import os
+import time
+from array import array
+
+# Fixed-size per-option vote counts at one-second and one-minute resolution.
+# Both rings are allocated up front, so memory depends only on the number of
+# options and slots, never on how long the stream runs. Recording a vote is a
+# couple of index operations; a slot is zeroed in place when it is reused.
+
+SERIES_SECONDS = int(os.environ.get('REDLIX_SERIES_SECONDS', 120))
+SERIES_MINUTES = int(os.environ.get('REDLIX_SERIES_MINUTES', 60))
+
+RESOLUTIONS = ('s', 'm')
+
+
+class Ring:
+    __slots__ = ('step', 'slots', 'width', 'counts', 'stamps', 'zeros')
+
+    def __init__(self, step, slots, width):
+        self.step = step
+        self.slots = slots
+        self.width = width
+        self.counts = array('I', bytes(4 * slots * width))
+        self.stamps = array('I', bytes(4 * slots))  # period number held by each slot
+        self.zeros = array('I', bytes(4 * width))
+
+    def add(self, index, now, amount=1):
+        period = int(now) // self.step
+        slot = period % self.slots
+        base = slot * self.width
+        if self.stamps[slot] != period:
+            self.counts[base:base + self.width] = self.zeros
+            self.stamps[slot] = period
+        self.counts[base + index] += amount
+
+    def window(self, count, now):
+        # Per-option counts for the last `count` periods, oldest first
+        count = max(1, min(count, self.slots))
+        last = int(now) // self.step
+        columns = [[0] * count for _ in range(self.width)]
+        for i, period in enumerate(range(last - count + 1, last + 1)):
+            slot = period % self.slots
+            if self.stamps[slot] != period:
+                continue
+            base = slot * self.width
+            for opt in range(self.width):
+                columns[opt][i] = self.counts[base + opt]
+        return last * self.step, columns
+
+
+class VoteSeries:
+    __slots__ = ('index', 'seconds', 'minutes')
+
+    def __init__(self, options, seconds=None, minutes=None):
+        width = len(options)
+        self.index = {opt: i for i, opt in enumerate(options)}
+        self.seconds = Ring(1, seconds or SERIES_SECONDS, width)
+        self.minutes = Ring(60, minutes or SERIES_MINUTES, width)
+
+    def record(self, option, amount=1, now=None):
+        index = self.index.get(option)
+        if index is None:
+            return
+        if now is None:
+            now = time.time()
+        self.seconds.add(index, now, amount)
+        self.minutes.add(index, now, amount)
+
+    def window(self, resolution='s', count=60, now=None):
+        ring = self.seconds if resolution == 's' else self.minutes
+        end, columns = ring.window(count, time.time() if now is None else now)
+        return {
+            'resolution': resolution,
+            'step': ring.step,
+            'end': end,
+            'options': list(self.index),
+            'counts': columns
+        }
+
+
+EMPTY_SERIES = VoteSeries([], 1, 1)
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answers import SpaceSaving, normalize_answer  # noqa: E402
+from memory import deep_size, sampled_size  # noqa: E402
+
+# Accuracy vs. memory of the free-text answer counter. Feeds one skewed
+# answer stream (Zipf-like over a large vocabulary, with case, punctuation
+# and spacing variants, plus a long tail of one-off answers) through
+# SpaceSaving at several capacities and compares each with an exact counter:
+# recall of the true top answers, the largest and mean error over them, the
+# guaranteed bound total / capacity, bytes held and answers/sec. The summary
+# size is also sampled along the stream to show it stays flat.
+#
+#   python tools/bench_answers.py --answers 1000000 --capacities 100,1000,10000
+
+
+def answer_stream(count, vocabulary, seed=3):
+    rng = random.Random(seed)
+    words = [f'answer {i}' for i in range(vocabulary)]
+    for n in range(count):
+        if rng.random() < 0.15:
+            text = f'one-off {n}'
+        else:
+            text = words[min(int(rng.paretovariate(1.1)) - 1, vocabulary - 1)]
+        roll = rng.random()
+        if roll < 0.2:
+            text = text.upper()
+        elif roll < 0.3:
+            text = f'  {text}!'
+        yield text
+
+
+def run_capacity(answers, capacity, exact, top, samples):
+    summary = SpaceSaving(capacity)
+    sizes = []
+    add = summary.add
+    began = time.perf_counter()
+    for n, answer in enumerate(answers, 1):
+        add(answer)
+        if n in samples:
+            sizes.append(deep_size(summary))
+    elapsed = time.perf_counter() - began
+    truth = exact.most_common(top)
+    reported = {answer for answer, _ in summary.top(top)}
+    errors = [summary.counts.get(answer, 0) - count for answer, count in truth]
+    relative = [abs(error) / count for error, (_, count) in zip(errors, truth)]
+    return {
+        'capacity': capacity,
+        'bytes': deep_size(summary),
+        'bytes_along_stream': sizes,
+        'answers_per_second': round(len(answers) / elapsed),
+        f'top{top}_recall': round(sum(answer in reported for answer, _ in truth) / len(truth), 3),
+        'max_error': max(abs(error) for error in errors),
+        'mean_relative_error': round(sum(relative) / len(relative), 5),
+        'error_bound': summary.error_bound(),
+        'guaranteed_bound': len(answers) // capacity,
+        'bound_held': all(summary.counts.get(answer, 0) - count <= len(answers) // capacity
+                          for answer, count in exact.items() if answer in summary.counts)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Free-text answer counting: accuracy vs. memory')
+    parser.add_argument('--answers', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=100000)
+    parser.add_argument('--capacities', default='50,100,500,1000,5000,20000')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    answers = [normalize_answer(text) for text in answer_stream(args.answers, args.vocabulary)]
+    exact = Counter(answers)
+    samples = {args.answers // 4, args.answers // 2, args.answers}
+    report = {
+        'answers': args.answers,
+        'distinct': len(exact),
+        'exact_bytes': sampled_size(exact),
+        'runs': [run_capacity(answers, int(capacity), exact, args.top, samples)
+                 for capacity in args.capacities.split(',')]
+    }
+    print(json.dumps(report, indent=2))
+    if not all(run['bound_held'] for run in report['runs']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
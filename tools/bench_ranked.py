@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranked import RankedTally  # noqa: E402
+from store import MemoryStore  # noqa: E402
+
+# Ranked-choice benchmark. Casts --ballots ballots (default 100k over 10
+# options, partial rankings from a few blocs of voters with noise, so the
+# race stays close and the elimination order keeps shifting early on)
+# through MemoryStore.vote and reads the result after every --read-every
+# ballots the way /api/poll does. Reports ballots/sec, read latency, how
+# many reads had to recount, the cost of a full recount for comparison, and
+# checks the final rounds against a plain one-ballot-at-a-time runoff.
+#
+#   python tools/bench_ranked.py --ballots 100000 --options 10
+
+
+def ballot_stream(count, options, seed=11):
+    rng = random.Random(seed)
+    blocs = [rng.sample(options, len(options)) for _ in range(4)]
+    weights = [0.3, 0.28, 0.24, 0.18]
+    for _ in range(count):
+        order = list(rng.choices(blocs, weights)[0])
+        for _ in range(rng.randrange(3)):
+            i, j = rng.randrange(len(order)), rng.randrange(len(order))
+            order[i], order[j] = order[j], order[i]
+        yield order[:rng.randint(1, len(order))]
+
+
+def plain_runoff(options, ballots):
+    # Every ballot walked in every round; slow but obviously right
+    running = list(range(len(options)))
+    index = {opt: i for i, opt in enumerate(options)}
+    ballots = [[index[opt] for opt in ballot] for ballot in ballots]
+    rounds = []
+    while True:
+        counts = dict.fromkeys(running, 0)
+        exhausted = 0
+        for ballot in ballots:
+            for choice in ballot:
+                if choice in counts:
+                    counts[choice] += 1
+                    break
+            else:
+                exhausted += 1
+        rounds.append({options[i]: counts[i] for i in running})
+        leader = max(running, key=lambda i: (counts[i], -i))
+        if counts[leader] * 2 > len(ballots) - exhausted or len(running) == 1:
+            return rounds, options[leader]
+        running.remove(min(running, key=lambda i: (counts[i], -i)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ranked-choice tally benchmark')
+    parser.add_argument('--ballots', type=int, default=100000)
+    parser.add_argument('--options', type=int, default=10)
+    parser.add_argument('--read-every', type=int, default=1000)
+    args = parser.parse_args()
+
+    options = [f'Option {i}' for i in range(args.options)]
+    ballots = list(ballot_stream(args.ballots, options))
+    store = MemoryStore()
+    store.start_ranked('Ranked?', options)
+    vote = store.vote
+    reads, recounts = [], 0
+    voting = 0.0
+    for n, ballot in enumerate(ballots, 1):
+        began = time.perf_counter()
+        vote(f'voter-{n}', ballot, 3600)
+        voting += time.perf_counter() - began
+        if n % args.read_every == 0 or n == len(ballots):
+            recounts += store.ranked.stale
+            began = time.perf_counter()
+            snap = store.snapshot()
+            reads.append(time.perf_counter() - began)
+
+    began = time.perf_counter()
+    fresh = RankedTally.from_dict(store.ranked.to_dict()).result()
+    full_recount = time.perf_counter() - began
+    rounds, winner = plain_runoff(options, ballots)
+    check = [r['counts'] for r in snap['rounds']] == rounds and snap['winner'] == winner \
+        and fresh['rounds'] == snap['rounds']
+    reads.sort()
+    report = {
+        'ballots': len(ballots),
+        'options': len(options),
+        'distinct_rankings': len(store.ranked.ballots),
+        'ballots_per_second': round(len(ballots) / voting),
+        'reads': len(reads),
+        'reads_recounted': recounts,
+        'read_p50_ms': round(reads[len(reads) // 2] * 1000, 3),
+        'read_p99_ms': round(reads[min(len(reads) - 1, int(len(reads) * 0.99))] * 1000, 3),
+        'read_max_ms': round(reads[-1] * 1000, 3),
+        'full_recount_ms': round(full_recount * 1000, 3),
+        'rounds': len(snap['rounds']),
+        'winner': snap['winner'],
+        'result_check': 'ok' if check else 'mismatch'
+    }
+    print(json.dumps(report, indent=2))
+    if not check:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
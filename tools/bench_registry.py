@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import polls  # noqa: E402
+
+# Vote throughput on one hot poll while more and more other polls are live
+# and taking votes in the background (the count excludes the hot poll). With
+# per-poll locks and O(1) registry lookups the hot poll's rate should stay
+# flat as polls are added.
+
+TENANT = 'bench'
+
+
+def run(poll_count, votes, background):
+    options = ['A', 'B', 'C', 'D']
+    polls.poll_store(TENANT, 'hot', create=True).start('Hot question?', options)
+    for i in range(poll_count):
+        polls.poll_store(TENANT, f'poll{i}', create=True).start(f'Question {i}?', options)
+
+    stop = threading.Event()
+
+    def quiet_voter(tid):
+        n = 0
+        while not stop.is_set():
+            polls.poll_store(TENANT, f'poll{n % poll_count}').vote(f'bg-{tid}-{n}', options[n % 4], 30)
+            n += 1
+
+    workers = [threading.Thread(target=quiet_voter, args=(t,)) for t in range(background)]
+    for w in workers:
+        w.start()
+    began = time.perf_counter()
+    for n in range(votes):
+        polls.poll_store(TENANT, 'hot').vote(f'hot-{poll_count}-{n}', options[n % 4], 30)
+    elapsed = time.perf_counter() - began
+    stop.set()
+    for w in workers:
+        w.join()
+
+    total = sum(polls.poll_store(TENANT, 'hot').snapshot()['votes'].values())
+    polls.drop_tenant(TENANT)
+    if total != votes:
+        raise SystemExit(f'tally mismatch on hot poll: {total} != {votes}')
+    return votes / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the multi-poll registry')
+    parser.add_argument('--votes', type=int, default=50000, help='votes on the hot poll per run')
+    parser.add_argument('--background', type=int, default=2, help='threads voting on other polls')
+    parser.add_argument('--polls', default='1,10,100,500')
+    args = parser.parse_args()
+
+    results = {}
+    for count in [int(n) for n in args.polls.split(',')]:
+        results[count] = run(count, args.votes, args.background)
+        print(f'{count:5d} other polls: {results[count]:12,.0f} votes/sec on the hot poll')
+    print(json.dumps({str(count): round(rate) for count, rate in results.items()}))
+
+
+if __name__ == '__main__':
+    main()
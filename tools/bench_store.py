@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import MemoryStore, RedisClient, RedisStore  # noqa: E402
+from redis_standin import StandinServer  # noqa: E402
+
+# Votes/sec through each store backend. Every vote uses a distinct voter so
+# the full path (state check, cooldown claim, tally increment) is exercised.
+
+
+def run(store, votes, threads):
+    options = [f'Option {i}' for i in range(4)]
+    store.start('Benchmark?', options)
+    per_thread = votes // threads
+
+    def worker(tid):
+        for i in range(per_thread):
+            store.vote(f'voter-{tid}-{i}', options[i % len(options)], 30)
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    began = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - began
+
+    total = sum(store.snapshot()['votes'].values())
+    if total != per_thread * threads:
+        raise SystemExit(f'tally mismatch: {total} != {per_thread * threads}')
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark poll store backends')
+    parser.add_argument('--votes', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--redis', help='redis:// url (default: in-process stand-in)')
+    args = parser.parse_args()
+
+    url = args.redis or StandinServer().start().url
+    results = {'memory': run(MemoryStore(), args.votes, args.threads)}
+    for pipelining in (False, True):
+        client = RedisClient.from_url(url, pool_size=args.threads)
+        name = 'redis_pipelined' if pipelining else 'redis_unpipelined'
+        store = RedisStore(client, namespace=f'bench:{name}', pipelining=pipelining)
+        results[name] = run(store, args.votes, args.threads)
+
+    for name, rate in results.items():
+        print(f'{name:20s} {rate:12,.0f} votes/sec')
+    print(json.dumps({name: round(rate) for name, rate in results.items()}))
+
+
+if __name__ == '__main__':
+    main()
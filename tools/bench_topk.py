@@ -0,0 +1,155 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import MemoryStore  # noqa: E402
+from topk import top_of  # noqa: E402
+
+# Leader index benchmark for "song request" polls. Runs a 10k option poll
+# under a steady vote stream (20k votes/s by default, skewed towards a
+# popularity ranking that shifts every second so the leaders keep changing)
+# while a reader polls it the way the overlay does. Each read is timed both
+# ways: /api/poll?top=N (leaders() + JSON) and the full snapshot sorted and
+# serialized as before. Also reports the cost of a vote with and without the
+# index, and checks the final leaders against a full sort.
+#
+#   python tools/bench_topk.py --options 10000 --rate 20000 --duration 10
+
+
+def voter_stream(options, seed=7):
+    rng = random.Random(seed)
+    ranking = list(options)
+    n = 0
+    while True:
+        if n % 20000 == 0:
+            # A few songs climb the ranking every so often
+            for _ in range(10):
+                i = rng.randrange(len(ranking))
+                ranking.insert(0, ranking.pop(i))
+        if rng.random() < 0.8:
+            option = ranking[min(int(rng.paretovariate(0.8)) - 1, len(ranking) - 1)]
+        else:
+            option = rng.choice(options)
+        yield f'voter-{n}', option
+        n += 1
+
+
+def vote_cost(options, count, indexed):
+    store = MemoryStore()
+    store.start('Song request', options)
+    if not indexed:
+        store.top = None
+    stream = voter_stream(options)
+    votes = [next(stream) for _ in range(count)]
+    vote = store.vote
+    began = time.perf_counter()
+    for voter, option in votes:
+        vote(voter, option, 3600)
+    return (time.perf_counter() - began) / count * 1e6
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p99_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3)
+    }
+
+
+def full_read(store, n):
+    # What /api/poll plus a client-side sort cost before the index
+    snap = store.snapshot()
+    body = json.dumps(snap)
+    sorted(snap['options'], key=lambda opt: -snap['votes'][opt])[:n]
+    return body
+
+
+def run(args):
+    options = [f'Song {i:05d}' for i in range(args.options)]
+    store = MemoryStore()
+    store.start('Song request', options)
+    stream = voter_stream(options)
+    stopped = threading.Event()
+    sent = [0]
+
+    def writer():
+        tick = 0.01
+        per_tick = args.rate * tick
+        began = time.perf_counter()
+        due = 0.0
+        while not stopped.is_set():
+            due += per_tick
+            batch = int(due) - sent[0]
+            for _ in range(batch):
+                voter, option = next(stream)
+                store.vote(voter, option, 3600)
+            sent[0] += batch
+            delay = began + (sent[0] / args.rate) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    began = time.perf_counter()
+    thread.start()
+    top_times, full_times = [], []
+    top_bytes = full_bytes = 0
+    while time.perf_counter() - began < args.duration:
+        t0 = time.perf_counter()
+        top_bytes = len(json.dumps(store.leaders(args.top)))
+        t1 = time.perf_counter()
+        full_bytes = len(full_read(store, args.top))
+        t2 = time.perf_counter()
+        top_times.append(t1 - t0)
+        full_times.append(t2 - t1)
+        time.sleep(args.read_interval)
+    stopped.set()
+    thread.join()
+    elapsed = time.perf_counter() - began
+
+    snap = store.snapshot()
+    leaders = store.leaders(args.top)
+    expected = top_of(snap['options'], snap['votes'], args.top)
+    check = list(leaders['votes'].items()) == expected and leaders['total_votes'] == sum(snap['votes'].values())
+    report = {
+        'options': args.options,
+        'votes': sent[0],
+        'votes_per_second': round(sent[0] / elapsed),
+        'reads': len(top_times),
+        'vote_us': {
+            'indexed': round(vote_cost(options, args.cost_votes, True), 3),
+            'unindexed': round(vote_cost(options, args.cost_votes, False), 3)
+        },
+        'read_top': dict(percentiles(top_times), bytes=top_bytes),
+        'read_full': dict(percentiles(full_times), bytes=full_bytes),
+        'speedup_p50': round(statistics.median(full_times) / statistics.median(top_times), 1),
+        'leaders': leaders['options'][:5],
+        'leaders_check': 'ok' if check else 'mismatch'
+    }
+    print(json.dumps(report, indent=2))
+    if not check:
+        print(f'expected {expected}', file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Top-K leader index benchmark')
+    parser.add_argument('--options', type=int, default=10000)
+    parser.add_argument('--rate', type=float, default=20000, help='votes per second')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--read-interval', type=float, default=0.1)
+    parser.add_argument('--cost-votes', type=int, default=200000,
+                        help='votes timed back to back for the per-vote cost')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Runs one aggregator and several voting nodes as local processes, votes
+# through every node (restarting one of them halfway) and checks that the
+# merged totals equal the number of accepted votes.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def spawn(base_port, store, node_id):
+    env = dict(os.environ,
+               REDLIX_DISPLAY_PORT=str(base_port),
+               REDLIX_DASHBOARD_PORT=str(base_port + 1),
+               REDLIX_VOTING_PORT=str(base_port + 2),
+               REDLIX_STORE=store,
+               REDLIX_NODE_ID=node_id)
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'polls.py')], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def request(port, method, path, body=None, source='127.0.0.1'):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10, source_address=(source, 0))
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        resp = conn.getresponse()
+        return json.loads(resp.read())
+    finally:
+        conn.close()
+
+
+def wait_until(check, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if check():
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise SystemExit('timed out waiting for the cluster')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check multi-node vote aggregation')
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--votes', type=int, default=200, help='votes per node')
+    parser.add_argument('--base-port', type=int, default=7100)
+    args = parser.parse_args()
+
+    agg_port = args.base_port
+    aggregator = spawn(agg_port, 'aggregator', 'aggregator')
+    node_ports = [args.base_port + 10 * (i + 1) for i in range(args.nodes)]
+    agg_url = f'node+http://127.0.0.1:{agg_port + 1}'
+    nodes = [spawn(port, agg_url, f'node{i}') for i, port in enumerate(node_ports)]
+
+    try:
+        for port in node_ports:
+            wait_until(lambda port=port: request(port + 1, 'GET', '/api/crdt/status')['synced'])
+        options = ['Red', 'Green', 'Blue']
+        request(agg_port + 1, 'POST', '/api/start', {'question': 'Colour?', 'options': options})
+        for port in node_ports:
+            wait_until(lambda port=port: request(port, 'GET', '/api/poll')['active'])
+
+        accepted = 0
+        for round_no in range(2):
+            for i, port in enumerate(node_ports):
+                for v in range(args.votes // 2):
+                    # Distinct loopback source addresses act as distinct voters
+                    source = f'127.{round_no + 1}.{i}.{v + 1}'
+                    result = request(port + 2, 'POST', '/api/vote',
+                                     {'option': options[v % len(options)]}, source)
+                    accepted += result['success']
+            if round_no == 0:
+                # Restart the first node once everything it counted is shipped
+                wait_until(lambda: request(node_ports[0] + 1, 'GET', '/api/crdt/status')['pending'] == 0)
+                nodes[0].terminate()
+                nodes[0].wait()
+                nodes[0] = spawn(node_ports[0], agg_url, 'node0')
+                wait_until(lambda: request(node_ports[0], 'GET', '/api/poll')['active'])
+
+        for port in node_ports:
+            wait_until(lambda port=port: request(port + 1, 'GET', '/api/crdt/status')['pending'] == 0)
+        time.sleep(1)
+        merged = request(agg_port, 'GET', '/api/poll')['votes']
+        total = sum(merged.values())
+        print(json.dumps({'accepted': accepted, 'merged': merged, 'total': total}))
+        node_totals = [sum(request(port, 'GET', '/api/poll')['votes'].values()) for port in node_ports]
+        if total != accepted or any(t != accepted for t in node_totals):
+            raise SystemExit(f'mismatch: accepted={accepted} aggregator={total} nodes={node_totals}')
+        print('OK: merged totals match accepted votes')
+    finally:
+        for proc in [aggregator] + nodes:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat import ChatIngestor  # noqa: E402
+from store import MemoryStore  # noqa: E402
+
+# Local stand-in for an IRC/Twitch chat server. Every client that connects
+# gets the same stream of lines, either from a recorded file (one raw IRC line
+# per line) or generated: '!vote N' from many users mixed with ordinary chat,
+# invalid votes and PINGs.
+#
+#   python tools/fake_chat.py --port 6667 --messages 1000000 --rate 20000
+#   REDLIX_CHAT=irc://localhost:6667/#fake python polls.py
+#
+# --bench runs the ingestor in-process against a memory store instead,
+# reports messages/sec and checks the final tally against the expected one.
+
+OPTIONS = ['Option A', 'Option B', 'Option C', 'Option D']
+
+
+def generate(users, messages, options, seed=1):
+    # Returns (lines, expected tally). With a cooldown longer than the run,
+    # only each user's first valid vote counts.
+    rng = random.Random(seed)
+    expected = {opt: 0 for opt in options}
+    voted = set()
+    lines = []
+    for n in range(messages):
+        user = f'viewer{rng.randrange(users)}'
+        roll = rng.random()
+        prefix = f'@badge-info=;color=#1E90FF;display-name={user} ' if roll < 0.5 else ''
+        if roll < 0.25:
+            # Chatter that mentions '!vote' without starting with it never counts
+            text = rng.choice(['hello', 'PogChamp', 'gg', 'what is the poll?', '!vote', 'lol :!vote 2',
+                               'type !vote 1'])
+        elif roll < 0.28:
+            text = f'!vote {len(options) + 1 + rng.randrange(5)}'
+        else:
+            index = rng.randrange(len(options))
+            text = f'!vote {index + 1}' if roll < 0.9 else f'!vote {options[index].lower()}'
+            if user not in voted:
+                voted.add(user)
+                expected[options[index]] += 1
+        lines.append(f'{prefix}:{user}!{user}@{user}.tmi.example PRIVMSG #fake :{text}\r\n')
+        if n % 5000 == 4999:
+            lines.append('PING :tmi.example\r\n')
+    return lines, expected
+
+
+class FakeChatServer:
+    def __init__(self, lines, address=('127.0.0.1', 0), rate=0.0, chunk=500):
+        self.payload = [''.join(lines[i:i + chunk]).encode() for i in range(0, len(lines), chunk)]
+        self.chunk = chunk
+        self.rate = rate
+        self.sock = socket.create_server(address)
+        self.address = self.sock.getsockname()
+        self.sent = 0
+
+    def start(self):
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self):
+        while True:
+            conn, _ = self.sock.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            conn.settimeout(5)
+            try:
+                conn.recv(4096)  # NICK / JOIN
+                conn.settimeout(None)
+                began = time.perf_counter()
+                for i, data in enumerate(self.payload):
+                    if self.rate:
+                        delay = began + i * self.chunk / self.rate - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    conn.sendall(data)
+                    self.sent += 1
+                # Stay connected like a real server until the client leaves
+                while conn.recv(4096):
+                    pass
+            except OSError:
+                pass
+
+
+def bench(args):
+    lines, expected = generate(args.users, args.messages, OPTIONS)
+    server = FakeChatServer(lines, rate=args.rate).start()
+    store = MemoryStore()
+    store.start('Chat poll?', OPTIONS)
+    ingestor = ChatIngestor(server.address[0], server.address[1], '#fake', lambda: store, 3600,
+                            batch_size=args.batch_size)
+    began = time.perf_counter()
+    ingestor.start()
+    while ingestor.lines < len(lines):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - began
+    ingestor.stop()
+    votes = store.snapshot()['votes']
+    report = {
+        'lines': len(lines),
+        'commands': ingestor.commands,
+        'seconds': round(elapsed, 3),
+        'lines_per_second': round(len(lines) / elapsed),
+        'applied': ingestor.applied,
+        'tally': votes,
+        'tally_check': 'ok' if votes == expected else 'mismatch'
+    }
+    print(json.dumps(report, indent=2))
+    if votes != expected:
+        print(f'expected {expected}', file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake IRC chat server for the chat ingestor')
+    parser.add_argument('--port', type=int, default=6667)
+    parser.add_argument('--file', help='send these recorded raw IRC lines instead of generated ones')
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--rate', type=float, default=0.0, help='lines per second (0 = as fast as possible)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--bench', action='store_true', help='run the ingestor in-process and check tallies')
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args)
+        return
+    if args.file:
+        with open(args.file, newline='') as f:
+            lines = [line if line.endswith('\n') else line + '\r\n' for line in f]
+    else:
+        lines, expected = generate(args.users, args.messages, OPTIONS)
+        print(f'expected tally with a long cooldown: {json.dumps(expected)}')
+    FakeChatServer(lines, ('127.0.0.1', args.port), rate=args.rate).start()
+    print(f'fake chat on 127.0.0.1:{args.port}, {len(lines)} lines per connection')
+    threading.Event().wait()
+
+
+if __name__ == '__main__':
+    main()
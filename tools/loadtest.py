@@ -0,0 +1,308 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+# Load generator for the three servers. It starts polls.py locally (or
+# targets a running instance), then drives a mix of OBS-style pollers on
+# /api/poll, voters on /api/vote and /api/bootstrap with distinct source
+# addresses, and dashboard actions during the run. The report is JSON and can
+# be compared against a stored baseline to gate regressions.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPTIONS = ['Option A', 'Option B', 'Option C', 'Option D']
+
+
+def source_address(index):
+    # Distinct loopback addresses (127.a.b.c) so each voter has its own IP
+    return f'127.{1 + index // 65025 % 254}.{index // 255 % 255}.{index % 255 + 1}'
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+class Client:
+    # One keep-alive connection; records (endpoint, seconds, ok) samples
+
+    def __init__(self, host, port, samples, source=None):
+        self.host = host
+        self.port = port
+        self.source = (source, 0) if source else None
+        self.samples = samples
+        self.conn = None
+
+    def request(self, method, path, body=None, endpoint=None):
+        endpoint = endpoint or f'{method} {path.split("?")[0]}'
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        began = time.perf_counter()
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection(self.host, self.port, timeout=10,
+                                                           source_address=self.source)
+                self.conn.request(method, path, payload, headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                ok = resp.status < 400
+                self.samples.append((endpoint, time.perf_counter() - began, ok))
+                return json.loads(data) if ok and data[:1] in (b'{', b'[') else None
+            except (OSError, http.client.HTTPException):
+                if self.conn is not None:
+                    self.conn.close()
+                    self.conn = None
+                # A dropped keep-alive connection is retried once on a new one
+                if attempt:
+                    self.samples.append((endpoint, time.perf_counter() - began, False))
+                    return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.host = args.host
+        self.display_port = args.port
+        self.dashboard_port = args.port + 1
+        self.voting_port = args.port + 2
+        self.stop = threading.Event()
+        self.samples = []        # one list per client thread
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.tally_exact = True  # false once a reset raced with votes
+
+    def new_samples(self):
+        samples = []
+        with self.lock:
+            self.samples.append(samples)
+        return samples
+
+    def wait(self, seconds):
+        return self.stop.wait(seconds)
+
+    def poller(self, index, delay=0.0):
+        # Spike pollers (delay > 0) all join at the same moment
+        if delay and self.wait(delay):
+            return
+        client = Client(self.host, self.display_port, self.new_samples())
+        self.wait(random.random() * self.args.poll_interval)
+        while not self.stop.is_set():
+            began = time.perf_counter()
+            data = client.request('GET', self.args.poll_path)
+            interval = self.args.poll_interval
+            if self.args.adaptive and data and data.get('next_poll_ms'):
+                # Jittered here, as the pages do
+                jitter = data.get('next_poll_jitter', 0)
+                interval = data['next_poll_ms'] / 1000 * random.uniform(1 - jitter, 1 + jitter)
+            self.wait(max(0.0, interval - (time.perf_counter() - began)))
+        client.close()
+
+    def voter(self, index):
+        source = None if self.args.no_source_ips else source_address(index)
+        client = Client(self.host, self.voting_port, self.new_samples(), source)
+        self.wait(random.random() * self.args.vote_interval)
+        client.request('GET', '/api/bootstrap')
+        accepted = rejected = 0
+        while not self.stop.is_set():
+            began = time.perf_counter()
+            result = client.request('POST', '/api/vote', {'option': random.choice(OPTIONS)})
+            if result is not None:
+                if result.get('success'):
+                    accepted += 1
+                else:
+                    rejected += 1
+            self.wait(max(0.0, self.args.vote_interval - (time.perf_counter() - began)))
+        client.close()
+        with self.lock:
+            self.accepted += accepted
+            self.rejected += rejected
+
+    def dashboard(self):
+        client = Client(self.host, self.dashboard_port, self.new_samples())
+        if self.args.reset_at and not self.wait(self.args.reset_at):
+            client.request('POST', '/api/reset')
+            self.tally_exact = False
+        client.close()
+
+    def run(self):
+        control = Client(self.host, self.dashboard_port, [])
+        if self.args.idle:
+            control.request('POST', '/api/stop')
+        else:
+            control.request('POST', '/api/start', {'question': 'Load test?', 'options': OPTIONS})
+        control.close()
+
+        threads = [threading.Thread(target=self.poller, args=(i,)) for i in range(self.args.pollers)]
+        threads += [threading.Thread(target=self.poller, args=(self.args.pollers + i, self.args.spike_at))
+                    for i in range(self.args.spike_pollers if self.args.spike_at else 0)]
+        threads += [threading.Thread(target=self.voter, args=(i,)) for i in range(self.args.voters)]
+        threads.append(threading.Thread(target=self.dashboard))
+        began = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        self.wait(self.args.duration)
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        final = Client(self.host, self.display_port, []).request('GET', '/api/poll')
+        return self.report(elapsed, final)
+
+    def report(self, elapsed, final):
+        by_endpoint = {}
+        for samples in self.samples:
+            for endpoint, seconds, ok in samples:
+                entry = by_endpoint.setdefault(endpoint, ([], [0]))
+                entry[0].append(seconds)
+                if not ok:
+                    entry[1][0] += 1
+        endpoints = {}
+        for endpoint, (latencies, errors) in sorted(by_endpoint.items()):
+            latencies.sort()
+            endpoints[endpoint] = {
+                'requests': len(latencies),
+                'errors': errors[0],
+                'error_rate': round(errors[0] / len(latencies), 5),
+                'throughput': round(len(latencies) / elapsed, 1),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+                'max_ms': round(latencies[-1] * 1000, 3)
+            }
+        final_total = sum(final['votes'].values()) if final else None
+        return {
+            'config': {
+                'pollers': self.args.pollers,
+                'voters': self.args.voters,
+                'duration': self.args.duration,
+                'poll_interval': self.args.poll_interval,
+                'vote_interval': self.args.vote_interval,
+                'adaptive': self.args.adaptive,
+                'idle': self.args.idle,
+                'spike_at': self.args.spike_at,
+                'spike_pollers': self.args.spike_pollers
+            },
+            'elapsed': round(elapsed, 3),
+            'endpoints': endpoints,
+            'votes': {
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'final_tally': final_total,
+                'tally_check': ('ok' if final_total == self.accepted else 'mismatch')
+                if self.tally_exact else 'skipped'
+            }
+        }
+
+
+def compare(report, baseline, tolerance):
+    # Returns a list of regressions of report against baseline
+    problems = []
+    for endpoint, base in baseline['endpoints'].items():
+        current = report['endpoints'].get(endpoint)
+        if current is None:
+            problems.append(f'{endpoint}: missing from this run')
+            continue
+        if current['throughput'] < base['throughput'] * (1 - tolerance):
+            problems.append(f"{endpoint}: throughput {current['throughput']} < {base['throughput']}")
+        for key in ('p95_ms', 'p99_ms'):
+            if current[key] > base[key] * (1 + tolerance):
+                problems.append(f'{endpoint}: {key} {current[key]} > {base[key]}')
+        if current['error_rate'] > base['error_rate'] + 0.001:
+            problems.append(f"{endpoint}: error rate {current['error_rate']} > {base['error_rate']}")
+    if report['votes']['tally_check'] == 'mismatch':
+        problems.append('final tally does not match accepted votes')
+    return problems
+
+
+def spawn_server(port, extra_env, args=()):
+    env = dict(os.environ,
+               REDLIX_DISPLAY_PORT=str(port),
+               REDLIX_DASHBOARD_PORT=str(port + 1),
+               REDLIX_VOTING_PORT=str(port + 2))
+    env.update(extra_env)
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'polls.py'), *args], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            for offset in range(3):
+                conn = http.client.HTTPConnection('127.0.0.1', port + offset, timeout=1)
+                conn.request('GET', '/metrics')
+                conn.getresponse().read()
+                conn.close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit('server did not come up')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Load test the display, dashboard and voting servers')
+    parser.add_argument('--pollers', type=int, default=20, help='OBS-style clients polling /api/poll')
+    parser.add_argument('--voters', type=int, default=100, help='voters, each with its own source IP')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds between polls per client')
+    parser.add_argument('--poll-path', default='/api/poll')
+    parser.add_argument('--vote-interval', type=float, default=1.0, help='seconds between votes per voter')
+    parser.add_argument('--reset-at', type=float, default=0.0, help='reset the poll after this many seconds')
+    parser.add_argument('--adaptive', action='store_true', help='follow next_poll_ms from /api/poll')
+    parser.add_argument('--idle', action='store_true', help='leave the poll stopped, as between polls')
+    parser.add_argument('--spike-at', type=float, default=0.0, help='add --spike-pollers after this many seconds')
+    parser.add_argument('--spike-pollers', type=int, default=200)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7300, help='display port; dashboard and voting follow')
+    parser.add_argument('--no-spawn', action='store_true', help='target an already running instance')
+    parser.add_argument('--server-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the spawned server')
+    parser.add_argument('--no-source-ips', action='store_true',
+                        help='do not bind voters to distinct 127.x.y.z addresses')
+    parser.add_argument('--output', help='write the JSON report here')
+    parser.add_argument('--baseline', help='compare against this JSON report')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    proc = None
+    if not args.no_spawn:
+        extra_env = dict(item.split('=', 1) for item in args.server_env)
+        proc = spawn_server(args.port, extra_env)
+    try:
+        report = LoadTest(args).run()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION: {problem}', file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import polls  # noqa: E402
+from flask import jsonify  # noqa: E402
+from store import MemoryStore  # noqa: E402
+
+# Microbenchmarks for the hot paths of the memory store, in isolation from
+# HTTP: an accepted vote (validate + tally + cooldown insert), a vote rejected
+# by cooldown, a vote for an unknown option, the cooldown lookup, snapshot +
+# JSON serialization as done by /api/poll, and start/reset with large option
+# lists. Each case is calibrated to run for at least --min-time per
+# repetition, warmed up, and reported as the median of --repeat repetitions
+# with the garbage collector off, which is steady enough to compare against a
+# baseline at 5%. Pin to one CPU (--cpu) on a quiet machine for best results.
+
+COOLDOWN = 30
+
+
+def make_options(count):
+    return [f'Option {i}' for i in range(count)]
+
+
+def fill_cooldowns(store, count):
+    # Live (unexpired) cooldowns for `count` other voters
+    store.cooldowns = dict.fromkeys((f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}/{i >> 24}'
+                                     for i in range(count)), time.time() + 3600)
+
+
+def case_vote_ok(store, options):
+    counter = [0]
+
+    def run(number):
+        start = counter[0]
+        counter[0] += number
+        voters = [f'bench-{i}' for i in range(start, start + number)]
+        picks = [options[i % len(options)] for i in range(number)]
+        vote = store.vote
+        began = time.perf_counter()
+        for voter, option in zip(voters, picks):
+            vote(voter, option, COOLDOWN)
+        elapsed = time.perf_counter() - began
+        # Drop the new entries so the cooldown table stays at its nominal size
+        for voter in voters:
+            del store.cooldowns[voter]
+        return elapsed
+    return run
+
+
+def case_vote_cooldown(store, options):
+    store.vote('bench-waiting', options[0], 3600)
+
+    def run(number):
+        vote = store.vote
+        option = options[-1]
+        began = time.perf_counter()
+        for _ in range(number):
+            vote('bench-waiting', option, COOLDOWN)
+        return time.perf_counter() - began
+    return run
+
+
+def case_vote_invalid(store, options):
+    def run(number):
+        vote = store.vote
+        began = time.perf_counter()
+        for _ in range(number):
+            vote('bench-invalid', 'not an option', COOLDOWN)
+        return time.perf_counter() - began
+    return run
+
+
+def case_cooldown_remaining(store, options):
+    voters = list(store.cooldowns)[:1000] or ['missing']
+
+    def run(number):
+        remaining = store.cooldown_remaining
+        picks = [voters[i % len(voters)] for i in range(number)]
+        began = time.perf_counter()
+        for voter in picks:
+            remaining(voter)
+        return time.perf_counter() - began
+    return run
+
+
+def case_snapshot_json(store, options):
+    def run(number):
+        with polls.display_app.app_context():
+            began = time.perf_counter()
+            for _ in range(number):
+                jsonify(store.snapshot()).get_data()
+            return time.perf_counter() - began
+    return run
+
+
+def case_start(store, options):
+    def run(number):
+        began = time.perf_counter()
+        for _ in range(number):
+            store.start('Benchmark question?', options)
+        return time.perf_counter() - began
+    return run
+
+
+def case_reset(store, options):
+    def run(number):
+        began = time.perf_counter()
+        for _ in range(number):
+            store.reset()
+        return time.perf_counter() - began
+    return run
+
+
+VOTE_CASES = {
+    'vote_ok': case_vote_ok,
+    'vote_cooldown': case_vote_cooldown,
+    'vote_invalid': case_vote_invalid,
+    'cooldown_remaining': case_cooldown_remaining,
+}
+POLL_CASES = {
+    'snapshot_json': case_snapshot_json,
+    'start': case_start,
+    'reset': case_reset,
+}
+
+
+def measure(run, repeat, min_time):
+    number = 1
+    while True:
+        if run(number) >= min_time / 5:
+            break
+        number *= 4
+    number = max(1, int(number * 5 * min_time / max(run(number), 1e-9)))
+    run(number)  # warmup at the final size
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        times = [run(number) / number for _ in range(repeat)]
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    median = statistics.median(times)
+    quartiles = statistics.quantiles(times, n=4) if len(times) > 1 else [median] * 3
+    return {
+        'ns': round(median * 1e9, 1),
+        'min_ns': round(min(times) * 1e9, 1),
+        'spread': round((quartiles[2] - quartiles[0]) / median, 4),  # interquartile / median
+        'number': number
+    }
+
+
+def run_suite(args, report):
+    options_sizes = [int(n) for n in args.options.split(',')]
+    cooldown_sizes = [min(int(n), args.max_cooldowns) for n in args.cooldowns.split(',')]
+
+    def record(name, result):
+        report[name] = result
+        flag = '  (noisy)' if result['spread'] > args.tolerance else ''
+        print(f"{name:48s} {result['ns']:14,.1f} ns/op  spread {result['spread']:.1%}{flag}")
+
+    for count in cooldown_sizes:
+        store = MemoryStore()
+        fill_cooldowns(store, count)
+        for size in options_sizes:
+            options = make_options(size)
+            store.start('Benchmark question?', options)
+            for name, case in VOTE_CASES.items():
+                if args.only and name not in args.only:
+                    continue
+                record(f'{name}[options={size},cooldowns={count}]',
+                       measure(case(store, options), args.repeat, args.min_time))
+        del store
+        gc.collect()
+
+    for size in options_sizes:
+        options = make_options(size)
+        store = MemoryStore()
+        store.start('Benchmark question?', options)
+        for i, option in enumerate(options):
+            store.state['votes'][option] = i * 7919 % 100000
+        for name, case in POLL_CASES.items():
+            if args.only and name not in args.only:
+                continue
+            record(f'{name}[options={size}]', measure(case(store, options), args.repeat, args.min_time))
+
+
+def compare(report, baseline, tolerance):
+    problems = []
+    for name, base in baseline.items():
+        current = report.get(name)
+        if current is not None and current['ns'] > base['ns'] * (1 + tolerance):
+            problems.append(f"{name}: {current['ns']} ns/op > {base['ns']} ns/op")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the vote and poll hot paths')
+    parser.add_argument('--options', default='2,10,100,1000,10000', help='option list sizes')
+    parser.add_argument('--cooldowns', default='1,1000,100000,1000000',
+                        help='cooldown table sizes (10000000 needs a few GB)')
+    parser.add_argument('--max-cooldowns', type=int, default=10000000)
+    parser.add_argument('--only', action='append', help='run only this case (repeatable)')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.05, help='seconds per repetition')
+    parser.add_argument('--cpu', type=int, help='pin the process to this CPU')
+    parser.add_argument('--output', help='write results as JSON here')
+    parser.add_argument('--baseline', help='compare against this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.cpu is not None:
+        os.sched_setaffinity(0, {args.cpu})
+    elif hasattr(os, 'sched_getaffinity') and len(os.sched_getaffinity(0)) > 1:
+        print('hint: pass --cpu N (and keep the machine idle) for steadier numbers', file=sys.stderr)
+
+    report = {}
+    run_suite(args, report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f'REGRESSION: {problem}', file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
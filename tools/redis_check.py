@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import MemoryStore, RedisClient, RedisStore  # noqa: E402
+from redis_standin import StandinServer  # noqa: E402
+
+# Behaviour check for the Redis backend. Runs the same script of poll calls
+# against a MemoryStore, which is the reference, and a RedisStore on the
+# stand-in (or on a real server with --url), and compares what every step
+# returns: start, stop, reset, votes, cooldowns and snapshots. Then checks
+# what only a shared backend promises: two stores on one namespace (two
+# hosts) see one tally and one set of cooldowns, concurrent votes all count,
+# a voter racing themselves gets one vote in, and polls stay apart. Keys live
+# under a random namespace, so --url never touches existing polls.
+#
+#   python tools/redis_check.py
+#   python tools/redis_check.py --url redis://localhost:6379/0
+
+OPTIONS = ['Red', 'Green', 'Blue']
+COOLDOWN = 2
+
+
+def view(snap):
+    return {
+        'active': snap['active'],
+        'question': snap['question'],
+        'options': snap['options'],
+        'votes': snap['votes'],
+        'started': snap['start_time'] is not None
+    }
+
+
+def script(target):
+    # The same calls for every backend; returns [(step, what it returned)]
+    seen = []
+
+    def changed(action, *args):
+        before = target.version()
+        action(*args)
+        return target.version() > before
+
+    seen.append(('fresh poll', view(target.snapshot())))
+    seen.append(('vote before start', target.vote('v1', 'Red', COOLDOWN)))
+    seen.append(('start', (changed(target.start, 'Colour?', OPTIONS), view(target.snapshot()))))
+    seen.append(('vote', (changed(target.vote, 'v1', 'Red', COOLDOWN), target.vote('v2', 'Blue', COOLDOWN))))
+    status, remaining = target.vote('v1', 'Green', COOLDOWN)
+    seen.append(('vote during cooldown', (status, 0 < remaining <= COOLDOWN)))
+    seen.append(('cooldown remaining', 0 < target.cooldown_remaining('v1') <= COOLDOWN))
+    seen.append(('unknown option', target.vote('v3', 'Purple', COOLDOWN)))
+    seen.append(('option of the wrong type', target.vote('v3', ['Red'], COOLDOWN)))
+    seen.append(('rejected votes leave no cooldown', target.cooldown_remaining('v3')))
+    seen.append(('batch', target.vote_batch([('v3', 'Red'), ('v3', 'Green'), ('v4', 'Teal'), ('v1', 'Red')],
+                                            COOLDOWN)))
+    seen.append(('tally', view(target.snapshot())))
+    seen.append(('stop', (changed(target.stop), view(target.snapshot()))))
+    seen.append(('vote after stop', target.vote('v5', 'Red', COOLDOWN)))
+    seen.append(('reset while stopped', (changed(target.reset), view(target.snapshot()))))
+    target.start('Colour?', OPTIONS)
+    seen.append(('cooldown outlives a restart', target.vote('v1', 'Red', COOLDOWN)[0]))
+    time.sleep(COOLDOWN + 0.2)
+    seen.append(('cooldown expired', (target.cooldown_remaining('v1'), target.vote('v1', 'Red', COOLDOWN))))
+    seen.append(('reset while running', (changed(target.reset), view(target.snapshot()))))
+    seen.append(('restart with new options', (changed(target.start, 'Snack?', ['Chips', 'Fruit']),
+                                              view(target.snapshot()))))
+    seen.append(('option of the old poll', target.vote('v6', 'Red', COOLDOWN)))
+    return seen
+
+
+def shared_checks(url, namespace):
+    # [(check, passed, detail)] for behaviour only a shared backend has
+    results = []
+    first = RedisStore(RedisClient.from_url(url), namespace)
+    second = RedisStore(RedisClient.from_url(url), namespace)
+    first.start('Shared?', OPTIONS)
+    second.vote('host-voter', 'Green', COOLDOWN)
+    votes = first.snapshot()['votes']
+    results.append(('a vote on one host shows on the other', votes['Green'] == 1, votes))
+    status = first.vote('host-voter', 'Red', COOLDOWN)
+    results.append(('cooldowns are shared between hosts', status[0] == 'cooldown', status))
+
+    first.start('Concurrent?', OPTIONS)
+    threads, per_thread = 8, 100
+
+    def voter(tid, target):
+        for i in range(per_thread):
+            target.vote(f'c-{tid}-{i}', OPTIONS[i % len(OPTIONS)], COOLDOWN)
+
+    workers = [threading.Thread(target=voter, args=(t, (first, second)[t % 2])) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    total = sum(first.snapshot()['votes'].values())
+    results.append(('concurrent votes from two hosts all count', total == threads * per_thread,
+                    f'{total} of {threads * per_thread}'))
+
+    statuses = []
+    barrier = threading.Barrier(threads)
+
+    def racer(target):
+        barrier.wait()
+        statuses.append(target.vote('racer', 'Blue', COOLDOWN)[0])
+
+    workers = [threading.Thread(target=racer, args=((first, second)[t % 2],)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    results.append(('a voter racing themselves gets one vote in', statuses.count('ok') == 1, statuses))
+
+    other = RedisStore(RedisClient.from_url(url), namespace + ':other')
+    results.append(('another namespace is another poll', not other.snapshot()['active'] and
+                    other.vote('v1', 'Red', COOLDOWN)[0] == 'inactive', other.snapshot()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the Redis store against the in-memory store')
+    parser.add_argument('--url', help='Redis server to check (default: an in-process stand-in)')
+    args = parser.parse_args()
+
+    server = None if args.url else StandinServer().start()
+    url = args.url or server.url
+    namespace = f'redlix-check:{uuid.uuid4().hex[:8]}'
+    client = RedisClient.from_url(url)
+    failures = []
+    try:
+        expected = script(MemoryStore())
+        got = script(RedisStore(client, namespace + ':script'))
+        for (step, want), (_, have) in zip(expected, got):
+            # Round-trip through JSON so tuples and lists compare alike
+            if json.loads(json.dumps(want)) != json.loads(json.dumps(have)):
+                failures.append({'check': step, 'memory': want, 'redis': have})
+        shared = shared_checks(url, namespace)
+        for check, passed, detail in shared:
+            if not passed:
+                failures.append({'check': check, 'detail': detail})
+    finally:
+        for suffix in (':script', '', ':other'):
+            client.execute('DEL', f'{namespace}{suffix}:poll', f'{namespace}{suffix}:votes')
+        if server is not None:
+            server.shutdown()
+    print(json.dumps({
+        'url': url,
+        'checks': len(expected) + len(shared),
+        'failures': failures
+    }, indent=2, default=str))
+    if failures:
+        raise SystemExit(f'{len(failures)} checks failed')
+    print('OK: the Redis store behaves like the in-memory store')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import os
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import VOTE_SCRIPT  # noqa: E402
+
+# In-process stand-in for a Redis server. It speaks enough of RESP2 to back
+# store.RedisStore, so the Redis backend can be exercised without a real
+# redis-server. Not meant for production use. It has no Lua interpreter:
+# EVAL and EVALSHA run Python twins of the scripts store.py sends.
+
+
+class StandinState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.expires = {}  # key -> expiry (monotonic seconds)
+        self.loaded = set()  # SHA1s of the scripts EVAL has seen, as in Redis
+
+    def _alive(self, key, now):
+        expiry = self.expires.get(key)
+        if expiry is not None and now >= expiry:
+            del self.expires[key]
+            self.data.pop(key, None)
+        return key in self.data
+
+    def _hash(self, key, now):
+        if not self._alive(key, now):
+            self.data[key] = {}
+        return self.data[key]
+
+    def execute(self, args):
+        name = args[0].upper()
+        handler = getattr(self, 'cmd_' + name.decode(errors='replace'), None)
+        if handler is None:
+            return Error(f"ERR unknown command '{name.decode(errors='replace')}'")
+        with self.lock:
+            return handler(time.monotonic(), *args[1:])
+
+    def cmd_PING(self, now, *args):
+        return Simple('PONG')
+
+    def cmd_SELECT(self, now, db):
+        return Simple('OK')
+
+    def cmd_FLUSHDB(self, now):
+        self.data.clear()
+        self.expires.clear()
+        return Simple('OK')
+
+    def cmd_DBSIZE(self, now):
+        return sum(1 for key in list(self.data) if self._alive(key, now))
+
+    def cmd_GET(self, now, key):
+        return self.data[key] if self._alive(key, now) else None
+
+    def cmd_SET(self, now, key, value, *opts):
+        opts = [opt.upper() for opt in opts]
+        ttl = None
+        if b'EX' in opts:
+            ttl = int(opts[opts.index(b'EX') + 1])
+        if b'PX' in opts:
+            ttl = int(opts[opts.index(b'PX') + 1]) / 1000
+        if b'NX' in opts and self._alive(key, now):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if ttl is not None:
+            self.expires[key] = now + ttl
+        return Simple('OK')
+
+    def cmd_DEL(self, now, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key, now):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+
+    def cmd_EXISTS(self, now, *keys):
+        return sum(1 for key in keys if self._alive(key, now))
+
+    def cmd_INCRBY(self, now, key, amount):
+        value = int(self.data[key]) if self._alive(key, now) else 0
+        value += int(amount)
+        self.data[key] = str(value).encode()
+        return value
+
+    def cmd_INCR(self, now, key):
+        return self.cmd_INCRBY(now, key, b'1')
+
+    def cmd_EXPIRE(self, now, key, seconds):
+        if not self._alive(key, now):
+            return 0
+        self.expires[key] = now + int(seconds)
+        return 1
+
+    def cmd_PTTL(self, now, key):
+        if not self._alive(key, now):
+            return -2
+        expiry = self.expires.get(key)
+        return -1 if expiry is None else int((expiry - now) * 1000)
+
+    def cmd_TTL(self, now, key):
+        pttl = self.cmd_PTTL(now, key)
+        return pttl if pttl < 0 else pttl // 1000
+
+    def cmd_HSET(self, now, key, *pairs):
+        fields = self._hash(key, now)
+        added = 0
+        for field, value in zip(pairs[::2], pairs[1::2]):
+            added += field not in fields
+            fields[field] = value
+        return added
+
+    def cmd_HGET(self, now, key, field):
+        return self._hash(key, now).get(field)
+
+    def cmd_HMGET(self, now, key, *fields):
+        values = self._hash(key, now)
+        return [values.get(field) for field in fields]
+
+    def cmd_HGETALL(self, now, key):
+        out = []
+        for field, value in self._hash(key, now).items():
+            out.extend((field, value))
+        return out
+
+    def cmd_HEXISTS(self, now, key, field):
+        return int(field in self._hash(key, now))
+
+    def cmd_HDEL(self, now, key, *fields):
+        values = self._hash(key, now)
+        return sum(1 for field in fields if values.pop(field, None) is not None)
+
+    def cmd_HLEN(self, now, key):
+        return len(self._hash(key, now))
+
+    def cmd_HINCRBY(self, now, key, field, amount):
+        values = self._hash(key, now)
+        value = int(values.get(field, 0)) + int(amount)
+        values[field] = str(value).encode()
+        return value
+
+    def cmd_EVAL(self, now, script, numkeys, *rest):
+        sha = hashlib.sha1(script).hexdigest().encode()
+        if sha.decode() not in SCRIPTS:
+            return Error('ERR the stand-in only runs the scripts store.py sends')
+        self.loaded.add(sha)
+        return self.cmd_EVALSHA(now, sha, numkeys, *rest)
+
+    def cmd_EVALSHA(self, now, sha, numkeys, *rest):
+        sha = sha.lower()
+        if sha not in self.loaded:
+            return Error('NOSCRIPT No matching script. Please use EVAL.')
+        count = int(numkeys)
+        return SCRIPTS[sha.decode()](self, now, rest[:count], rest[count:])
+
+
+def vote_script(state, now, keys, args):
+    # store.VOTE_SCRIPT, run under the state lock like a script in Redis
+    poll, votes, cooldown = keys
+    option, seconds = args
+    if state.cmd_HGET(now, poll, b'active') != b'1':
+        return [b'inactive', 0]
+    if not state.cmd_HEXISTS(now, votes, option):
+        return [b'invalid', 0]
+    pttl = state.cmd_PTTL(now, cooldown)
+    if pttl != -2:
+        return [b'cooldown', pttl]
+    state.cmd_HINCRBY(now, votes, option, b'1')
+    state.cmd_HINCRBY(now, poll, b'version', b'1')
+    state.cmd_SET(now, cooldown, b'1', b'EX', seconds)
+    return [b'ok', 0]
+
+
+SCRIPTS = {hashlib.sha1(VOTE_SCRIPT.encode()).hexdigest(): vote_script}
+
+
+class Simple(str):
+    pass
+
+
+class Error(str):
+    pass
+
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, Error):
+        return b'-%s\r\n' % value.encode()
+    if isinstance(value, Simple):
+        return b'+%s\r\n' % value.encode()
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode(item) for item in value)
+    raise TypeError(value)
+
+
+def parse_commands(buf):
+    # Returns (commands, consumed) for every complete command in buf
+    commands = []
+    pos = 0
+    while pos < len(buf):
+        eol = buf.find(b'\r\n', pos)
+        if eol < 0:
+            break
+        if buf[pos:pos + 1] != b'*':
+            commands.append(buf[pos:eol].split())  # inline command, e.g. telnet
+            pos = eol + 2
+            continue
+        count = int(buf[pos + 1:eol])
+        cursor = eol + 2
+        args = []
+        for _ in range(count):
+            eol = buf.find(b'\r\n', cursor)
+            if eol < 0:
+                break
+            length = int(buf[cursor + 1:eol])
+            end = eol + 2 + length
+            if end + 2 > len(buf):
+                break
+            args.append(buf[eol + 2:end])
+            cursor = end + 2
+        if len(args) < count:
+            break
+        commands.append(args)
+        pos = cursor
+    return commands, pos
+
+
+class RESPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        state = self.server.state
+        buf = b''
+        while True:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return
+            buf += chunk
+            commands, consumed = parse_commands(buf)
+            buf = buf[consumed:]
+            # Answer a whole pipelined batch with a single write
+            replies = [encode(state.execute(args)) for args in commands if args]
+            if replies:
+                self.request.sendall(b''.join(replies))
+
+
+class StandinServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0)):
+        super().__init__(address, RESPHandler)
+        self.state = StandinState()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the Redis stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+    server = StandinServer((args.host, args.port))
+    print(f'Redis stand-in listening on {server.url}')
+    server.serve_forever()
@@ -0,0 +1,166 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loadtest import OPTIONS, percentile, source_address, spawn_server  # noqa: E402
+
+# Zero-downtime restart check. Starts polls.py with a control socket and a
+# short cooldown, then keeps voters (each from its own address) and display
+# pollers busy while the process is replaced --reloads times with
+# `polls.py --takeover`. Every request uses a fresh connection and is never
+# retried, so a refused or reset connection shows up as an error. Passes
+# when no request failed, every old process exited cleanly, the final tally
+# equals the accepted votes and no voter got a vote in before its cooldown
+# (carried over the reload) ran out.
+#
+#   python tools/reload_check.py --voters 50 --duration 12 --reloads 3
+
+
+def request(port, method, path, body=None, source=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30,
+                                      source_address=(source, 0) if source else None)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        if resp.status >= 400:
+            raise http.client.HTTPException(f'{method} {path}: HTTP {resp.status}')
+        return json.loads(data)
+    finally:
+        conn.close()
+
+
+class ReloadCheck:
+    def __init__(self, args):
+        self.args = args
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.errors = []
+        self.accepted = {}  # voter -> [(sent, answered)] of accepted votes
+
+    def call(self, port, method, path, body=None, source=None):
+        began = time.time()
+        try:
+            result = request(port, method, path, body, source)
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            with self.lock:
+                self.errors.append(f'{method} {path}: {exc!r}')
+            return began, None
+        with self.lock:
+            self.latencies.append(time.time() - began)
+        return began, result
+
+    def voter(self, index):
+        source = source_address(index)
+        accepted = self.accepted.setdefault(source, [])
+        self.stop.wait(random.random() * self.args.vote_interval)
+        while not self.stop.is_set():
+            sent, result = self.call(self.args.port + 2, 'POST', '/api/vote',
+                                     {'option': random.choice(OPTIONS)}, source)
+            if result and result.get('success'):
+                accepted.append((sent, time.time()))
+            self.stop.wait(self.args.vote_interval)
+
+    def poller(self):
+        while not self.stop.is_set():
+            self.call(self.args.port, 'GET', '/api/poll')
+            self.stop.wait(self.args.poll_interval)
+
+    def run(self, server_env):
+        args = self.args
+        proc = spawn_server(args.port, server_env)
+        reloads = []
+        try:
+            request(args.port + 1, 'POST', '/api/start', {'question': 'Reload test?', 'options': OPTIONS})
+            threads = [threading.Thread(target=self.voter, args=(i,)) for i in range(args.voters)]
+            threads += [threading.Thread(target=self.poller) for _ in range(args.pollers)]
+            began = time.time()
+            for thread in threads:
+                thread.start()
+            for n in range(args.reloads):
+                time.sleep(max(0.0, began + args.duration * (n + 1) / (args.reloads + 1) - time.time()))
+                started = time.time()
+                new = spawn_server(args.port, server_env, ['--takeover'])
+                code = proc.wait(timeout=60)
+                reloads.append({'seconds': round(time.time() - started, 3), 'old_exit_code': code})
+                proc = new
+            time.sleep(max(0.0, began + args.duration - time.time()))
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+            final = request(args.port, 'GET', '/api/poll')
+        finally:
+            self.stop.set()
+            proc.terminate()
+            proc.wait()
+        return self.report(reloads, final)
+
+    def report(self, reloads, final):
+        accepted = sum(len(votes) for votes in self.accepted.values())
+        early = 0
+        for votes in self.accepted.values():
+            for (sent, _), (_, answered) in zip(votes, votes[1:]):
+                # The later vote was answered no sooner than cooldown after the
+                # earlier one was sent, unless its cooldown was lost
+                if answered - sent < self.args.cooldown - 0.001:
+                    early += 1
+        final_total = sum(final['votes'].values())
+        self.latencies.sort()
+        checks = {
+            'no_errors': not self.errors,
+            'old_processes_exited': all(r['old_exit_code'] == 0 for r in reloads),
+            'tally_exact': final_total == accepted,
+            'cooldowns_kept': early == 0
+        }
+        return {
+            'reloads': reloads,
+            'requests': len(self.latencies) + len(self.errors),
+            'errors': len(self.errors),
+            'first_errors': self.errors[:5],
+            'p50_ms': round(percentile(self.latencies, 0.50) * 1000, 3),
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 3),
+            'max_ms': round(self.latencies[-1] * 1000, 3) if self.latencies else None,
+            'votes': {'accepted': accepted, 'final_tally': final_total, 'early': early},
+            'checks': checks,
+            'result': 'ok' if all(checks.values()) else 'failed'
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check zero-downtime restarts under load')
+    parser.add_argument('--voters', type=int, default=50, help='voters, each with its own source IP')
+    parser.add_argument('--pollers', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=12.0, help='seconds')
+    parser.add_argument('--reloads', type=int, default=3)
+    parser.add_argument('--vote-interval', type=float, default=0.2)
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--cooldown', type=int, default=2, help='REDLIX_COOLDOWN_SECONDS for the server')
+    parser.add_argument('--port', type=int, default=7500, help='display port; dashboard and voting follow')
+    parser.add_argument('--server-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the server processes')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server_env = {
+            'REDLIX_CONTROL': os.path.join(tmp, 'control.sock'),
+            'REDLIX_COOLDOWN_SECONDS': str(args.cooldown)
+        }
+        server_env.update(item.split('=', 1) for item in args.server_env)
+        report = ReloadCheck(args).run(server_env)
+    print(json.dumps(report, indent=2))
+    if report['result'] != 'ok':
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
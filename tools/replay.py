@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capture import read_capture  # noqa: E402
+from ranked import RankedTally  # noqa: E402
+from loadtest import Client, source_address, spawn_server  # noqa: E402
+
+# Replays a REDLIX_CAPTURE file against a local instance at the recorded pace
+# (--speed 1), faster (--speed 10) or as fast as possible (--speed max), then
+# checks that every poll ends with the tallies the capture recorded.
+#
+# Each captured voter gets its own 127.x.y.z source address, so cooldowns
+# apply per voter as they did live. The cooldown is divided by the speed
+# (30s becomes 3s at 10x) to keep accept/reject outcomes the same. Below one
+# second, and at max speed, the cooldown is switched off and the votes that
+# were rejected for cooldown are skipped. Dashboard actions act as barriers:
+# every earlier request completes before a start, stop or reset is sent.
+#
+# Free-text polls are restarted with their recorded capacity and replay the
+# normalized answers. Their tallies are only compared while every answer fits
+# in the capacity; past that the counts are estimates that depend on arrival
+# order, and the poll is reported as approximate. Ranked-choice polls replay
+# every ballot; their first preferences and the runoff winner are checked.
+
+INVALID_OPTION = '\x00invalid'
+INVALID_ANSWER = ''  # normalizes to nothing
+CONNECTIONS_PER_WORKER = 256
+
+
+class Worker:
+    def __init__(self, replay):
+        self.replay = replay
+        self.queue = queue.Queue(maxsize=10000)
+        self.clients = OrderedDict()  # (voter, port) -> Client, least recently used first
+        self.accepted = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def client(self, voter, port):
+        key = (voter, port)
+        client = self.clients.get(key)
+        if client is None:
+            source = self.replay.source_for(voter)
+            client = self.clients[key] = Client(self.replay.host, port, self.replay.samples, source)
+            if len(self.clients) > CONNECTIONS_PER_WORKER:
+                self.clients.popitem(last=False)[1].close()
+        else:
+            self.clients.move_to_end(key)
+        return client
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            voter, port, method, path, body = job
+            result = self.client(voter, port).request(method, path, body)
+            if method == 'POST' and result and result.get('success'):
+                self.accepted += 1
+            self.queue.task_done()
+        for client in self.clients.values():
+            client.close()
+
+
+class Replay:
+    def __init__(self, args):
+        self.args = args
+        self.host = '127.0.0.1'
+        self.display_port = args.port
+        self.dashboard_port = args.port + 1
+        self.voting_port = args.port + 2
+        self.samples = []
+        self.sources = {}
+        self.sources_lock = threading.Lock()
+        self.workers = [Worker(self) for _ in range(args.workers)]
+        self.control = Client(self.host, self.dashboard_port, [])
+        self.polls = {}     # slot -> {'key', 'base', 'kind', 'options', 'ballots'}
+        self.bases = {}     # (tenant, poll) -> API base path
+        self.capacities = {}  # (tenant, poll) -> capacity of a free-text poll
+        self.runoffs = {}   # (tenant, poll) -> (options, {ballot: count}) of a ranked poll
+        self.expected = {}  # (tenant, poll) -> {option: count}
+        self.counts = {}
+        self.recorded_accepted = 0
+
+    def source_for(self, voter):
+        if self.args.no_source_ips:
+            return None
+        with self.sources_lock:
+            index = self.sources.get(voter)
+            if index is None:
+                index = self.sources[voter] = len(self.sources)
+        return source_address(index)
+
+    def barrier(self):
+        for worker in self.workers:
+            worker.queue.join()
+
+    def dispatch(self, voter, port, method, path, body=None):
+        # Same voter, same worker: a voter's requests stay in order
+        self.workers[voter % len(self.workers)].queue.put((voter, port, method, path, body))
+
+    def on_meta(self, slot, meta):
+        tenant, poll_id = meta['tenant'], meta['poll']
+        prefix = '' if tenant == 'default' else f'/t/{tenant}'
+        api = '/api' if poll_id == 'default' else f'/api/polls/{poll_id}'
+        kind = meta.get('kind', 'choice')
+        # A free-text poll's options grow as value records arrive
+        self.polls[slot] = {'key': (tenant, poll_id), 'base': prefix + api, 'kind': kind,
+                            'options': list(meta['options']), 'ballots': []}
+        self.bases[(tenant, poll_id)] = prefix + api
+        if meta['event'] == 'start' or meta['active']:
+            self.barrier()
+            body = {'question': meta['question'], 'options': meta['options'], 'kind': kind}
+            if kind == 'text':
+                body['capacity'] = meta['capacity']
+                self.capacities[(tenant, poll_id)] = meta['capacity']
+            else:
+                self.capacities.pop((tenant, poll_id), None)
+            if kind == 'ranked':
+                self.runoffs[(tenant, poll_id)] = (meta['options'], {})
+            else:
+                self.runoffs.pop((tenant, poll_id), None)
+            self.control.request('POST', f'{prefix}{api}/start', body)
+            self.expected[(tenant, poll_id)] = {opt: 0 for opt in meta['options']}
+
+    def on_value(self, slot, value):
+        poll = self.polls.get(slot)
+        if poll is not None:
+            poll['ballots' if poll['kind'] == 'ranked' else 'options'].append(value)
+
+    def on_event(self, kind, slot, voter, option, status):
+        poll = self.polls.get(slot)
+        if poll is None:
+            return
+        base = poll['base']
+        if kind == 'vote':
+            if status == 'cooldown' and self.skip_cooldown_rejects:
+                return
+            if poll['kind'] == 'ranked':
+                ballot = poll['ballots'][option] if option < len(poll['ballots']) else [INVALID_OPTION]
+                text, body = ballot[0], {'ranking': ballot}
+            else:
+                if option < len(poll['options']):
+                    text = poll['options'][option]
+                else:
+                    text = INVALID_ANSWER if poll['kind'] == 'text' else INVALID_OPTION
+                body = {'option': text}
+            if status == 'ok':
+                self.recorded_accepted += 1
+                # Ranked polls report first preferences as votes
+                tally = self.expected.setdefault(poll['key'], {})
+                tally[text] = tally.get(text, 0) + 1
+                if poll['kind'] == 'ranked':
+                    ballots = self.runoffs[poll['key']][1]
+                    ballots[tuple(ballot)] = ballots.get(tuple(ballot), 0) + 1
+            self.dispatch(voter, self.voting_port, 'POST', f'{base}/vote', body)
+        elif kind == 'cooldown':
+            self.dispatch(voter, self.voting_port, 'GET', f'{base}/cooldown')
+        elif kind == 'poll':
+            self.dispatch(voter, self.display_port, 'GET', f'{base}/poll')
+        elif kind in ('stop', 'reset'):
+            self.barrier()
+            self.control.request('POST', f'{base}/{kind}')
+            if kind == 'reset':
+                tally = self.expected.get(poll['key'], {})
+                # A free-text reset forgets the answers altogether
+                self.expected[poll['key']] = {} if poll['kind'] == 'text' else {opt: 0 for opt in tally}
+                if poll['key'] in self.runoffs:
+                    self.runoffs[poll['key']][1].clear()
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def run(self, cooldown_off):
+        self.skip_cooldown_rejects = cooldown_off
+        speed = self.args.speed
+        began = time.perf_counter()
+        first = last = None
+        shift = 0.0
+        for record in read_capture(self.args.capture):
+            kind, stamp = record[0], record[1]
+            if kind == 'segment':
+                self.polls = {}  # slot numbers are per segment
+                continue
+            if first is None:
+                first = last = stamp
+            # Long idle stretches (or the gap between two recorded processes)
+            # are shortened to --max-gap
+            if stamp - last > self.args.max_gap:
+                shift += stamp - last - self.args.max_gap
+            last = stamp
+            if speed:
+                delay = began + (stamp - first - shift) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            if kind == 'meta':
+                self.on_meta(record[2], record[3])
+            elif kind == 'value':
+                self.on_value(record[2], record[3])
+            else:
+                self.on_event(kind, *record[2:])
+        self.barrier()
+        elapsed = time.perf_counter() - began
+        for worker in self.workers:
+            worker.queue.put(None)
+        for worker in self.workers:
+            worker.thread.join()
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        display = Client(self.host, self.display_port, [])
+        polls = {}
+        mismatched = False
+        for key, expected in sorted(self.expected.items()):
+            final = display.request('GET', f'{self.bases[key]}/poll') or {'votes': {}}
+            capacity = self.capacities.get(key)
+            if capacity is not None and len(expected) > capacity:
+                check = 'approximate'
+            else:
+                if capacity is not None:
+                    # Answers only appear once given
+                    expected = {answer: count for answer, count in expected.items() if count}
+                check = 'ok' if final['votes'] == expected else 'mismatch'
+            entry = {'expected': expected, 'final': final['votes']}
+            if key in self.runoffs:
+                entry['expected_winner'] = runoff_winner(*self.runoffs[key])
+                entry['final_winner'] = final.get('winner')
+                if check == 'ok' and entry['final_winner'] != entry['expected_winner']:
+                    check = 'mismatch'
+            entry['tally_check'] = check
+            mismatched = mismatched or check == 'mismatch'
+            polls['/'.join(key)] = entry
+        requests = len(self.samples)
+        errors = sum(1 for _, _, ok in self.samples if not ok)
+        return {
+            'speed': self.args.speed or 'max',
+            'elapsed': round(elapsed, 3),
+            'requests': requests,
+            'requests_per_second': round(requests / elapsed, 1) if elapsed else None,
+            'errors': errors,
+            'events': self.counts,
+            'accepted': {'recorded': self.recorded_accepted,
+                         'replayed': sum(worker.accepted for worker in self.workers)},
+            'polls': polls,
+            'tally_check': 'mismatch' if mismatched else 'ok'
+        }
+
+
+def runoff_winner(options, ballots):
+    # Instant-runoff winner of the recorded ballots, as the server counts it
+    tally = RankedTally(options)
+    for ballot, count in ballots.items():
+        tally.ballots[tuple(tally.index[opt] for opt in ballot)] = count
+        tally.total += count
+    return tally.result()['winner']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a REDLIX_CAPTURE file against a local instance')
+    parser.add_argument('capture')
+    parser.add_argument('--speed', default='1', help='1, 10, any factor, or max')
+    parser.add_argument('--recorded-cooldown', type=int, default=30,
+                        help='cooldown of the server the capture came from')
+    parser.add_argument('--max-gap', type=float, default=5.0, help='longest idle gap kept, in seconds')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--port', type=int, default=7310, help='display port; dashboard and voting follow')
+    parser.add_argument('--no-spawn', action='store_true',
+                        help='replay against a running instance (its cooldown must match)')
+    parser.add_argument('--no-source-ips', action='store_true')
+    parser.add_argument('--output', help='write the JSON report here')
+    args = parser.parse_args()
+
+    args.speed = 0.0 if args.speed == 'max' else float(args.speed)
+    cooldown = int(args.recorded_cooldown / args.speed) if args.speed else 0
+    proc = None
+    if not args.no_spawn:
+        proc = spawn_server(args.port, {'REDLIX_COOLDOWN_SECONDS': str(cooldown)})
+    try:
+        report = Replay(args).run(cooldown_off=cooldown == 0)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    if report['tally_check'] != 'ok':
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import polls  # noqa: E402
+
+# Approximate memory per hosted tenant: an idle channel with a finished poll
+# and a live one with a few options and recent voters.
+
+
+def measure(count, options, voters):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        channel = polls.poll_store(f'channel{i}', create=True)
+        channel.start('Which one?', [f'Option {n}' for n in range(options)])
+        for v in range(voters):
+            channel.vote(f'10.0.{v // 256}.{v % 256}', f'Option {v % options}', 30)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    for i in range(count):
+        polls.drop_tenant(f'channel{i}')
+    return used / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-tenant memory overhead')
+    parser.add_argument('--tenants', type=int, default=5000)
+    args = parser.parse_args()
+    for options, voters in ((2, 0), (4, 0), (4, 10), (4, 100)):
+        per_tenant = measure(args.tenants, options, voters)
+        print(f'{options} options, {voters:3d} voters: {per_tenant:8.0f} bytes/tenant')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import heapq
+
+# Leaders of polls with large option sets ("song request" polls with
+# thousands of entries). TopK is an indexed min-heap over the TOP_K leading
+# options. Counts only grow between resets, so an option outside the heap
+# can only get in by passing the smallest entry in it: a vote costs O(log K)
+# and reading the leaders never looks at the other options.
+
+TOP_K = 100
+
+
+def top_of(options, votes, n):
+    # [(option, votes)] for the n leaders by a full scan; ties go to the
+    # option listed first
+    ranked = heapq.nlargest(n, enumerate(options), key=lambda item: (votes.get(item[1], 0), -item[0]))
+    return [(opt, votes.get(opt, 0)) for _, opt in ranked]
+
+
+class TopK:
+    __slots__ = ('size', 'rank', 'heap', 'pos', 'total')
+
+    def __init__(self, options, votes, size=TOP_K):
+        self.size = size
+        self.rank = {opt: i for i, opt in enumerate(options)}
+        # Entries are [count, -position, option]; position breaks ties, so
+        # no two entries ever compare equal
+        self.heap = [[count, -self.rank[opt], opt] for opt, count in top_of(options, votes, size)]
+        heapq.heapify(self.heap)
+        self.pos = {entry[2]: i for i, entry in enumerate(self.heap)}
+        self.total = sum(votes.values())
+
+    def update(self, option, count):
+        # option's tally went up by one, to count
+        self.total += 1
+        heap = self.heap
+        i = self.pos.get(option)
+        if i is not None:
+            heap[i][0] = count
+            self._sift(i)
+            return
+        if len(heap) < self.size:
+            heap.append([count, -self.rank[option], option])
+            self.pos[option] = len(heap) - 1
+            self._raise(len(heap) - 1)
+            return
+        root = heap[0]
+        if count < root[0]:
+            return
+        entry = [count, -self.rank[option], option]
+        if entry > root:
+            del self.pos[root[2]]
+            heap[0] = entry
+            self.pos[option] = 0
+            self._sift(0)
+
+    def _sift(self, i):
+        # Moves a grown entry down towards the leaves
+        heap, pos = self.heap, self.pos
+        entry = heap[i]
+        end = len(heap)
+        while True:
+            child = 2 * i + 1
+            if child >= end:
+                break
+            if child + 1 < end and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[i] = heap[child]
+            pos[heap[i][2]] = i
+            i = child
+        heap[i] = entry
+        pos[entry[2]] = i
+
+    def _raise(self, i):
+        heap, pos = self.heap, self.pos
+        entry = heap[i]
+        while i:
+            parent = (i - 1) // 2
+            if not entry < heap[parent]:
+                break
+            heap[i] = heap[parent]
+            pos[heap[i][2]] = i
+            i = parent
+        heap[i] = entry
+        pos[entry[2]] = i
+
+    def leaders(self, n):
+        return [(opt, count) for count, _, opt in sorted(self.heap, reverse=True)[:n]]
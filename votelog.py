@@ -0,0 +1,387 @@
+import atexit
+import bisect
+import csv
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+from answers import normalize_answer
+from ranked import RankedTally
+
+# Persistent vote history for exports (REDLIX_VOTE_LOG=directory).
+#
+#   votes.log   fixed-width records: time:f64 run:u32 option:u16 voter:u64
+#   runs.jsonl  one line per poll run: {run, tenant, poll, kind, question, options, started}
+#               plus one per new free-text answer {run, answer} or ranked
+#               ballot {run, ballot: [best, next, ...]}
+#
+# A run is one start of a poll; option is an index into that run's options,
+# and RESET_MARK in place of an option records a reset. A free-text run starts
+# with no options: each distinct normalized answer is appended to them the
+# first time it is given. In a ranked-choice run, option indexes the run's
+# distinct ballots the same way. Past OVERFLOW of them, new answers or ballots
+# are logged as OVERFLOW and exported with an empty option. Voters are stored as a
+# keyed hash of their IP or chat name. Request threads only push packed
+# records on a deque; a background thread appends them. Exports read the files
+# with their own handles, so a long export never holds up voting.
+
+RECORD = struct.Struct('<dIHQ')
+RESET_MARK = 0xFFFF
+OVERFLOW = RESET_MARK - 1
+READ_RECORDS = 4096
+# Records are appended in arrival order, so timestamps can be slightly out of
+# order across threads; range scans allow this much slack
+ORDER_SLACK = 2.0
+
+
+def parse_time(value):
+    # Epoch seconds or ISO 8601 ('2025-01-31T20:00:00Z')
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def iso(stamp):
+    return datetime.fromtimestamp(stamp, timezone.utc).isoformat(timespec='milliseconds')
+
+
+class VoteLog:
+    def __init__(self, directory, flush_interval=0.2):
+        os.makedirs(directory, exist_ok=True)
+        self.votes_path = os.path.join(directory, 'votes.log')
+        self.runs_path = os.path.join(directory, 'runs.jsonl')
+        self.key = self._load_key(os.path.join(directory, 'voter.key'))
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.runs = {}     # (tenant, poll) -> (run id, {option or ballot: index}, kind)
+        self.next_run = 1
+        for run in self.read_runs():
+            self.next_run = max(self.next_run, run['run'] + 1)
+        self.queue = deque()
+        self.votes_file = open(self.votes_path, 'ab')
+        self.runs_file = open(self.runs_path, 'a')
+        self.flush_interval = flush_interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='redlix-votelog', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _load_key(self, path):
+        # Kept next to the log so a voter hashes the same across restarts
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            key = os.urandom(16)
+            with open(path, 'wb') as f:
+                f.write(key)
+            return key
+
+    def voter_key(self, voter):
+        return int.from_bytes(hashlib.blake2b(voter.encode(), digest_size=8, key=self.key).digest(), 'little')
+
+    def started(self, tenant, poll_id, snap):
+        # Opens a new run; later votes for the poll are logged against it
+        kind = snap.get('kind', 'choice')
+        with self.lock:
+            run = self.next_run
+            self.next_run += 1
+            self.queue.append(json.dumps({
+                'run': run,
+                'tenant': tenant,
+                'poll': poll_id,
+                'kind': kind,
+                'question': snap['question'],
+                'options': snap['options'],
+                'started': snap['start_time'] or time.time()
+            }))
+            # Published after the run line is queued, so votes always follow it
+            index = {} if kind == 'ranked' else {opt: i for i, opt in enumerate(snap['options'])}
+            self.runs[(tenant, poll_id)] = (run, index, kind)
+        return run
+
+    def _run_for(self, tenant, poll_id, target):
+        found = self.runs.get((tenant, poll_id))
+        if found is None:
+            # A poll that was running before this process started logging
+            self.started(tenant, poll_id, target.snapshot())
+            found = self.runs[(tenant, poll_id)]
+        return found
+
+    def vote(self, tenant, poll_id, target, voter, option):
+        # option: an option name, a free-text answer or a ranked ballot
+        run, index, kind = self._run_for(tenant, poll_id, target)
+        if kind == 'text':
+            option = normalize_answer(option)
+            found = index.get(option)
+            if found is None:
+                found = self._add(run, index, option, 'answer', option)
+        elif kind == 'ranked':
+            ballot = tuple([option] if isinstance(option, str) else option)
+            found = index.get(ballot)
+            if found is None:
+                found = self._add(run, index, ballot, 'ballot', list(ballot))
+        else:
+            found = index.get(option, OVERFLOW)
+        self.queue.append(RECORD.pack(time.time(), run, found, self.voter_key(voter)))
+
+    def _add(self, run, index, key, field, value):
+        # Gives a new answer or ballot of a run the next index
+        with self.lock:
+            found = index.get(key)
+            if found is None:
+                if len(index) >= OVERFLOW:
+                    return OVERFLOW
+                found = index[key] = len(index)
+                # Queued before the vote, so it reaches runs.jsonl first
+                self.queue.append(json.dumps({'run': run, field: value}))
+            return found
+
+    def reset(self, tenant, poll_id, target):
+        run, _, _ = self._run_for(tenant, poll_id, target)
+        self.queue.append(RECORD.pack(time.time(), run, RESET_MARK, 0))
+
+    def _drain(self):
+        with self.write_lock:
+            self._write()
+
+    def _write(self):
+        records, runs = [], []
+        try:
+            while True:
+                item = self.queue.popleft()
+                (runs if isinstance(item, str) else records).append(item)
+        except IndexError:
+            pass
+        # Runs first, so a reader never sees a vote for an unknown run
+        if runs:
+            self.runs_file.write(''.join(line + '\n' for line in runs))
+            self.runs_file.flush()
+        if records:
+            self.votes_file.write(b''.join(records))
+            self.votes_file.flush()
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self._drain()
+
+    def close(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        self.thread.join()
+        self._drain()
+        self.votes_file.close()
+        self.runs_file.close()
+
+    def handover(self):
+        # Writes out everything queued and returns the open runs, for the
+        # process taking over (polls.py --takeover)
+        self._drain()
+        with self.lock:
+            return {'next_run': self.next_run, 'runs': dict(self.runs)}
+
+    def resume(self, state):
+        # Keeps logging the runs the previous process had open
+        with self.lock:
+            self.next_run = max(self.next_run, state['next_run'])
+            self.runs.update(state['runs'])
+
+    # Reading
+
+    def read_runs(self):
+        # Runs in order, with the answers of free-text runs as their options
+        # and the distinct ballots of ranked-choice runs in 'ballots'
+        runs = {}
+        try:
+            with open(self.runs_path) as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    entry = json.loads(line)
+                    info = runs.get(entry['run'])
+                    if 'answer' in entry:
+                        if info is not None:
+                            info['options'].append(entry['answer'])
+                    elif 'ballot' in entry:
+                        if info is not None:
+                            info['ballots'].append(entry['ballot'])
+                    else:
+                        entry['ballots'] = []
+                        runs[entry['run']] = entry
+        except FileNotFoundError:
+            pass
+        return list(runs.values())
+
+    def _seek_index(self, f, count, since):
+        # First record index whose time may be >= since
+        times = RecordTimes(f, count)
+        return max(0, bisect.bisect_left(times, since - ORDER_SLACK))
+
+    def records(self, since=None, until=None):
+        # Yields (time, run, option index, voter) in file order, limited to
+        # what had been written when the export started
+        with open(self.votes_path, 'rb') as f:
+            count = os.fstat(f.fileno()).st_size // RECORD.size
+            start = self._seek_index(f, count, since) if since is not None and count else 0
+            f.seek(start * RECORD.size)
+            remaining = count - start
+            while remaining > 0:
+                chunk = f.read(min(remaining, READ_RECORDS) * RECORD.size)
+                if not chunk:
+                    return
+                remaining -= len(chunk) // RECORD.size
+                for record in RECORD.iter_unpack(chunk):
+                    stamp = record[0]
+                    if since is not None and stamp < since:
+                        continue
+                    if until is not None and stamp >= until:
+                        if stamp >= until + ORDER_SLACK:
+                            return
+                        continue
+                    yield record
+
+
+class RecordTimes:
+    # Sequence view of record timestamps for bisect, read on demand
+    def __init__(self, f, count):
+        self.f = f
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        self.f.seek(index * RECORD.size)
+        return RECORD.unpack(self.f.read(RECORD.size))[0]
+
+
+class TextBuffer:
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def take(self):
+        text = ''.join(self.parts)
+        self.parts = []
+        return text
+
+
+def encode_rows(rows, fields, fmt, compress=False, batch=500):
+    # Turns an iterable of dicts into CSV or NDJSON chunks, optionally
+    # gzipped on the fly; memory stays at one batch of rows
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = TextBuffer()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore') if fmt == 'csv' else None
+    if writer is not None:
+        writer.writeheader()
+    pending = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, separators=(',', ':')) + '\n')
+        pending += 1
+        if pending >= batch:
+            pending = 0
+            data = buffer.take().encode()
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = buffer.take().encode()
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def export_votes(log, tenant, poll_id=None, since=None, until=None):
+    runs = {run['run']: run for run in log.read_runs()
+            if run['tenant'] == tenant and (poll_id is None or run['poll'] == poll_id)}
+    for stamp, run, option, voter in log.records(since, until):
+        info = runs.get(run)
+        if info is None or option == RESET_MARK:
+            continue
+        row = {
+            'time': iso(stamp),
+            'tenant': info['tenant'],
+            'poll': info['poll'],
+            'run': run,
+            'voter': f'{voter:016x}'
+        }
+        if info.get('kind') == 'ranked':
+            # option is the first preference, ranking the whole ballot
+            ballot = info['ballots'][option] if option < len(info['ballots']) else []
+            row['option'] = ballot[0] if ballot else ''
+            row['ranking'] = json.dumps(ballot, ensure_ascii=False)
+        else:
+            row['option'] = info['options'][option] if option < len(info['options']) else ''
+            row['ranking'] = ''
+        yield row
+
+
+def export_results(log, tenant, poll_id=None, since=None, until=None):
+    # Final tally per run within the range; a reset zeroes the run's counts.
+    # Ranked-choice runs count ballots, rerun the instant runoff and report
+    # first preferences as votes, with the runoff winner on every row.
+    runs = {run['run']: run for run in log.read_runs()
+            if run['tenant'] == tenant and (poll_id is None or run['poll'] == poll_id)}
+    tallies = {run: [0] * len(info['ballots' if info.get('kind') == 'ranked' else 'options'])
+               for run, info in runs.items()}
+    for _, run, option, _ in log.records(since, until):
+        tally = tallies.get(run)
+        if tally is None:
+            continue
+        if option == RESET_MARK:
+            tallies[run] = [0] * len(tally)
+        elif option < len(tally):
+            tally[option] += 1
+    for run, info in sorted(runs.items()):
+        kind = info.get('kind', 'choice')
+        votes, winner = tallies[run], ''
+        if kind == 'ranked':
+            votes, winner = runoff(info['options'], info['ballots'], votes)
+        for option, count in zip(info['options'], votes):
+            yield {
+                'tenant': info['tenant'],
+                'poll': info['poll'],
+                'run': run,
+                'kind': kind,
+                'question': info['question'],
+                'started': iso(info['started']),
+                'option': option,
+                'votes': count,
+                'winner': winner
+            }
+
+
+def runoff(options, ballots, counts):
+    # First preferences per option and the winner ('' without ballots) of
+    # the logged ballots, counts[i] being how many voters cast ballots[i]
+    tally = RankedTally(options)
+    for ballot, count in zip(ballots, counts):
+        if count:
+            tally.ballots[tuple(tally.index[opt] for opt in ballot)] = count
+            tally.total += count
+    result = tally.result()
+    first = result['rounds'][0]['counts'] if result['rounds'] else {}
+    return [first.get(opt, 0) for opt in options], result['winner'] or ''
+
+
+VOTE_FIELDS = ['time', 'tenant', 'poll', 'run', 'option', 'ranking', 'voter']
+RESULT_FIELDS = ['tenant', 'poll', 'run', 'kind', 'question', 'started', 'option', 'votes', 'winner']